@@ -0,0 +1,48 @@
+# bench_adversarial.py
+# Peor caso de parse_to_ast por línea y por documento, con las entradas
+# adversarias de tests/test_adversarial.py y documentos aleatorios
+#
+# Uso: python benchmarks/bench_adversarial.py [documentos_aleatorios]
+
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+from cssx.parser.cssx_parser import parse_to_ast
+from tests.test_adversarial import ADVERSARIAL_INPUTS, BUDGET_MS_PER_KB, _FRAGMENTS, ms_per_kb, random_document
+
+
+def worst_line(rng: random.Random, samples: int) -> tuple:
+    """Línea (envuelta en un bloque) cuyo parseo por carácter es más lento"""
+    worst = (0.0, '')
+    for _ in range(samples):
+        line = ''.join(rng.choice(_FRAGMENTS) for _ in range(rng.randint(1, 40)))
+        source = f"a {{\n  {line}\n}}"
+        start = time.perf_counter()
+        parse_to_ast(source)
+        cost = (time.perf_counter() - start) * 1e6 / len(source)
+        worst = max(worst, (cost, line))
+    return worst
+
+
+def main():
+    documents = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    rng = random.Random(0)
+
+    print(f"Presupuesto: {BUDGET_MS_PER_KB:.1f} ms/KiB")
+    for name, source in ADVERSARIAL_INPUTS.items():
+        print(f"{name:>28}: {ms_per_kb(source):6.2f} ms/KiB")
+
+    costs = [ms_per_kb(random_document(rng, 2000), rounds=1) for _ in range(documents)]
+    print(f"{'aleatorios (peor documento)':>28}: {max(costs):6.2f} ms/KiB  (media {sum(costs) / len(costs):.2f})")
+
+    cost, line = worst_line(rng, 5000)
+    print(f"{'peor línea':>28}: {cost:6.2f} µs/carácter  {line[:60]!r}")
+
+
+if __name__ == '__main__':
+    main()
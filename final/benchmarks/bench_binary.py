@@ -0,0 +1,52 @@
+# bench_binary.py
+# Tamaño y tiempos de codificación/decodificación del AST: formato binario
+# (cssx.ast.binary), pickle y JSON (to_dict), sobre el ejemplo repetido
+#
+# Uso: python benchmarks/bench_binary.py [copias]
+
+import json
+import os
+import pickle
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+from cssx.ast import binary
+from cssx.parser.cssx_parser import parse_to_ast
+
+EXAMPLE = os.path.join(ROOT, 'examples', 'main_example.cssx')
+
+
+def best_of(func, rounds: int = 3) -> float:
+    best = float('inf')
+    for _ in range(rounds):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    copies = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    with open(EXAMPLE, 'r', encoding='utf-8') as f:
+        text = '\n'.join([f.read()] * copies)
+    ast = parse_to_ast(text)
+
+    print(f"Fuente: {len(text) / 1024:.0f} KiB (parse_to_ast {best_of(lambda: parse_to_ast(text)) * 1000:.1f} ms)")
+    formats = (
+        ('binario', binary.dump, binary.load),
+        ('pickle', lambda node: pickle.dumps(node, pickle.HIGHEST_PROTOCOL), pickle.loads),
+        ('json (sin carga)', lambda node: json.dumps(node.to_dict()), None),
+    )
+    print(f"{'formato':>18} {'KiB':>8} {'codificar':>12} {'decodificar':>12}")
+    for label, encode, decode in formats:
+        data = encode(ast)
+        encode_ms = best_of(lambda: encode(ast)) * 1000
+        decode_ms = f"{best_of(lambda: decode(data)) * 1000:9.1f} ms" if decode else f"{'-':>12}"
+        print(f"{label:>18} {len(data) / 1024:8.0f} {encode_ms:9.1f} ms {decode_ms}")
+
+
+if __name__ == '__main__':
+    main()
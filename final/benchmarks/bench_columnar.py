@@ -0,0 +1,61 @@
+# bench_columnar.py
+# Compara el árbol de dataclasses con el AST columnar: tiempo de construcción
+# y memoria máxima (RSS) del proceso. Cada variante se mide en un proceso
+# aparte para que el RSS de una no contamine a la otra.
+#
+# Uso: python benchmarks/bench_columnar.py [copias]
+
+import os
+import resource
+import subprocess
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+EXAMPLE = os.path.join(ROOT, 'examples', 'main_example.cssx')
+
+
+def measure(mode: str, copies: int) -> None:
+    """Construye el AST en el modo indicado e imprime 'segundos rss_kib nodos'"""
+    from cssx.parser.cssx_parser import parse_to_ast, parse_to_columnar
+
+    with open(EXAMPLE, 'r', encoding='utf-8') as f:
+        text = '\n'.join([f.read()] * copies)
+    base = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    start = time.perf_counter()
+    if mode == 'tree':
+        ast = parse_to_ast(text)
+        nodes = len(ast.children)
+    else:
+        ast = parse_to_columnar(text)
+        nodes = len(ast)
+    elapsed = time.perf_counter() - start
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(f"{elapsed} {peak - base} {nodes}")
+
+
+def main():
+    if len(sys.argv) > 2 and sys.argv[1] == '--mode':
+        measure(sys.argv[2], int(sys.argv[3]))
+        return
+
+    copies = int(sys.argv[1]) if len(sys.argv) > 1 else 400
+    declarations = None
+    for label, mode in (('dataclasses', 'tree'), ('columnar', 'columnar')):
+        out = subprocess.run(
+            [sys.executable, __file__, '--mode', mode, str(copies)],
+            capture_output=True, text=True, check=True
+        ).stdout.split()
+        elapsed, rss, nodes = float(out[0]), int(out[1]), int(out[2])
+        if mode == 'columnar':
+            declarations = nodes
+        print(f"{label:>12}: {elapsed * 1000:8.1f} ms  RSS +{rss / 1024:7.1f} MiB")
+    print(f"Nodos estructurales en el AST columnar: {declarations:,}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+# bench_interning.py
+# Mide la tasa de aciertos y la memoria ahorrada por el internado de valores
+#
+# Uso: python benchmarks/bench_interning.py [repeticiones]
+
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+from cssx.parser.cssx_parser import CSSXParser
+
+EXAMPLE = os.path.join(ROOT, 'examples', 'main_example.cssx')
+
+
+def measure(text: str, intern_limit=None):
+    """Parsea y retorna (parser, segundos, bytes retenidos por el AST)"""
+    gc.collect()
+    tracemalloc.start()
+    parser = CSSXParser('<bench>', intern_limit=intern_limit)
+    start = time.perf_counter()
+    ast = parser.parse_to_ast(text)
+    elapsed = time.perf_counter() - start
+    parser.tokens = []  # Solo contar lo que retiene el AST
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del ast
+    return parser, elapsed, retained
+
+
+def main():
+    copies = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    with open(EXAMPLE, 'r', encoding='utf-8') as f:
+        text = '\n'.join([f.read()] * copies)
+    print(f"Fuente: main_example.cssx x{copies} ({text.count(chr(10)) + 1} líneas)")
+
+    _, plain_time, plain_bytes = measure(text, intern_limit=0)
+    parser, interned_time, interned_bytes = measure(text)
+    stats = parser.intern_stats()
+
+    print(f"sin internado: {plain_time:7.2f} s  {plain_bytes / 2**20:8.1f} MiB")
+    print(f"con internado: {interned_time:7.2f} s  {interned_bytes / 2**20:8.1f} MiB")
+    print(f"aciertos: {stats['hits']:,} / {stats['hits'] + stats['misses']:,} "
+          f"({stats['hit_rate']:.1%}), entradas: {stats['entries']}")
+    print(f"memoria ahorrada: {(plain_bytes - interned_bytes) / 2**20:.1f} MiB "
+          f"({1 - interned_bytes / plain_bytes:.1%})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+# bench_parallel.py
+# Compara el parseo en serie con parse_parallel para tamaños crecientes y
+# muestra a partir de qué tamaño compensa repartir el trabajo entre procesos
+#
+# Uso: python benchmarks/bench_parallel.py [procesos]
+
+import os
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+from cssx.parser.cssx_parser import parse_parallel, parse_to_ast
+
+EXAMPLE = os.path.join(ROOT, 'examples', 'main_example.cssx')
+
+
+def best_of(func, rounds: int = 3) -> float:
+    """Mejor tiempo (en segundos) de varias ejecuciones"""
+    best = float('inf')
+    for _ in range(rounds):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else max(os.cpu_count() or 1, 2)
+    with open(EXAMPLE, 'r', encoding='utf-8') as f:
+        example = f.read()
+
+    print(f"CPUs: {os.cpu_count()}  procesos: {workers}")
+    print(f"{'tamaño':>10} {'serie':>10} {'paralelo':>10} {'aceleración':>12}")
+    crossover = None
+    for copies in (10, 40, 160, 640, 1280):
+        text = '\n'.join([example] * copies)
+        serial = best_of(lambda: parse_to_ast(text))
+        parallel = best_of(lambda: parse_parallel(text, workers=workers, threshold=0))
+        speedup = serial / parallel
+        if crossover is None and speedup > 1:
+            crossover = len(text)
+        print(f"{len(text) / 1024:8.0f}KiB {serial * 1000:8.1f}ms {parallel * 1000:8.1f}ms {speedup:11.2f}x")
+
+    if crossover is None:
+        print("Sin punto de cruce: el parseo en serie fue siempre más rápido")
+    else:
+        print(f"Punto de cruce: ~{crossover / 1024:.0f} KiB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+# bench_parser.py
+# Mide el rendimiento del parser (líneas por segundo) sobre una hoja grande
+#
+# Uso: python benchmarks/bench_parser.py [repeticiones]
+
+import os
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+from cssx.lexer.tokenizer import tokenize
+from cssx.parser.cssx_parser import CSSXParser, parse_to_ast
+
+EXAMPLE = os.path.join(ROOT, 'examples', 'main_example.cssx')
+
+
+def load_source(copies: int) -> str:
+    """Replica el ejemplo principal para obtener una hoja grande"""
+    with open(EXAMPLE, 'r', encoding='utf-8') as f:
+        source = f.read()
+    return '\n'.join([source] * copies)
+
+
+def best_of(func, text: str, rounds: int = 5) -> float:
+    """Mejor tiempo (en segundos) de varias ejecuciones"""
+    best = float('inf')
+    for _ in range(rounds):
+        start = time.perf_counter()
+        func(text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    copies = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    text = load_source(copies)
+    lines = text.count('\n') + 1
+
+    print(f"Fuente: {lines} líneas ({len(text) / 1024:.0f} KiB)")
+    lazy = lambda source: parse_to_ast(source, lazy=True)
+    for label, func in (('tokenize', tokenize), ('parse_to_ast', parse_to_ast), ('lazy', lazy)):
+        elapsed = best_of(func, text)
+        print(f"{label:>14}: {elapsed * 1000:8.1f} ms  {lines / elapsed:12,.0f} líneas/s")
+
+    # Reparseo incremental tras cambiar una declaración a mitad del documento
+    start = text.index('tamano = 24', len(text) // 2)
+    end = start + len('tamano = 24')
+    edited = text[:start] + 'tamano = 26' + text[end:]
+    best = float('inf')
+    for _ in range(5):
+        previous = parse_to_ast(text)
+        begin = time.perf_counter()
+        CSSXParser().reparse(previous, text, (start, end), edited)
+        best = min(best, time.perf_counter() - begin)
+    print(f"{'reparse':>14}: {best * 1000:8.1f} ms  (una declaración editada)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+# bench_passes.py
+# Compilación completa de una hoja grande: la secuencia de pases de antes
+# (collect_templates, expand_templates, visita del analizador, deepcopy en
+# VariableResolver.resolve, generadores CSS y HTML, cada uno con su propio
+# recorrido) frente a Compiler.compile con el PassManager, y el desglose de
+# tiempos por pase que da este último
+#
+# Uso: python benchmarks/bench_passes.py [copias]
+
+import os
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+from cssx.codegen.ast_css_generator import AstCssGenerator
+from cssx.codegen.ast_html_generator import AstHtmlGenerator
+from cssx.compiler import Compiler
+from cssx.parser.cssx_parser import parse_to_ast
+from cssx.semantics.analyzer import SemanticAnalyzer
+from cssx.semantics.templates import collect_templates, expand_templates
+
+from bench_resolve import deepcopy_resolve
+
+EXAMPLE = os.path.join(ROOT, 'examples', 'main_example.cssx')
+
+
+def best_of(func, rounds: int = 3) -> float:
+    best = float('inf')
+    for _ in range(rounds):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def sequential_compile(text: str):
+    """Compiler.compile tal como era antes del PassManager"""
+    ast = parse_to_ast(text)
+    analyzer = SemanticAnalyzer()
+    tpl_table, tpl_diagnostics = collect_templates(ast)
+    analyzer.diagnostics.diagnostics.extend(tpl_diagnostics)
+    analyzer.diagnostics.diagnostics.extend(expand_templates(ast, tpl_table))
+    analyzer.visit(ast)
+    analyzer._analyze_unused_variables()
+    resolved = deepcopy_resolve(analyzer.context, ast)
+    css = AstCssGenerator().generate(resolved)
+    title, body = AstHtmlGenerator().generate(resolved)
+    return css, title, body
+
+
+def main():
+    copies = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    with open(EXAMPLE, 'r', encoding='utf-8') as f:
+        text = '\n'.join([f.read()] * copies)
+
+    result = Compiler().compile(text)
+    assert result['css'] == sequential_compile(text)[0]
+    print(f"Fuente: {len(text) / 1024:.0f} KiB")
+    before = best_of(lambda: sequential_compile(text))
+    after = best_of(lambda: Compiler().compile(text))
+    print(f"Pases por separado: {before * 1000:8.1f} ms")
+    print(f"PassManager:        {after * 1000:8.1f} ms ({before / after:.2f}x)")
+
+    print("Tiempos por pase (ms):")
+    for name, ms in Compiler().compile(text)['stats']['timings_ms'].items():
+        print(f"{name:>12}: {ms:8.1f}")
+
+
+if __name__ == '__main__':
+    main()
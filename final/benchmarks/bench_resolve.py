@@ -0,0 +1,99 @@
+# bench_resolve.py
+# VariableResolver.resolve sobre una hoja grande: la copia completa con
+# deepcopy y resolución en sitio (como antes) frente a la resolución con
+# copia en escritura, que comparte con el árbol de entrada todo lo que no
+# cambia. Mide tiempo y pico de memoria (tracemalloc)
+#
+# Uso: python benchmarks/bench_resolve.py [copias]
+
+import copy
+import os
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+from cssx.ast.nodes import Declaration
+from cssx.parser.cssx_parser import parse_to_ast
+from cssx.semantics.analyzer import SemanticAnalyzer, VariableResolver
+
+EXAMPLE = os.path.join(ROOT, 'examples', 'main_example.cssx')
+
+
+def best_of(func, rounds: int = 3) -> float:
+    best = float('inf')
+    for _ in range(rounds):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def peak_kib(func) -> float:
+    tracemalloc.start()
+    try:
+        result = func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del result
+    return peak / 1024
+
+
+class InPlaceResolver(VariableResolver):
+    """Resolución en sitio, como la hacía VariableResolver.visit antes"""
+
+    def visit_Declaration(self, node):
+        node.value = self._resolve_direct(node.value)
+
+    def enter_RuleSet(self, node):
+        for decl in node.declarations:
+            if isinstance(decl, Declaration):
+                decl.value = self._resolve_value(decl.value)
+        return node.children
+
+
+def deepcopy_resolve(context, ast):
+    """VariableResolver.resolve tal como era: deepcopy y resolución en sitio"""
+    node_copy = copy.deepcopy(ast)
+    InPlaceResolver(context).visit(node_copy)
+    return node_copy
+
+
+def count_shared(original, resolved) -> tuple:
+    """(rulesets compartidos con la entrada, rulesets totales)"""
+    shared = total = 0
+    stack = [(original, resolved)]
+    while stack:
+        old, new = stack.pop()
+        for old_child, new_child in zip(old.children, new.children):
+            if hasattr(new_child, 'declarations'):
+                total += 1
+                shared += old_child is new_child
+                stack.append((old_child, new_child))
+    return shared, total
+
+
+def main():
+    copies = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    with open(EXAMPLE, 'r', encoding='utf-8') as f:
+        text = '\n'.join([f.read()] * copies)
+    ast = parse_to_ast(text)
+    _, context, ast = SemanticAnalyzer().analyze(ast)
+
+    resolved = VariableResolver(context).resolve(ast)
+    assert resolved.to_dict() == deepcopy_resolve(context, ast).to_dict()
+    shared, total = count_shared(ast, resolved)
+    print(f"Fuente: {len(text) / 1024:.0f} KiB; rulesets compartidos con la entrada: {shared}/{total}")
+
+    print(f"{'':>20} {'tiempo':>10} {'pico':>12}")
+    for label, func in (('deepcopy', lambda: deepcopy_resolve(context, ast)),
+                        ('copia en escritura', lambda: VariableResolver(context).resolve(ast))):
+        elapsed = best_of(func) * 1000
+        print(f"{label:>20} {elapsed:7.1f} ms {peak_kib(func):8.0f} KiB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+# bench_serialize.py
+# Latencia de /get_ast sobre un archivo grande: serializador genérico
+# (fields() + isinstance), to_dict generado y codificador JSON en streaming.
+# Si Flask está instalado también se mide el endpoint real.
+#
+# Uso: python benchmarks/bench_serialize.py [copias]
+
+import json
+import os
+import sys
+import time
+from dataclasses import fields
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+from cssx.ast.nodes import Loc, Node, iter_json
+from cssx.parser.cssx_parser import parse_to_ast
+
+EXAMPLE = os.path.join(ROOT, 'examples', 'main_example.cssx')
+
+
+def generic_to_dict(node):
+    """Node.to_dict tal como era antes de generar los serializadores"""
+    if isinstance(node, Loc):
+        return node.to_dict()
+    result = {"node_type": node.__class__.__name__}
+    for f in fields(node):
+        value = getattr(node, f.name)
+        if isinstance(value, (list, tuple)):
+            result[f.name] = [generic_to_dict(item) if isinstance(item, Node) else item for item in value]
+        elif isinstance(value, Node):
+            result[f.name] = generic_to_dict(value)
+        elif isinstance(value, (str, int, float, bool, type(None))):
+            result[f.name] = value
+        else:
+            result[f.name] = str(value)
+    return result
+
+
+def best_of(func, rounds: int = 3) -> float:
+    best = float('inf')
+    for _ in range(rounds):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    copies = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    with open(EXAMPLE, 'r', encoding='utf-8') as f:
+        text = '\n'.join([f.read()] * copies)
+    ast = parse_to_ast(text)
+
+    print(f"Fuente: {len(text) / 1024:.0f} KiB")
+    cases = (
+        ('parse_to_ast', lambda: parse_to_ast(text)),
+        ('genérico + dumps', lambda: json.dumps(generic_to_dict(ast))),
+        ('to_dict + dumps', lambda: json.dumps(ast.to_dict())),
+        ('iter_json', lambda: ''.join(iter_json(ast))),
+    )
+    for label, func in cases:
+        print(f"{label:>18}: {best_of(func) * 1000:8.1f} ms")
+
+    try:
+        from cssx.server.editor import app
+    except ImportError as e:
+        print(f"(sin Flask, no se mide el endpoint: {e})")
+        return
+    client = app.test_client()
+    elapsed = best_of(lambda: client.post('/get_ast', json={'code': text}).get_data())
+    print(f"{'POST /get_ast':>18}: {elapsed * 1000:8.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
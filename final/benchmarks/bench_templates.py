@@ -0,0 +1,142 @@
+# bench_templates.py
+# Expansión de plantillas en una hoja tipo "sistema de diseño": pocas
+# plantillas usadas miles de veces con los mismos argumentos. Compara la
+# expansión de antes (deepcopy del cuerpo y de los argumentos en cada uso)
+# con la memorizada por (plantilla, argumentos), y muestra la tasa de
+# acierto que Compiler.compile da en sus estadísticas. Después, plantillas
+# con muchas declaraciones y pocas parametrizadas, cada uso con argumentos
+# distintos (sin aciertos de caché): recorrer el cuerpo sustituyendo en
+# cada expansión frente a rellenar los huecos del plan precompilado
+#
+# Uso: python benchmarks/bench_templates.py [reglas]
+
+import copy
+import os
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+from cssx.ast.nodes import RuleSet, VariableRef, SpaceList, CommaList, Function
+from cssx.compiler import Compiler
+from cssx.parser.cssx_parser import parse_to_ast
+from cssx.semantics.templates import TemplateExpander, _expand_declarations, collect_templates
+
+TEMPLATES = """plantilla boton(@fondo=azul, @radio=4px) {
+  fondo = @fondo
+  radio_borde = @radio
+  relleno = 8px 16px
+  margen = 0 auto
+  color = blanco
+  fuente = "Roboto", sans-serif
+  tamano = 14px
+  sombra = 0 1px 2px rgba(0, 0, 0, 0.2)
+}
+
+plantilla tarjeta(@ancho=300px) {
+  ancho = @ancho
+  relleno = 16px
+  borde = 1px solid #ddd
+  radio_borde = 8px
+  fondo = blanco
+}
+"""
+
+USES = ['usar boton', 'usar boton(rojo)', 'usar boton(@fondo=verde, @radio=2px)', 'usar tarjeta', 'usar tarjeta(200px)']
+
+# Plantilla grande: 40 declaraciones, 2 con parámetros
+BIG_TEMPLATE = "plantilla panel(@fondo, @ancho=300px) {\n  fondo = @fondo\n  ancho = @ancho\n" + ''.join(
+    f"  relleno = {i}px {i + 1}px\n  sombra = 0 1px {i}px rgba(0, 0, 0, 0.2)\n" for i in range(19)) + "}\n"
+
+
+def substitute(value, param_values):
+    """Sustitución de parámetros recorriendo el valor, como antes de los planes"""
+    if isinstance(value, VariableRef):
+        return param_values.get(value.name, value)
+    if isinstance(value, SpaceList):
+        return SpaceList(items=tuple(substitute(item, param_values) for item in value.items))
+    if isinstance(value, CommaList):
+        return CommaList(items=tuple(substitute(item, param_values) for item in value.items))
+    if isinstance(value, Function):
+        return Function(name=value.name, args=tuple(substitute(arg, param_values) for arg in value.args))
+    return value
+
+
+class DeepcopyExpander(TemplateExpander):
+    """Expansión como era antes: sin caché, con deepcopy en cada uso"""
+
+    def expand_template_use(self, template_use, context_loc):
+        template = self.template_table.get(template_use.name)
+        param_values = self._bind_arguments(self.template_table.plan(template_use.name), template_use, context_loc)
+        expanded = []
+        for decl in template.body:
+            new_decl = copy.deepcopy(decl)
+            values = {name: copy.deepcopy(value) for name, value in param_values.items()}
+            new_decl.value = substitute(new_decl.value, values)
+            new_decl.loc.file = context_loc.file
+            expanded.append(new_decl)
+        return expanded
+
+
+class WalkingExpander(TemplateExpander):
+    """Memorizada, pero cada fallo de caché recorre el cuerpo sustituyendo"""
+
+    def _instantiate(self, plan, param_values):
+        body = self.template_table.get(plan.name).body
+        return tuple(substitute(decl.value, param_values) for decl in body)
+
+
+def best_of(func, rounds: int = 3) -> float:
+    best = float('inf')
+    for _ in range(rounds):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def expansions(text):
+    """Función que expande todos los usos de `text` con un expandidor dado"""
+    ast = parse_to_ast(text)
+    table, _ = collect_templates(ast)
+    rulesets = [(child, list(child.declarations)) for child in ast.children if isinstance(child, RuleSet)]
+
+    def expand(expander_cls, keep=False):
+        expander = expander_cls(table)
+        for ruleset, declarations in rulesets:
+            ruleset.declarations = list(declarations)
+            _expand_declarations(ruleset, expander)
+        if keep:
+            expander.result = [[d.to_dict() for d in ruleset.declarations] for ruleset, _ in rulesets]
+        return expander
+
+    return expand
+
+
+def main():
+    rules = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    text = TEMPLATES + ''.join(f'.c{i} {{\n  {USES[i % len(USES)]}\n  color = negro\n}}\n' for i in range(rules))
+    expand = expansions(text)
+    cache = expand(TemplateExpander).cache_stats()
+    assert expand(DeepcopyExpander, True).result == expand(TemplateExpander, True).result
+
+    print(f"{rules} reglas, {len(text) / 1024:.0f} KiB")
+    old = best_of(lambda: expand(DeepcopyExpander))
+    new = best_of(lambda: expand(TemplateExpander))
+    print(f"expansión con deepcopy: {old * 1000:7.1f} ms")
+    print(f"expansión memorizada:   {new * 1000:7.1f} ms ({old / new:.1f}x), caché {cache}")
+    print(f"Compiler.compile: {Compiler().compile(text)['stats']['template_cache']}")
+
+    text = BIG_TEMPLATE + ''.join(f'.p{i} {{\n  usar panel(#{i:06x}, {i}px)\n}}\n' for i in range(rules))
+    expand = expansions(text)
+    assert expand(WalkingExpander, True).result == expand(TemplateExpander, True).result
+    print(f"\n{rules} usos de una plantilla de 40 declaraciones (2 con parámetros), argumentos distintos")
+    old = best_of(lambda: expand(WalkingExpander))
+    new = best_of(lambda: expand(TemplateExpander))
+    print(f"recorriendo el cuerpo: {old * 1000:7.1f} ms")
+    print(f"plan precompilado:     {new * 1000:7.1f} ms ({old / new:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+# bench_values.py
+# Microbenchmark del analizador de valores: ValueScanner frente a la ruta
+# anterior basada en expresiones regulares (copiada aquí como referencia)
+#
+# Uso: python benchmarks/bench_values.py [iteraciones]
+
+import os
+import re
+import sys
+import timeit
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+from cssx.ast.nodes import Function, SpaceList, String, Url, VariableRef
+from cssx.parser.cssx_parser import CSSXParser
+
+VALUES = [
+    '0', 'auto', 'blanco', '16px', '90%', '#2c3e50', '0 auto', '1px solid gris',
+    '0 2px 10px rgba(0,0,0,0.1)', 'rgba(255,255,255,0.2)', 'translateY(-5px)',
+    '"Roboto", sans-serif', 'all 0.3s ease', 'calc(100% - 10px)', '@color_primario',
+]
+
+# --- Ruta anterior (regex), reproducida para comparar ---
+
+_FUNC_RE = re.compile(r'^(\w+)\s*\(([^)]+)\)$')
+
+
+def legacy_value(parser, value_str):
+    value_str = value_str.strip()
+    if (value_str.startswith('"') and value_str.endswith('"')) or \
+       (value_str.startswith("'") and value_str.endswith("'")):
+        return String(text=value_str[1:-1])
+    if value_str.startswith("@"):
+        return VariableRef(name=value_str)
+    func_match = _FUNC_RE.match(value_str) if '(' in value_str else None
+    if func_match:
+        args = tuple(arg.strip() for arg in func_match.group(2).split(','))
+        return Function(name=func_match.group(1), args=args)
+    if value_str.startswith('url(') and value_str.endswith(')'):
+        url_content = value_str[4:-1].strip()
+        if url_content.startswith('"') and url_content.endswith('"'):
+            url_content = url_content[1:-1]
+        return Url(path=url_content)
+    tokens = value_str.split()
+    if len(tokens) > 1:
+        return SpaceList(items=tuple(parser._classify_single_value(t) for t in tokens))
+    return parser._classify_single_value(value_str)
+
+
+def main():
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    parser = CSSXParser()
+
+    legacy = timeit.timeit(lambda: [legacy_value(parser, v) for v in VALUES], number=number)
+    scanner = timeit.timeit(lambda: [parser._classify_value(v, None) for v in VALUES], number=number)
+    interned = CSSXParser()
+    cached = timeit.timeit(lambda: [interned._parse_value(v, None) for v in VALUES], number=number)
+
+    total = number * len(VALUES)
+    for label, elapsed in (('regex (anterior)', legacy), ('ValueScanner', scanner), ('ValueScanner + internado', cached)):
+        print(f"{label:>26}: {elapsed:6.2f} s  {total / elapsed:12,.0f} valores/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+# bench_visitor.py
+# Visitas por segundo de ASTWalker sobre un AST grande: el recorrido
+# recursivo de antes, buscando visit_{tipo} con getattr en cada nodo o en
+# una tabla por clase, frente al recorrido iterativo con pila explícita
+#
+# Uso: python benchmarks/bench_visitor.py [copias]
+
+import os
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+from cssx.ast import nodes
+from cssx.ast.visitor import ASTWalker, _CHILDREN
+from cssx.parser.cssx_parser import parse_to_ast
+
+EXAMPLE = os.path.join(ROOT, 'examples', 'main_example.cssx')
+NODE_TYPES = [cls for cls in vars(nodes).values()
+              if isinstance(cls, type) and issubclass(cls, nodes.Node) and cls not in (nodes.Node, nodes.Loc)]
+
+
+class CountingWalker(ASTWalker):
+    """Recorre todo el árbol contando nodos visitados"""
+
+    def __init__(self):
+        self.visits = 0
+
+    def _count(self, node):
+        self.visits += 1
+
+
+for _cls in NODE_TYPES:
+    setattr(CountingWalker, f'enter_{_cls.__name__}', CountingWalker._count)
+
+
+class RecursiveCountingWalker:
+    """Recorrido recursivo como el ASTWalker de antes: un visit() por nodo"""
+
+    def __init__(self):
+        self.visits = 0
+        self._dispatch = {}
+
+    def visit(self, node):
+        try:
+            method = self._dispatch[type(node)]
+        except KeyError:
+            method = self._dispatch[type(node)] = self._method(type(node))
+        return method(node)
+
+    def _method(self, node_type):
+        return getattr(self, f'visit_{node_type.__name__}', self.generic_visit)
+
+    def generic_visit(self, node):
+        self.visits += 1
+        children = _CHILDREN.get(type(node))
+        if children is not None:
+            for child in children(node):
+                self.visit(child)
+
+
+class GetattrCountingWalker(RecursiveCountingWalker):
+    def visit(self, node):
+        return self._method(type(node))(node)
+
+
+def best_of(func, rounds: int = 3) -> float:
+    best = float('inf')
+    for _ in range(rounds):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    copies = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    with open(EXAMPLE, 'r', encoding='utf-8') as f:
+        text = '\n'.join([f.read()] * copies)
+    ast = parse_to_ast(text)
+
+    walker = CountingWalker()
+    walker.visit(ast)
+    print(f"Fuente: {len(text) / 1024:.0f} KiB, {walker.visits} visitas por recorrido")
+    walkers = (
+        ('recursivo, getattr', GetattrCountingWalker),
+        ('recursivo, tabla', RecursiveCountingWalker),
+        ('iterativo', CountingWalker),
+    )
+    for label, cls in walkers:
+        counter = cls()
+        counter.visit(ast)
+        assert counter.visits == walker.visits
+        elapsed = best_of(lambda: cls().visit(ast))
+        print(f"{label:>20}: {walker.visits / elapsed / 1e6:6.2f} M visitas/s ({elapsed * 1000:.1f} ms)")
+
+
+if __name__ == '__main__':
+    main()
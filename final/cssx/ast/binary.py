@@ -0,0 +1,312 @@
+# cssx/ast/binary.py
+# Serialización binaria y versionada del AST (cachés en disco, envío entre
+# procesos). Sin pérdidas: los tipos desconocidos producen un error en vez de
+# convertirse a texto como en to_dict.
+#
+# Formato (versión 1): MAGIC, un byte de versión y un valor codificado en
+# preorden. Cada valor empieza con un byte de etiqueta:
+#   NONE, FALSE, TRUE
+#   INT      entero zigzag en varint
+#   FLOAT    double little-endian (8 bytes)
+#   STR      cadena nueva: varint longitud + UTF-8 (recibe el siguiente id)
+#   STR_REF  varint id de una cadena ya escrita
+#   LIST, TUPLE  varint número de elementos + elementos
+#   NODE     varint código de clase + un valor por campo (orden de data_fields();
+#            la huella `fp` no se guarda)
+#   LOC      índice de líneas (INDEX o INDEX_REF) + offset
+#   LOC_FIXED  archivo (STR/STR_REF) + varints línea y columna + offset
+#   REF      varint id de un nodo ya escrito (los nodos compartidos, como los
+#            valores internados o los Loc de los selectores, se escriben una vez)
+# El offset de un Loc se escribe como diferencia zigzag con el del Loc anterior
+# (en preorden casi siempre crece poco, así que ocupa uno o dos bytes).
+# Un índice de líneas se escribe como INDEX (archivo, primera línea, número de
+# líneas y diferencias entre inicios en varint) o como INDEX_REF (varint id).
+
+import struct
+from array import array
+from typing import Any, List
+
+from cssx.ast.nodes import (
+    Loc, LineIndex, data_fields, Stylesheet, RuleSet, SimpleSelector, CompoundSelector, ComplexSelector,
+    Declaration, ColorLiteral, Number, Dimension, Percentage, Keyword, String, Url, Function,
+    SpaceList, CommaList, VariableRef, MediaQuery, VariableDecl, Param, TemplateDef, NamedArg,
+    TemplateUse,
+)
+
+MAGIC = b'CSSXAST'
+FORMAT_VERSION = 1
+
+(NONE, FALSE, TRUE, INT, FLOAT, STR, STR_REF, LIST, TUPLE, NODE, LOC, LOC_FIXED, REF,
+ INDEX, INDEX_REF) = range(15)
+
+# El código de cada clase es su posición: solo se puede añadir al final
+# (cambiar el orden o los campos exige subir FORMAT_VERSION)
+NODE_CLASSES = (
+    Stylesheet, RuleSet, SimpleSelector, CompoundSelector, ComplexSelector, Declaration,
+    ColorLiteral, Number, Dimension, Percentage, Keyword, String, Url, Function, SpaceList,
+    CommaList, VariableRef, MediaQuery, VariableDecl, Param, TemplateDef, NamedArg, TemplateUse,
+)
+_CLASS_CODES = {cls: code for code, cls in enumerate(NODE_CLASSES)}
+_FIELD_NAMES = [tuple(f.name for f in data_fields(cls)) for cls in NODE_CLASSES]
+_FIELD_COUNTS = [len(names) for names in _FIELD_NAMES]
+
+_DOUBLE = struct.Struct('<d')
+
+
+class _Done:
+    """Marca en la pila del codificador: el nodo ya escribió todos sus campos"""
+    __slots__ = ('node',)
+
+    def __init__(self, node):
+        self.node = node
+
+
+def _write_varint(out: bytearray, value: int) -> None:
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _write_signed(out: bytearray, value: int) -> None:
+    """Entero con signo en zigzag (0, -1, 1, -2... -> 0, 1, 2, 3...)"""
+    _write_varint(out, (value << 1) if value >= 0 else ((-value << 1) - 1))
+
+
+def dump(node: Any) -> bytes:
+    """Codifica un nodo (o una lista de nodos) en el formato binario"""
+    out = bytearray(MAGIC)
+    out.append(FORMAT_VERSION)
+    strings = {}
+    memo = {}       # id(nodo) -> id en el orden en que se termina de escribir
+    indexes = {}    # id(LineIndex) -> id
+    last_offset = 0
+    append = out.append
+
+    def write_str(text: str) -> None:
+        ref = strings.get(text)
+        if ref is not None:
+            append(STR_REF)
+            _write_varint(out, ref)
+            return
+        strings[text] = len(strings)
+        data = text.encode('utf-8')
+        append(STR)
+        _write_varint(out, len(data))
+        out.extend(data)
+
+    stack = [node]
+    pop = stack.pop
+    while stack:
+        value = pop()
+        cls = value.__class__
+
+        if cls is str:
+            write_str(value)
+        elif cls is _Done:
+            memo[id(value.node)] = len(memo)
+        elif value is None:
+            append(NONE)
+        elif cls is bool:
+            append(TRUE if value else FALSE)
+        elif cls is int:
+            append(INT)
+            _write_signed(out, value)
+        elif cls is float:
+            append(FLOAT)
+            out.extend(_DOUBLE.pack(value))
+        elif cls is list or cls is tuple:
+            append(LIST if cls is list else TUPLE)
+            _write_varint(out, len(value))
+            stack.extend(reversed(value))
+        elif id(value) in memo:
+            append(REF)
+            _write_varint(out, memo[id(value)])
+        elif cls is Loc:
+            index = value.index
+            if isinstance(index, LineIndex):
+                append(LOC)
+                ref = indexes.get(id(index))
+                if ref is None:
+                    indexes[id(index)] = len(indexes)
+                    append(INDEX)
+                    write_str(index.file)
+                    _write_varint(out, index.first_line)
+                    _write_varint(out, len(index.starts))
+                    previous = 0
+                    for start in index.starts:
+                        _write_varint(out, start - previous)
+                        previous = start
+                else:
+                    append(INDEX_REF)
+                    _write_varint(out, ref)
+            else:
+                append(LOC_FIXED)
+                write_str(value.file)
+                _write_varint(out, value.line)
+                _write_varint(out, value.col)
+            _write_signed(out, value.offset - last_offset)
+            last_offset = value.offset
+            memo[id(value)] = len(memo)
+        else:
+            code = _CLASS_CODES.get(cls)
+            if code is None:
+                raise TypeError(f"Tipo no serializable en el AST binario: {cls.__name__}")
+            append(NODE)
+            _write_varint(out, code)
+            stack.append(_Done(value))
+            stack.extend(getattr(value, name) for name in reversed(_FIELD_NAMES[code]))
+
+    return bytes(out)
+
+
+def load(data: bytes) -> Any:
+    """Decodifica lo escrito por dump()"""
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError("No es un AST binario de CSSX")
+    version = data[len(MAGIC)]
+    if version != FORMAT_VERSION:
+        raise ValueError(f"Versión de AST binario no soportada: {version} (se espera {FORMAT_VERSION})")
+
+    pos = len(MAGIC) + 1
+    strings: List[str] = []
+    objects: list = []
+    indexes: List[LineIndex] = []
+    # Valores compuestos a medio leer: (constructor, número de elementos, elementos)
+    frames: list = []
+    append_object = objects.append
+    last_offset = 0
+
+    def read_varint() -> int:
+        nonlocal pos
+        result = shift = 0
+        while True:
+            byte = data[pos]
+            pos += 1
+            result |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                return result
+            shift += 7
+
+    def read_str() -> str:
+        nonlocal pos
+        tag = data[pos]
+        pos += 1
+        if tag == STR_REF:
+            return strings[read_varint()]
+        length = read_varint()
+        text = data[pos:pos + length].decode('utf-8')
+        pos += length
+        strings.append(text)
+        return text
+
+    while True:
+        tag = data[pos]
+        pos += 1
+
+        # Las etiquetas más frecuentes primero; los varints de un byte se leen en línea
+        if tag == NODE:
+            code = data[pos]
+            pos += 1
+            if code > 0x7F:
+                pos -= 1
+                code = read_varint()
+            frames.append((NODE_CLASSES[code], _FIELD_COUNTS[code], []))
+            continue
+        elif tag == STR_REF:
+            ref = data[pos]
+            pos += 1
+            if ref > 0x7F:
+                pos -= 1
+                ref = read_varint()
+            value = strings[ref]
+        elif tag == LOC:
+            if data[pos] == INDEX_REF:
+                ref = data[pos + 1]
+                pos += 2
+                if ref > 0x7F:
+                    pos -= 1
+                    ref = read_varint()
+                index = indexes[ref]
+            else:
+                pos += 1
+                index = _read_index(read_str(), read_varint, read_varint())
+                indexes.append(index)
+            raw = data[pos]
+            pos += 1
+            if raw > 0x7F:
+                pos -= 1
+                raw = read_varint()
+            last_offset += (raw >> 1) if not raw & 1 else -((raw + 1) >> 1)
+            value = Loc.at(index, last_offset)
+            append_object(value)
+        elif tag == FALSE:
+            value = False
+        elif tag == TRUE:
+            value = True
+        elif tag == REF:
+            ref = data[pos]
+            pos += 1
+            if ref > 0x7F:
+                pos -= 1
+                ref = read_varint()
+            value = objects[ref]
+        elif tag == LIST or tag == TUPLE:
+            count = data[pos]
+            pos += 1
+            if count > 0x7F:
+                pos -= 1
+                count = read_varint()
+            kind = list if tag == LIST else tuple
+            if count:
+                frames.append((kind, count, []))
+                continue
+            value = kind()
+        elif tag == STR:
+            pos -= 1
+            value = read_str()
+        elif tag == NONE:
+            value = None
+        elif tag == INT:
+            raw = read_varint()
+            value = (raw >> 1) if not raw & 1 else -((raw + 1) >> 1)
+        elif tag == FLOAT:
+            value = _DOUBLE.unpack_from(data, pos)[0]
+            pos += 8
+        elif tag == LOC_FIXED:
+            file = read_str()
+            line = read_varint()
+            col = read_varint()
+            raw = read_varint()
+            last_offset += (raw >> 1) if not raw & 1 else -((raw + 1) >> 1)
+            value = Loc(file, line, col, last_offset)
+            append_object(value)
+        else:
+            raise ValueError(f"Etiqueta desconocida {tag} en la posición {pos - 1}")
+
+        # Entregar el valor a los compuestos abiertos (y cerrar los completos)
+        while frames:
+            kind, count, items = frames[-1]
+            items.append(value)
+            if len(items) < count:
+                break
+            frames.pop()
+            if kind is list:
+                value = items
+            elif kind is tuple:
+                value = tuple(items)
+            else:
+                value = kind(*items)
+                append_object(value)
+        else:
+            return value
+
+
+def _read_index(file: str, read_varint, first_line: int) -> LineIndex:
+    """Lee un índice de líneas escrito como INDEX (inicios en diferencias)"""
+    starts = array('q')
+    previous = 0
+    for _ in range(read_varint()):
+        previous += read_varint()
+        starts.append(previous)
+    return LineIndex(file, starts, first_line)
@@ -0,0 +1,374 @@
+# cssx/ast/columnar.py
+# AST columnar: los nodos estructurales se guardan en arreglos paralelos y se
+# exponen mediante vistas ligeras con la misma API que los dataclasses
+
+from abc import ABC, abstractmethod
+from array import array
+from typing import Iterable, Iterator, List, Optional
+
+from cssx.ast.nodes import (
+    Loc, Node, Stylesheet, RuleSet, Declaration, VariableDecl, TemplateDef, TemplateUse,
+    CompoundSelector, ComplexSelector, Selector,
+)
+from cssx.parser.selectors import SelectorPlan, build_selector
+
+
+# Tipos de nodo (columna `kinds`)
+STYLESHEET = 0
+RULESET = 1
+DECLARATION = 2
+VARIABLE_DECL = 3
+TEMPLATE_DEF = 4
+TEMPLATE_USE = 5
+
+# Bits de la columna `flags`
+IMPORTANT = 1
+
+# La ubicación se empaqueta como (línea << 32) | columna
+_COL_BITS = 32
+_COL_MASK = (1 << _COL_BITS) - 1
+
+
+def selector_plan(selector: Selector) -> SelectorPlan:
+    """Plan (ver cssx.parser.selectors) equivalente a un selector ya construido"""
+    spine = []
+    while isinstance(selector, ComplexSelector):
+        spine.append(selector)
+        selector = selector.right
+    if isinstance(selector, CompoundSelector):
+        plan = ('compound', tuple(('simple', part.kind, part.value) for part in selector.parts))
+    else:
+        plan = ('simple', selector.kind, selector.value)
+    for complex_selector in reversed(spine):
+        plan = ('complex', selector_plan(complex_selector.left), complex_selector.combinator, plan)
+    return plan
+
+
+class ColumnarAST:
+    """
+    AST en columnas. Los nodos estructurales (hoja, rulesets, declaraciones,
+    variables, plantillas y usos) se numeran en preorden; el nodo i ocupa la
+    posición i de cada arreglo:
+    - kinds:   tipo de nodo
+    - parents: índice del padre (-1 para la raíz)
+    - ends:    índice siguiente al último descendiente (los hijos de i son
+               i+1, ends[i+1], ... hasta ends[i])
+    - names:   id en `strings` de la propiedad/variable/plantilla, o id en
+               `selectors` del plan de selector para los rulesets
+    - values:  id en `value_table` (declaraciones y variables) o en `extras`
+               (parámetros y argumentos de plantillas); -1 si no aplica
+    - flags:   bits (IMPORTANT)
+    - lines:   línea y columna empaquetadas
+    - offsets: desplazamiento en caracteres
+    Los valores son inmutables y se guardan una sola vez en `value_table`.
+    """
+
+    def __init__(self, filename: str = "<unknown>"):
+        self.filename = filename
+        self.kinds = array('b')
+        self.parents = array('i')
+        self.ends = array('i')
+        self.names = array('i')
+        self.values = array('i')
+        self.flags = array('b')
+        self.lines = array('q')
+        self.offsets = array('q')
+        # Tablas internadas
+        self.strings: List[str] = []
+        self.value_table: list = []
+        self.selectors: List[SelectorPlan] = []
+        self.extras: list = []
+        self._string_ids: dict = {}
+        self._value_ids: dict = {}
+        self._selector_ids: dict = {}
+
+    def __len__(self) -> int:
+        return len(self.kinds)
+
+    # --- Construcción ---
+
+    @classmethod
+    def from_nodes(cls, nodes: Iterable[Node], filename: str = "<unknown>") -> 'ColumnarAST':
+        """
+        Construye el AST a partir de los nodos de nivel superior. Acepta un
+        iterador (p. ej. iter_parse), así que cada bloque puede descartarse
+        en cuanto se copia a las columnas.
+        """
+        ast = cls(filename)
+        ast._append(STYLESHEET, -1, -1, -1, 1, 1, 0)
+        for node in nodes:
+            ast._add_node(node, 0)
+        ast.ends[0] = len(ast.kinds)
+        return ast
+
+    @classmethod
+    def from_stylesheet(cls, stylesheet: Stylesheet) -> 'ColumnarAST':
+        """Construye el AST columnar equivalente a un Stylesheet"""
+        return cls.from_nodes(stylesheet.children, stylesheet.loc.file)
+
+    def _append(self, kind: int, parent: int, name: int, value: int, line: int, col: int, offset: int) -> int:
+        index = len(self.kinds)
+        self.kinds.append(kind)
+        self.parents.append(parent)
+        self.ends.append(index + 1)
+        self.names.append(name)
+        self.values.append(value)
+        self.flags.append(0)
+        self.lines.append((line << _COL_BITS) | col)
+        self.offsets.append(offset)
+        return index
+
+    def _append_node(self, kind: int, parent: int, name: int, value: int, loc: Loc) -> int:
+        return self._append(kind, parent, name, value, loc.line, loc.col, loc.offset)
+
+    def _add_node(self, node: Node, parent: int) -> None:
+        """Copia un subárbol en las columnas (iterativo: el anidamiento puede ser profundo)"""
+        # (nodo, padre) pendientes; (None, i) marca el fin del ruleset i
+        stack = [(node, parent)]
+        while stack:
+            node, parent = stack.pop()
+            if node is None:
+                self.ends[parent] = len(self.kinds)
+            elif isinstance(node, RuleSet):
+                index = self._append_node(RULESET, parent, self._intern_selector(node.selectors), -1, node.loc)
+                stack.append((None, index))
+                # Primero las declaraciones y luego los rulesets anidados
+                members = node.declarations + node.children
+                stack.extend((member, index) for member in reversed(members))
+            elif isinstance(node, Declaration):
+                index = self._append_node(DECLARATION, parent, self._intern_string(node.prop),
+                                          self._intern_value(node.value), node.loc)
+                if node.important:
+                    self.flags[index] = IMPORTANT
+            elif isinstance(node, VariableDecl):
+                self._append_node(VARIABLE_DECL, parent, self._intern_string(node.name),
+                                  self._intern_value(node.value), node.loc)
+            elif isinstance(node, TemplateDef):
+                index = self._append_node(TEMPLATE_DEF, parent, self._intern_string(node.name),
+                                          self._add_extra(tuple(node.params)), node.loc)
+                for decl in node.body:
+                    self._add_node(decl, index)
+                self.ends[index] = len(self.kinds)
+            elif isinstance(node, TemplateUse):
+                self._append_node(TEMPLATE_USE, parent, self._intern_string(node.name),
+                                  self._add_extra(tuple(node.args)), node.loc)
+            else:
+                raise TypeError(f"Nodo no soportado en el AST columnar: {type(node).__name__}")
+
+    def _intern_string(self, text: str) -> int:
+        index = self._string_ids.get(text)
+        if index is None:
+            index = self._string_ids[text] = len(self.strings)
+            self.strings.append(text)
+        return index
+
+    def _intern_value(self, value) -> int:
+        index = self._value_ids.get(value)
+        if index is None:
+            index = self._value_ids[value] = len(self.value_table)
+            self.value_table.append(value)
+        return index
+
+    def _intern_selector(self, selectors: List[Selector]) -> int:
+        plan = tuple(selector_plan(selector) for selector in selectors)
+        index = self._selector_ids.get(plan)
+        if index is None:
+            index = self._selector_ids[plan] = len(self.selectors)
+            self.selectors.append(plan)
+        return index
+
+    def _add_extra(self, item: tuple) -> int:
+        self.extras.append(item)
+        return len(self.extras) - 1
+
+    # --- Acceso ---
+
+    @property
+    def root(self) -> 'StylesheetView':
+        return StylesheetView(self, 0)
+
+    def children_of(self, index: int) -> Iterator[int]:
+        """Índices de los hijos directos del nodo `index`, en orden"""
+        ends = self.ends
+        child = index + 1
+        stop = ends[index]
+        while child < stop:
+            yield child
+            child = ends[child]
+
+    def loc(self, index: int) -> Loc:
+        packed = self.lines[index]
+        return Loc(file=self.filename, line=packed >> _COL_BITS, col=packed & _COL_MASK, offset=self.offsets[index])
+
+    def view(self, index: int) -> 'NodeView':
+        return _VIEW_TYPES[self.kinds[index]](self, index)
+
+    def to_stylesheet(self) -> Stylesheet:
+        """Reconstruye el árbol de dataclasses completo"""
+        return self.root.to_node()
+
+    def nbytes(self) -> int:
+        """Bytes ocupados por las columnas (sin contar las tablas)"""
+        columns = (self.kinds, self.parents, self.ends, self.names, self.values, self.flags, self.lines, self.offsets)
+        return sum(column.itemsize * len(column) for column in columns)
+
+
+# --- Vistas ---
+
+class NodeView(ABC):
+    """Vista de un nodo del AST columnar; no guarda más que el índice"""
+    __slots__ = ('ast', 'index')
+
+    def __init__(self, ast: ColumnarAST, index: int):
+        self.ast = ast
+        self.index = index
+
+    def __eq__(self, other) -> bool:
+        return type(other) is type(self) and other.ast is self.ast and other.index == self.index
+
+    def __hash__(self) -> int:
+        return hash((id(self.ast), self.index))
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.index})"
+
+    @property
+    def loc(self) -> Loc:
+        return self.ast.loc(self.index)
+
+    @property
+    def parent(self) -> Optional['NodeView']:
+        parent = self.ast.parents[self.index]
+        return None if parent < 0 else self.ast.view(parent)
+
+    def _name(self) -> str:
+        return self.ast.strings[self.ast.names[self.index]]
+
+    def _value(self):
+        return self.ast.value_table[self.ast.values[self.index]]
+
+    def _members(self, *kinds: int) -> list:
+        ast = self.ast
+        return [ast.view(child) for child in ast.children_of(self.index) if ast.kinds[child] in kinds]
+
+    @abstractmethod
+    def to_node(self) -> Node:
+        """Reconstruye el nodo del árbol que representa la vista"""
+
+    def to_dict(self) -> dict:
+        return self.to_node().to_dict()
+
+
+class StylesheetView(NodeView):
+    __slots__ = ()
+
+    @property
+    def children(self) -> List[NodeView]:
+        ast = self.ast
+        return [ast.view(child) for child in ast.children_of(self.index)]
+
+    def to_node(self) -> Stylesheet:
+        return Stylesheet(children=[child.to_node() for child in self.children], loc=self.loc)
+
+
+class RuleSetView(NodeView):
+    __slots__ = ()
+
+    @property
+    def selectors(self) -> List[Selector]:
+        loc = self.loc
+        return [build_selector(plan, loc) for plan in self.ast.selectors[self.ast.names[self.index]]]
+
+    @property
+    def declarations(self) -> List[NodeView]:
+        return self._members(DECLARATION, TEMPLATE_USE)
+
+    @property
+    def children(self) -> List['RuleSetView']:
+        return self._members(RULESET)
+
+    def to_node(self) -> RuleSet:
+        return RuleSet(
+            selectors=self.selectors,
+            declarations=[decl.to_node() for decl in self.declarations],
+            children=[child.to_node() for child in self.children],
+            loc=self.loc
+        )
+
+
+class DeclarationView(NodeView):
+    __slots__ = ()
+
+    @property
+    def prop(self) -> str:
+        return self._name()
+
+    @property
+    def value(self):
+        return self._value()
+
+    @property
+    def important(self) -> bool:
+        return bool(self.ast.flags[self.index] & IMPORTANT)
+
+    def to_node(self) -> Declaration:
+        return Declaration(prop=self.prop, value=self.value, important=self.important, loc=self.loc)
+
+
+class VariableDeclView(NodeView):
+    __slots__ = ()
+
+    @property
+    def name(self) -> str:
+        return self._name()
+
+    @property
+    def value(self):
+        return self._value()
+
+    def to_node(self) -> VariableDecl:
+        return VariableDecl(name=self.name, value=self.value, loc=self.loc)
+
+
+class TemplateDefView(NodeView):
+    __slots__ = ()
+
+    @property
+    def name(self) -> str:
+        return self._name()
+
+    @property
+    def params(self) -> list:
+        return list(self.ast.extras[self.ast.values[self.index]])
+
+    @property
+    def body(self) -> List[DeclarationView]:
+        return self._members(DECLARATION)
+
+    def to_node(self) -> TemplateDef:
+        return TemplateDef(name=self.name, params=self.params, body=[decl.to_node() for decl in self.body], loc=self.loc)
+
+
+class TemplateUseView(NodeView):
+    __slots__ = ()
+
+    @property
+    def name(self) -> str:
+        return self._name()
+
+    @property
+    def args(self) -> list:
+        return list(self.ast.extras[self.ast.values[self.index]])
+
+    def to_node(self) -> TemplateUse:
+        return TemplateUse(name=self.name, args=self.args, loc=self.loc)
+
+
+_VIEW_TYPES = {
+    STYLESHEET: StylesheetView,
+    RULESET: RuleSetView,
+    DECLARATION: DeclarationView,
+    VARIABLE_DECL: VariableDeclView,
+    TEMPLATE_DEF: TemplateDefView,
+    TEMPLATE_USE: TemplateUseView,
+}
@@ -0,0 +1,185 @@
+# cssx/ast/diff.py
+# Diferencias estructurales entre dos versiones de una hoja (hot reload):
+# diff(old, new) devuelve un guion mínimo de ediciones sobre RuleSets,
+# Declarations, VariableDecls y TemplateDefs (y los usos de plantilla y
+# reglas @media que aparezcan en las mismas listas).
+
+from bisect import bisect_left
+from collections import deque
+from dataclasses import dataclass
+from typing import Iterator, List, Optional
+
+from cssx.ast.columnar import selector_plan
+from cssx.ast.hashing import fingerprint
+from cssx.ast.nodes import (
+    Node, Stylesheet, RuleSet, Declaration, MediaQuery, VariableDecl, TemplateDef, TemplateUse,
+)
+
+INSERT = 'insert'
+REMOVE = 'remove'
+CHANGE = 'change'
+MOVE = 'move'
+
+
+@dataclass(slots=True)
+class Edit:
+    """
+    Una edición del guion:
+    - insert: `new` aparece en `parent` (nodo de la hoja nueva)
+    - remove: `old` desaparece de `parent` (nodo de la hoja vieja)
+    - change: `old` pasa a ser `new`; en un RuleSet le siguen las ediciones
+              de sus declaraciones y reglas anidadas
+    - move:   `old`/`new` son el mismo nodo en otra posición dentro de `parent`
+              (el orden importa en la cascada)
+    """
+    op: str
+    old: Optional[Node]
+    new: Optional[Node]
+    parent: Node
+
+    @property
+    def node(self) -> Node:
+        return self.old if self.op == REMOVE else self.new
+
+
+def identity(node: Node) -> tuple:
+    """
+    Clave con la que se emparejan los nodos entre versiones: los selectores
+    de un RuleSet, la propiedad de una declaración, el nombre de una
+    variable, plantilla o uso, o la consulta de un @media.
+    """
+    if isinstance(node, RuleSet):
+        return ('rule', tuple(selector_plan(selector) for selector in node.selectors))
+    if isinstance(node, Declaration):
+        return ('decl', node.prop)
+    if isinstance(node, (VariableDecl, TemplateDef, TemplateUse)):
+        return (type(node).__name__, node.name)
+    if isinstance(node, MediaQuery):
+        return ('media', node.query)
+    return (type(node).__name__,)
+
+
+def diff(old: Stylesheet, new: Stylesheet) -> List[Edit]:
+    """
+    Guion de ediciones que lleva de `old` a `new`, en orden de documento.
+    Los nodos se emparejan por identidad() y, entre los que comparten
+    identidad, primero por huella y luego por orden; los subárboles con la
+    misma huella se saltan sin recorrerlos. El coste es lineal en el número
+    de nodos (más n log n para detectar movimientos) y no hay recursión.
+    """
+    edits: List[Edit] = []
+    stack = [_diff_lists(old.children, new.children, old, new)]
+    while stack:
+        for item in stack[-1]:
+            if isinstance(item, Edit):
+                edits.append(item)
+            else:
+                stack.append(item)
+                break
+        else:
+            stack.pop()
+    return edits
+
+
+def _diff_lists(old_items: list, new_items: list, old_parent: Node, new_parent: Node) -> Iterator:
+    """
+    Produce las ediciones de una lista de hijos y, para cada RuleSet o @media
+    cambiado, el generador de sus miembros (lo consume diff()).
+    """
+    pairs, removed, inserted = _match(old_items, new_items)
+
+    for i in removed:
+        yield Edit(REMOVE, old_items[i], None, old_parent)
+
+    moved = _moved(pairs)
+    pair_of = dict((j, i) for i, j in pairs)
+    inserted = set(inserted)
+    for j, node in enumerate(new_items):
+        if j in inserted:
+            yield Edit(INSERT, None, node, new_parent)
+            continue
+        i = pair_of[j]
+        previous = old_items[i]
+        if i in moved:
+            yield Edit(MOVE, previous, node, new_parent)
+        if fingerprint(previous) == fingerprint(node):
+            continue
+        yield Edit(CHANGE, previous, node, new_parent)
+        if isinstance(node, RuleSet):
+            yield _diff_lists(previous.declarations, node.declarations, previous, node)
+            yield _diff_lists(previous.children, node.children, previous, node)
+        elif isinstance(node, MediaQuery):
+            yield _diff_lists(previous.children, node.children, previous, node)
+
+
+def _match(old_items: list, new_items: list) -> tuple:
+    """
+    Empareja dos listas de hermanos. Retorna (pares (i_viejo, j_nuevo),
+    índices eliminados, índices insertados).
+    """
+    old_groups = {}
+    for i, node in enumerate(old_items):
+        old_groups.setdefault(identity(node), []).append(i)
+    new_groups = {}
+    for j, node in enumerate(new_items):
+        new_groups.setdefault(identity(node), []).append(j)
+
+    pairs, removed, inserted = [], [], []
+    for key, new_indices in new_groups.items():
+        old_indices = old_groups.pop(key, None)
+        if not old_indices:
+            inserted.extend(new_indices)
+            continue
+        if len(old_indices) == 1 and len(new_indices) == 1:
+            pairs.append((old_indices[0], new_indices[0]))
+            continue
+        # Identidad repetida (p. ej. dos reglas `.card`): primero los iguales
+        by_fp = {}
+        for i in old_indices:
+            by_fp.setdefault(fingerprint(old_items[i]), deque()).append(i)
+        used = set()
+        rest_new = []
+        for j in new_indices:
+            same = by_fp.get(fingerprint(new_items[j]))
+            if same:
+                i = same.popleft()
+                used.add(i)
+                pairs.append((i, j))
+            else:
+                rest_new.append(j)
+        rest_old = [i for i in old_indices if i not in used]
+        pairs.extend(zip(rest_old, rest_new))
+        removed.extend(rest_old[len(rest_new):])
+        inserted.extend(rest_new[len(rest_old):])
+
+    for old_indices in old_groups.values():
+        removed.extend(old_indices)
+    removed.sort()
+    return pairs, removed, inserted
+
+
+def _moved(pairs: list) -> set:
+    """
+    Índices viejos que cambiaron de orden: todos los emparejados salvo una
+    subsecuencia creciente máxima (el mínimo de movimientos).
+    """
+    order = [i for _, i in sorted((j, i) for i, j in pairs)]
+    tails: List[int] = []          # último valor de cada longitud
+    tail_at: List[int] = []        # posición en `order` de ese valor
+    previous = [-1] * len(order)
+    for position, value in enumerate(order):
+        k = bisect_left(tails, value)
+        if k == len(tails):
+            tails.append(value)
+            tail_at.append(position)
+        else:
+            tails[k] = value
+            tail_at[k] = position
+        previous[position] = tail_at[k - 1] if k else -1
+
+    keep = set()
+    position = tail_at[-1] if tail_at else -1
+    while position != -1:
+        keep.add(order[position])
+        position = previous[position]
+    return set(order) - keep
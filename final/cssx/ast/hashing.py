@@ -0,0 +1,144 @@
+# cssx/ast/hashing.py
+# Huellas estructurales (hash de contenido) y hash-consing de subárboles.
+#
+# La huella de un nodo se calcula de abajo arriba a partir de su clase, sus
+# campos escalares y las huellas de sus hijos; las ubicaciones (Loc) no
+# cuentan, así que dos rulesets iguales en líneas distintas tienen la misma
+# huella. Es estable entre procesos (blake2b, no hash()), de modo que sirve
+# como clave de cachés de análisis o de generación y para detectar cambios
+# entre compilaciones. Se guarda en el campo `fp` del nodo la primera vez que
+# se pide: quien modifique un nodo en sitio debe poner `fp = None` en él y en
+# sus ancestros.
+
+from hashlib import blake2b
+from typing import Dict, Optional
+
+from cssx.ast.nodes import Loc, Node, data_fields
+
+# Bytes de la huella: con 128 bits las colisiones son despreciables y dos
+# huellas iguales se pueden tratar como subárboles iguales
+FINGERPRINT_BYTES = 16
+
+
+_CONTENT_FIELDS: Dict[type, tuple] = {}
+
+
+def _content_fields(cls) -> tuple:
+    """Nombres de los campos que entran en la huella (todos menos loc y fp)"""
+    names = _CONTENT_FIELDS.get(cls)
+    if names is None:
+        names = _CONTENT_FIELDS[cls] = tuple(f.name for f in data_fields(cls) if f.name != 'loc')
+    return names
+
+
+def _pending_children(value, out: list) -> None:
+    """Añade a `out` los nodos de `value` (nodo, lista o tupla) sin huella"""
+    if isinstance(value, (list, tuple)):
+        for item in value:
+            if isinstance(item, Node) and not isinstance(item, Loc) and item.fp is None:
+                out.append(item)
+    elif isinstance(value, Node) and not isinstance(value, Loc) and value.fp is None:
+        out.append(value)
+
+
+def _key(value):
+    """Valor de un campo con los nodos sustituidos por sus huellas"""
+    if isinstance(value, (list, tuple)):
+        return [_key(item) for item in value]
+    if isinstance(value, Node):
+        return value.fp
+    return value
+
+
+def fingerprint(node: Node) -> int:
+    """
+    Huella estructural de `node` (sin ubicaciones). Calcula y guarda en `fp`
+    las de todo el subárbol que falten, sin recursión y visitando una sola vez
+    los nodos compartidos.
+    """
+    if node.fp is not None:
+        return node.fp
+    # (nodo, hijos ya calculados)
+    stack = [(node, False)]
+    while stack:
+        current, ready = stack.pop()
+        if current.fp is not None:
+            continue
+        names = _content_fields(type(current))
+        if not ready:
+            stack.append((current, True))
+            children = []
+            for name in names:
+                _pending_children(getattr(current, name), children)
+            stack.extend((child, False) for child in children)
+            continue
+        key = repr((type(current).__name__, [_key(getattr(current, name)) for name in names]))
+        digest = blake2b(key.encode('utf-8'), digest_size=FINGERPRINT_BYTES).digest()
+        # object.__setattr__ también vale para los valores (frozen)
+        object.__setattr__(current, 'fp', int.from_bytes(digest, 'big'))
+    return node.fp
+
+
+def same_structure(a: Node, b: Node) -> bool:
+    """True si los dos subárboles son iguales salvo por sus ubicaciones"""
+    return type(a) is type(b) and fingerprint(a) == fingerprint(b)
+
+
+class SubtreeTable:
+    """
+    Tabla de hash-consing: guarda un nodo canónico por huella. intern(n)
+    devuelve el primer nodo registrado con la misma estructura que n (o el
+    propio n), así que los subárboles iguales pueden compartirse y los
+    resultados calcularse una vez por huella.
+    """
+
+    def __init__(self):
+        self.nodes: Dict[int, Node] = {}
+        self.hits = 0
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    def intern(self, node: Node) -> Node:
+        fp = fingerprint(node)
+        canonical = self.nodes.setdefault(fp, node)
+        if canonical is not node:
+            self.hits += 1
+        return canonical
+
+    def get(self, fp: int) -> Optional[Node]:
+        return self.nodes.get(fp)
+
+
+def share_subtrees(root: Node, table: Optional[SubtreeTable] = None) -> SubtreeTable:
+    """
+    Sustituye en sitio los valores de `root` (los subárboles sin ubicación)
+    por su nodo canónico en `table`, de modo que los valores iguales de
+    distintas compilaciones o fragmentos se compartan. Los nodos con Loc no
+    se sustituyen: perderían su posición para los diagnósticos.
+    """
+    table = table if table is not None else SubtreeTable()
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        for f in data_fields(type(node)):
+            value = getattr(node, f.name)
+            if isinstance(value, (list, tuple)):
+                for i, item in enumerate(value):
+                    if not isinstance(item, Node):
+                        continue
+                    if _has_loc(item):
+                        stack.append(item)
+                    elif isinstance(value, list):
+                        value[i] = table.intern(item)
+            elif isinstance(value, Node) and not isinstance(value, Loc):
+                if _has_loc(value):
+                    stack.append(value)
+                else:
+                    setattr(node, f.name, table.intern(value))
+    return table
+
+
+def _has_loc(node: Node) -> bool:
+    """True para los nodos estructurales (con ubicación); False para los valores"""
+    return any(f.name == 'loc' for f in data_fields(type(node)))
@@ -0,0 +1,178 @@
+# cssx/ast/index.py
+# Índice del AST para consultas sin recorrer el árbol: se construye con un
+# solo recorrido y responde por propiedad, selector simple, variable y
+# plantilla, con enlaces al padre y rangos de subárbol para "dentro de".
+
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from cssx.ast.nodes import (
+    Node, Stylesheet, RuleSet, Declaration, MediaQuery, VariableDecl, TemplateDef, TemplateUse,
+    SimpleSelector, CompoundSelector, ComplexSelector,
+)
+from cssx.parser.selectors import compile_selector
+
+# Clave de selector simple: (tipo, valor), p. ej. ('class', 'card')
+SelectorKey = Tuple[str, str]
+
+
+class ASTIndex:
+    """
+    Índice de un Stylesheet. Se indexan los nodos estructurales (rulesets,
+    declaraciones, variables, plantillas con su cuerpo, usos y @media); los
+    valores no, porque el parser los comparte entre declaraciones y no tienen
+    un único padre. Cada nodo recibe su número en preorden y el final de su
+    subárbol, así que "X dentro de Y" se resuelve con búsquedas binarias.
+    El índice describe el árbol al construirlo: si el árbol cambia hay que
+    construir otro.
+    """
+
+    def __init__(self, root: Stylesheet):
+        self.root = root
+        self.properties: Dict[str, List[Declaration]] = defaultdict(list)
+        self.selectors: Dict[SelectorKey, List[RuleSet]] = defaultdict(list)
+        self.variables: Dict[str, List[VariableDecl]] = defaultdict(list)
+        self.templates: Dict[str, List[TemplateDef]] = defaultdict(list)
+        self.template_uses: Dict[str, List[TemplateUse]] = defaultdict(list)
+        self._parents: Dict[int, Node] = {}
+        self._spans: Dict[int, Tuple[int, int]] = {}     # id -> (preorden, fin del subárbol)
+        self._property_order: Dict[str, List[int]] = defaultdict(list)
+        self._build()
+
+    def _build(self) -> None:
+        counter = 0
+        # (nodo, padre); (None, nodo) cierra el subárbol de nodo
+        stack: list = [(self.root, None)]
+        while stack:
+            node, parent = stack.pop()
+            if node is None:
+                start, _ = self._spans[id(parent)]
+                self._spans[id(parent)] = (start, counter)
+                continue
+
+            self._spans[id(node)] = (counter, counter + 1)
+            if parent is not None:
+                self._parents[id(node)] = parent
+            order = counter
+            counter += 1
+
+            if isinstance(node, Declaration):
+                self.properties[node.prop].append(node)
+                self._property_order[node.prop].append(order)
+                continue
+            if isinstance(node, VariableDecl):
+                self.variables[node.name].append(node)
+                continue
+            if isinstance(node, TemplateUse):
+                self.template_uses[node.name].append(node)
+                continue
+
+            if isinstance(node, RuleSet):
+                for key in _selector_keys(node.selectors):
+                    self.selectors[key].append(node)
+                members = node.declarations + node.children
+            elif isinstance(node, TemplateDef):
+                self.templates[node.name].append(node)
+                members = node.body
+            elif isinstance(node, (Stylesheet, MediaQuery)):
+                members = node.children
+            else:
+                continue
+            stack.append((None, node))
+            stack.extend((member, node) for member in reversed(members))
+
+    # --- Estructura ---
+
+    def parent(self, node: Node) -> Optional[Node]:
+        """Padre de un nodo indexado (None para la raíz)"""
+        return self._parents.get(id(node))
+
+    def ancestors(self, node: Node) -> Iterator[Node]:
+        """Padres de un nodo, del más cercano a la raíz"""
+        parent = self._parents.get(id(node))
+        while parent is not None:
+            yield parent
+            parent = self._parents.get(id(parent))
+
+    def contains(self, ancestor: Node, node: Node) -> bool:
+        """True si `node` está en el subárbol de `ancestor` (o es él)"""
+        start, end = self._spans[id(ancestor)]
+        return start <= self._spans[id(node)][0] < end
+
+    # --- Consultas ---
+
+    def rulesets(self, selector: Union[str, SelectorKey]) -> List[RuleSet]:
+        """
+        Rulesets cuyo selector menciona un selector simple (en cualquier parte
+        del compuesto o de los combinadores): '.card', '#menu', 'titulo2'
+        (se traduce como en el parser) o una clave ('class', 'card').
+        """
+        return list(self.selectors.get(_selector_key(selector), ()))
+
+    def declarations(self, prop: str, under: Union[None, str, SelectorKey, Node, Iterable[Node]] = None) -> List[Declaration]:
+        """
+        Declaraciones de `prop` en orden de documento. `under` limita a las que
+        están dentro de un nodo, de varios, o de los rulesets de un selector
+        simple (como en rulesets()), incluidas las reglas anidadas.
+        """
+        found = self.properties.get(prop, [])
+        if under is None:
+            return list(found)
+        if isinstance(under, str) or _is_selector_key(under):
+            scopes = self.rulesets(under)
+        elif isinstance(under, Node):
+            scopes = [under]
+        else:
+            scopes = list(under)
+
+        order = self._property_order.get(prop, [])
+        result = []
+        last = 0
+        # Rangos ordenados por inicio; los anidados quedan dentro del que los contiene
+        for start, end in sorted(self._spans[id(scope)] for scope in scopes):
+            first = bisect_left(order, max(start, last))
+            stop = bisect_left(order, end)
+            result.extend(found[first:stop])
+            last = max(last, end)
+        return result
+
+    def variable(self, name: str) -> List[VariableDecl]:
+        return list(self.variables.get(name, ()))
+
+    def template(self, name: str) -> List[TemplateDef]:
+        return list(self.templates.get(name, ()))
+
+    def uses(self, name: str) -> List[TemplateUse]:
+        return list(self.template_uses.get(name, ()))
+
+
+def _is_selector_key(value) -> bool:
+    """Una clave de selector es un par de cadenas; otras tuplas son de nodos"""
+    return (isinstance(value, tuple) and len(value) == 2
+            and isinstance(value[0], str) and isinstance(value[1], str))
+
+
+def _selector_key(selector: Union[str, SelectorKey]) -> SelectorKey:
+    if _is_selector_key(selector):
+        return selector
+    plan = compile_selector(selector)
+    if plan[0] != 'simple':
+        raise ValueError(f"Se esperaba un selector simple: '{selector}'")
+    return (plan[1], plan[2])
+
+
+def _selector_keys(selectors: List) -> set:
+    """Selectores simples que aparecen en una lista de selectores"""
+    keys = set()
+    stack = list(selectors)
+    while stack:
+        selector = stack.pop()
+        if isinstance(selector, SimpleSelector):
+            keys.add((selector.kind, selector.value))
+        elif isinstance(selector, CompoundSelector):
+            stack.extend(selector.parts)
+        elif isinstance(selector, ComplexSelector):
+            stack.append(selector.left)
+            stack.append(selector.right)
+    return keys
@@ -2,61 +2,116 @@
 # Definición de nodos AST para CSSX usando dataclasses con slots
 
 import dataclasses
+import io
+import json
+import math
+import typing
+from array import array
+from bisect import bisect_right
 from dataclasses import dataclass, fields
-from typing import Union, Optional, List, Tuple
+from typing import Iterator, Union, Optional, List, Tuple
 
 # --- Pretty Printer ---
 
-def to_pretty_string_visitor(node, indent=0):
-    if not isinstance(node, Node):
-        return '  ' * indent + repr(node)
-
-    name, attrs, children = node._pretty_string_parts()
-
-    indent_str = '  ' * indent
-    attr_str = f"({', '.join(attrs)})" if attrs else ""
-    
-    s = f"{indent_str}{name}{attr_str}"
-
-    for child in children:
-        s += '\n' + to_pretty_string_visitor(child, indent + 1)
-    
-    return s
+# Líneas que se acumulan antes de escribirlas en la salida
+_PRETTY_BATCH = 1024
+
+
+def write_pretty(node, out, indent: int = 0, max_depth: Optional[int] = None,
+                 max_nodes: Optional[int] = None) -> int:
+    """
+    Escribe el árbol de `node` en `out` (cualquier objeto con .write), una
+    línea por nodo, en tiempo lineal y sin recursión.
+    - max_depth: los hijos por debajo de esa profundidad se resumen con '...'
+    - max_nodes: tras escribir ese número de nodos se corta la salida
+    Retorna el número de nodos escritos.
+    """
+    batch = []
+    append = batch.append
+    written = 0
+    limit = -1 if max_nodes is None else max_nodes
+    deepest = -1 if max_depth is None else indent + max_depth
+    pads = ['  ' * n for n in range(indent + 64)]
+    # Pila de iteradores sobre los hijos pendientes de cada nivel abierto
+    stack = [iter((node,))]
+    level = indent
+    while stack:
+        for item in stack[-1]:
+            if written == limit:
+                append('... (vista previa truncada)')
+                stack.clear()
+                break
+            written += 1
+            if level + 1 >= len(pads):
+                pads.extend('  ' * n for n in range(len(pads), 2 * level + 2))
+
+            if not isinstance(item, Node):
+                append(pads[level] + repr(item))
+                continue
+            name, attrs, children = item._pretty_string_parts()
+            if attrs:
+                append(f"{pads[level]}{name}({', '.join(attrs)})")
+            else:
+                append(pads[level] + name)
+            if children:
+                if level == deepest:
+                    append(pads[level + 1] + '...')
+                else:
+                    stack.append(iter(children))
+                    level += 1
+                    break
+        else:
+            stack.pop()
+            level -= 1
+
+        if len(batch) >= _PRETTY_BATCH:
+            out.write('\n'.join(batch) + '\n')
+            batch.clear()
+
+    out.write('\n'.join(batch))
+    return written
+
+
+def to_pretty_string_visitor(node, indent=0, max_depth=None, max_nodes=None):
+    out = io.StringIO()
+    write_pretty(node, out, indent, max_depth, max_nodes)
+    return out.getvalue()
 
 # --- Base Node for Serialization ---
 
 class Node:
     """Base class for all AST nodes to provide serialization."""
+    __slots__ = ()
+
     def to_dict(self):
         """
         Serializes the dataclass instance to a dictionary, handling nested nodes
         and lists of nodes.
+        Generic fallback: every dataclass node gets a generated version at
+        import time (see _generate_serializers below).
         """
         result = {"node_type": self.__class__.__name__}
-        for f in fields(self):
-            value = getattr(self, f.name)
-            if isinstance(value, list):
-                result[f.name] = [item.to_dict() if isinstance(item, Node) else item for item in value]
-            elif isinstance(value, Node):
-                result[f.name] = value.to_dict()
-            elif isinstance(value, (str, int, float, bool, type(None))):
-                result[f.name] = value
-            elif isinstance(value, tuple):
-                 result[f.name] = [item.to_dict() if isinstance(item, Node) else item for item in value]
-            else:
-                # For complex types that are not nodes, convert to string
-                result[f.name] = str(value)
+        for f in data_fields(type(self)):
+            result[f.name] = _dict_field(getattr(self, f.name))
         return result
 
-    def to_pretty_string(self):
-        return to_pretty_string_visitor(self)
+    def _write_json(self, out):
+        out.append(json.dumps(self.to_dict()))
+
+    def __reduce__(self):
+        # Pickle nodes through their constructor: smaller and faster to load
+        # than the default slot state (parse_parallel ships them between processes)
+        return (self.__class__, tuple(getattr(self, f.name) for f in data_fields(self.__class__)))
+
+    def to_pretty_string(self, max_depth=None, max_nodes=None):
+        return to_pretty_string_visitor(self, max_depth=max_depth, max_nodes=max_nodes)
 
     def _pretty_string_parts(self):
         # Generic fallback
         name = self.__class__.__name__
         attrs = []
         children = []
-        for f in fields(self):
+        for f in data_fields(type(self)):
             value = getattr(self, f.name)
             if f.name == 'loc' and isinstance(value, Loc):
                 attrs.append(f"loc: {value.line}:{value.col}")
@@ -68,17 +123,208 @@ class Node:
                 attrs.append(f"{f.name}={repr(value)}")
         return name, attrs, children
 
-@dataclass(slots=True)
+# --- Ubicaciones ---
+
+class LineIndex:
+    """
+    Tabla de inicios de línea de un archivo, compartida por todos sus Loc.
+    `starts[i]` es el offset donde empieza la línea `first_line + i`.
+    Se comparte (no se copia) al copiar nodos.
+    """
+    __slots__ = ('file', 'starts', 'first_line')
+
+    def __init__(self, file: str, starts: Optional[array] = None, first_line: int = 1):
+        self.file = file
+        self.starts = starts if starts is not None else array('q', [0])
+        self.first_line = first_line
+
+    @classmethod
+    def from_text(cls, text: str, file: str, offset: int = 0, first_line: int = 1) -> 'LineIndex':
+        """Índice de `text`, que empieza en `offset` y `first_line` del documento"""
+        starts = array('q', [offset])
+        find = text.find
+        pos = find('\n')
+        while pos != -1:
+            starts.append(offset + pos + 1)
+            pos = find('\n', pos + 1)
+        return cls(file, starts, first_line)
+
+    def edit(self, start: int, end: int, text: str) -> None:
+        """Actualiza la tabla en el lugar tras reemplazar [start, end) por `text`"""
+        starts = self.starts
+        first = bisect_right(starts, start)    # Las líneas anteriores no cambian
+        last = bisect_right(starts, end)       # Las posteriores solo se desplazan
+        delta = len(text) - (end - start)
+        tail = starts[last:]
+        if delta:
+            tail = array('q', [pos + delta for pos in tail])
+        del starts[first:]
+        pos = text.find('\n')
+        while pos != -1:
+            starts.append(start + pos + 1)
+            pos = text.find('\n', pos + 1)
+        starts.extend(tail)
+
+    def add_line(self, offset: int) -> None:
+        """Registra el inicio de la siguiente línea (lectura en streaming)"""
+        self.starts.append(offset)
+
+    def position(self, offset: int) -> Tuple[int, int]:
+        """(línea, columna), ambas 1-based, del offset dado"""
+        i = max(bisect_right(self.starts, offset) - 1, 0)
+        return self.first_line + i, offset - self.starts[i] + 1
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __copy__(self):
+        return self
+
+
+class _FixedPosition:
+    """Posición explícita para los Loc creados sin índice de líneas"""
+    __slots__ = ('file', 'line', 'col')
+
+    def __init__(self, file: str, line: int, col: int):
+        self.file = file
+        self.line = line
+        self.col = col
+
+    def position(self, offset: int) -> Tuple[int, int]:
+        return self.line, self.col
+
+
 class Loc(Node):
-    """Información de ubicación en el código fuente"""
-    file: str
-    line: int
-    col: int
-    offset: int
+    """
+    Información de ubicación en el código fuente. Solo guarda el offset y el
+    índice de líneas del archivo; línea y columna se calculan al pedirlas.
+    """
+    __slots__ = ('index', 'offset')
+
+    def __init__(self, file: str, line: int, col: int, offset: int = 0):
+        self.index = _FixedPosition(file, line, col)
+        self.offset = offset
+
+    @classmethod
+    def at(cls, index: LineIndex, offset: int) -> 'Loc':
+        """Ubicación perezosa: `offset` dentro del archivo de `index`"""
+        loc = cls.__new__(cls)
+        loc.index = index
+        loc.offset = offset
+        return loc
+
+    @property
+    def file(self) -> str:
+        return self.index.file
+
+    @file.setter
+    def file(self, file: str) -> None:
+        if file != self.index.file:
+            self.index = _FixedPosition(file, self.line, self.col)
+
+    @property
+    def line(self) -> int:
+        return self.index.position(self.offset)[0]
+
+    @line.setter
+    def line(self, line: int) -> None:
+        self.index = _FixedPosition(self.file, line, self.col)
+
+    @property
+    def col(self) -> int:
+        return self.index.position(self.offset)[1]
+
+    @col.setter
+    def col(self, col: int) -> None:
+        self.index = _FixedPosition(self.file, self.line, col)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Loc):
+            return NotImplemented
+        return (self.offset == other.offset and self.file == other.file
+                and self.index.position(self.offset) == other.index.position(other.offset))
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f"Loc(file={self.file!r}, line={self.line}, col={self.col}, offset={self.offset})"
+
+    def __reduce__(self):
+        return (Loc.at, (self.index, self.offset))
+
+    def __deepcopy__(self, memo):
+        return Loc.at(self.index, self.offset)
+
+    def to_dict(self):
+        line, col = self.index.position(self.offset)
+        return {"node_type": "Loc", "file": self.file, "line": line, "col": col, "offset": self.offset}
+
+    def _write_json(self, out):
+        line, col = self.index.position(self.offset)
+        out.append(f'{{"node_type": "Loc", "file": {_json_scalar(self.file)}, '
+                   f'"line": {line}, "col": {col}, "offset": {self.offset}}}')
+
     def _pretty_string_parts(self):
         return "Loc", [f"{self.line}:{self.col}"], []
 
 
+# --- Cuerpos diferidos (modo perezoso del parser) ---
+
+class LazyBody:
+    """Cuerpo de bloque aún sin parsear; `load()` produce la lista de nodos"""
+    __slots__ = ('load',)
+
+    def __init__(self, load):
+        self.load = load
+
+
+# (clase, campo) -> descriptor del slot original
+_LAZY_SLOTS = {}
+
+
+def _lazy_field(cls, name):
+    """
+    Permite que el campo `name` de `cls` guarde un LazyBody: el primer acceso
+    lo parsea y lo reemplaza por la lista resultante.
+    """
+    slot = _LAZY_SLOTS[cls, name] = getattr(cls, name)
+
+    def get(self):
+        value = slot.__get__(self, cls)
+        if value.__class__ is LazyBody:
+            value = value.load()
+            slot.__set__(self, value)
+        return value
+
+    setattr(cls, name, property(get, slot.__set__))
+
+
+def _fingerprint_field():
+    """
+    Campo `fp` de todos los nodos: huella estructural del subárbol (ver
+    cssx.ast.hashing), None mientras no se calcule. Es un dato derivado: no
+    participa en la igualdad ni en la serialización (ver data_fields).
+    """
+    return dataclasses.field(default=None, compare=False, repr=False, kw_only=True,
+                             metadata={'derived': True})
+
+
+_DATA_FIELDS = {}
+
+
+def data_fields(cls) -> tuple:
+    """Campos con contenido de una clase de nodo (sin los derivados, como `fp`)"""
+    result = _DATA_FIELDS.get(cls)
+    if result is None:
+        result = _DATA_FIELDS[cls] = tuple(f for f in fields(cls) if not f.metadata.get('derived'))
+    return result
+
+
+def is_loaded(node, name):
+    """True si el campo `name` de `node` ya no es un cuerpo pendiente de parsear"""
+    return _LAZY_SLOTS[type(node), name].__get__(node).__class__ is not LazyBody
+
+
 # --- Top-Level Structure ---
 
 @dataclass(slots=True)
@@ -86,6 +332,7 @@ class Stylesheet(Node):
     """Nodo raíz del AST que contiene toda la hoja de estilos"""
     children: List[Union['RuleSet', 'AtRule', 'TemplateDef']]
     loc: Loc
+    fp: Optional[int] = _fingerprint_field()
     def _pretty_string_parts(self):
         return "StyleSheet", [f"loc: {self.loc.line}:{self.loc.col}"], self.children
 
@@ -96,6 +343,7 @@ class RuleSet(Node):
     declarations: List[Union['Declaration', 'TemplateUse']]
     children: List[Union['RuleSet', 'AtRule']]
     loc: Loc
+    fp: Optional[int] = _fingerprint_field()
     def _pretty_string_parts(self):
         children = []
         children.extend(self.selectors)
@@ -103,6 +351,8 @@ class RuleSet(Node):
         children.extend(self.children)
         return "RuleSet", [f"loc: {self.loc.line}:{self.loc.col}"], children
 
+_lazy_field(RuleSet, 'declarations')
+
 # === Selectors ===
 
 @dataclass(slots=True)
@@ -111,6 +361,7 @@ class SimpleSelector(Node):
     kind: str
     value: str
     loc: Loc
+    fp: Optional[int] = _fingerprint_field()
     def _pretty_string_parts(self):
         return "SimpleSelector", [f"{self.kind}: '{self.value}'"], []
 
@@ -119,6 +370,7 @@ class CompoundSelector(Node):
     """Selector compuesto (múltiples selectores simples sin espacios)"""
     parts: Tuple['SimpleSelector', ...]
     loc: Loc
+    fp: Optional[int] = _fingerprint_field()
     def _pretty_string_parts(self):
         return "CompoundSelector", [], self.parts
 
@@ -129,6 +381,7 @@ class ComplexSelector(Node):
     combinator: str
     right: Union['CompoundSelector', 'ComplexSelector']
     loc: Loc
+    fp: Optional[int] = _fingerprint_field()
     def _pretty_string_parts(self):
         return "ComplexSelector", [f"combinator: '{self.combinator}'"], [self.left, self.right]
 
@@ -141,71 +394,90 @@ class Declaration(Node):
     value: 'Value'
     important: bool
     loc: Loc
+    fp: Optional[int] = _fingerprint_field()
     def _pretty_string_parts(self):
         value_type = self.value.__class__.__name__
         return "Declaration", [f"{self.prop}: {value_type}"], [self.value]
 
 # --- Value Hierarchy ---
+# Los valores son inmutables: el parser los comparte entre declaraciones.
 
-@dataclass(slots=True)
+@dataclass(slots=True, frozen=True)
 class ColorLiteral(Node):
     name_or_hex: str
+    fp: Optional[int] = _fingerprint_field()
     def _pretty_string_parts(self):
         return "ColorLiteral", [f"'{self.name_or_hex}'"], []
 
-@dataclass(slots=True)
+@dataclass(slots=True, frozen=True)
 class Number(Node):
     n: float
+    fp: Optional[int] = _fingerprint_field()
     def _pretty_string_parts(self):
         return "Number", [str(self.n)], []
 
-@dataclass(slots=True)
+@dataclass(slots=True, frozen=True)
 class Dimension(Node):
     n: float
     unit: str
+    fp: Optional[int] = _fingerprint_field()
     def _pretty_string_parts(self):
         return "Dimension", [f"{self.n}{self.unit}"], []
 
-@dataclass(slots=True)
+@dataclass(slots=True, frozen=True)
 class Percentage(Node):
     n: float
+    fp: Optional[int] = _fingerprint_field()
     def _pretty_string_parts(self):
         return "Percentage", [f"{self.n}%"], []
 
-@dataclass(slots=True)
+@dataclass(slots=True, frozen=True)
 class Keyword(Node):
     name: str
+    fp: Optional[int] = _fingerprint_field()
     def _pretty_string_parts(self):
         return "Keyword", [f"'{self.name}'"], []
 
-@dataclass(slots=True)
+@dataclass(slots=True, frozen=True)
 class String(Node):
     text: str
+    fp: Optional[int] = _fingerprint_field()
     def _pretty_string_parts(self):
         return "String", [f"'{self.text}'"], []
 
-@dataclass(slots=True)
+@dataclass(slots=True, frozen=True)
 class Url(Node):
     path: str
+    fp: Optional[int] = _fingerprint_field()
     def _pretty_string_parts(self):
         return "Url", [f"'{self.path}'"], []
 
-@dataclass(slots=True)
+@dataclass(slots=True, frozen=True)
 class Function(Node):
     name: str
     args: tuple
+    fp: Optional[int] = _fingerprint_field()
     def _pretty_string_parts(self):
         return "Function", [f"name='{self.name}'"], list(self.args)
 
-@dataclass(slots=True)
+@dataclass(slots=True, frozen=True)
 class SpaceList(Node):
     items: tuple
+    fp: Optional[int] = _fingerprint_field()
     def _pretty_string_parts(self):
         return "SpaceList", [], list(self.items)
 
-@dataclass(slots=True)
+@dataclass(slots=True, frozen=True)
+class CommaList(Node):
+    items: tuple
+    fp: Optional[int] = _fingerprint_field()
+    def _pretty_string_parts(self):
+        return "CommaList", [], list(self.items)
+
+@dataclass(slots=True, frozen=True)
 class VariableRef(Node):
     name: str
+    fp: Optional[int] = _fingerprint_field()
     def _pretty_string_parts(self):
         return "VariableRef", [f"'{self.name}'"], []
 
@@ -217,6 +489,7 @@ class MediaQuery(Node):
     query: str
     children: List[Union['RuleSet', 'AtRule']]
     loc: Loc
+    fp: Optional[int] = _fingerprint_field()
     def _pretty_string_parts(self):
         return "MediaQuery", [f"query='{self.query}'"], self.children
 
@@ -226,6 +499,7 @@ class VariableDecl(Node):
     name: str
     value: 'Value'
     loc: Loc
+    fp: Optional[int] = _fingerprint_field()
     def _pretty_string_parts(self):
         return "VariableDecl", [f"name='{self.name}'"], [self.value]
 
@@ -235,6 +509,7 @@ class Param(Node):
     name: str
     default_value: Optional['Value'] = None
     loc: Optional[Loc] = None
+    fp: Optional[int] = _fingerprint_field()
     def _pretty_string_parts(self):
         attrs = [f"name='{self.name}'"]
         children = []
@@ -249,18 +524,22 @@ class TemplateDef(Node):
     params: List[Param]
     body: List[Declaration]
     loc: Loc
+    fp: Optional[int] = _fingerprint_field()
     def _pretty_string_parts(self):
         children = []
         children.extend(self.params)
         children.extend(self.body)
         return "TemplateDef", [f"name='{self.name}'"], children
 
+_lazy_field(TemplateDef, 'body')
+
 @dataclass(slots=True)
 class NamedArg(Node):
     """Argumento nombrado en uso de plantilla: @param=valor"""
     name: str
     value: 'Value'
     loc: Loc
+    fp: Optional[int] = _fingerprint_field()
     def _pretty_string_parts(self):
         return "NamedArg", [f"name='{self.name}'"], [self.value]
 
@@ -270,6 +549,7 @@ class TemplateUse(Node):
     name: str
     args: List[Union['Value', NamedArg]]
     loc: Loc
+    fp: Optional[int] = _fingerprint_field()
     def _pretty_string_parts(self):
         return "TemplateUse", [f"name='{self.name}'"], self.args
 
@@ -280,7 +560,7 @@ Selector = Union[SimpleSelector, CompoundSelector, ComplexSelector]
 
 Value = Union[
     ColorLiteral, Number, Dimension, Percentage, Keyword,
-    String, Url, Function, SpaceList, VariableRef
+    String, Url, Function, SpaceList, CommaList, VariableRef
 ]
 
 AtRule = Union[MediaQuery, VariableDecl, TemplateUse]
@@ -289,3 +569,155 @@ ASTNode = Union[
     Stylesheet, RuleSet, SimpleSelector, CompoundSelector, ComplexSelector,
     Declaration, Value, AtRule, Param, TemplateDef, NamedArg
 ]
+
+
+# === Serializadores generados ===
+# Node.to_dict es genérico (fields() + isinstance por campo). Al importar el
+# módulo se genera, para cada clase de nodo, un to_dict y un escritor JSON
+# con los campos desenrollados según su anotación de tipo.
+
+_encode_str = json.encoder.encode_basestring_ascii
+
+
+def _json_scalar(value) -> str:
+    """Igual que json.dumps para valores que no son nodos ni listas"""
+    if value.__class__ is str:
+        return _encode_str(value)
+    if value is None:
+        return 'null'
+    if value is True:
+        return 'true'
+    if value is False:
+        return 'false'
+    if isinstance(value, int):
+        return int.__repr__(value)
+    if isinstance(value, float):
+        if math.isfinite(value):
+            return float.__repr__(value)
+        return 'NaN' if value != value else ('Infinity' if value > 0 else '-Infinity')
+    return _encode_str(str(value))
+
+
+def _json_list(items, out) -> None:
+    if not items:
+        out.append('[]')
+        return
+    append = out.append
+    append('[')
+    first = True
+    for item in items:
+        if not first:
+            append(', ')
+        first = False
+        if isinstance(item, Node):
+            item._write_json(out)
+        else:
+            append(_json_scalar(item))
+    append(']')
+
+
+def _dict_field(value):
+    """Conversión genérica de un campo (misma lógica que Node.to_dict)"""
+    if isinstance(value, (list, tuple)):
+        return [item.to_dict() if isinstance(item, Node) else item for item in value]
+    if isinstance(value, Node):
+        return value.to_dict()
+    if isinstance(value, (str, int, float, bool, type(None))):
+        return value
+    # For complex types that are not nodes, convert to string
+    return str(value)
+
+
+def _json_field(value, out) -> None:
+    if isinstance(value, Node):
+        value._write_json(out)
+    elif isinstance(value, (list, tuple)):
+        _json_list(value, out)
+    else:
+        out.append(_json_scalar(value))
+
+
+def _field_kind(annotation) -> str:
+    """'list', 'str' u 'other' según la anotación del campo"""
+    if annotation in (list, tuple) or typing.get_origin(annotation) in (list, tuple):
+        return 'list'
+    if annotation is str:
+        return 'str'
+    return 'other'
+
+
+def _generate_serializers(cls) -> None:
+    """Genera e instala to_dict y _write_json para una clase de nodo"""
+    name = cls.__name__
+    dict_items = [f"'node_type': {name!r}"]
+    json_lines = []
+    literal = '{"node_type": ' + _encode_str(name)
+    for f in data_fields(cls):
+        kind = _field_kind(f.type)
+        attr = f"self.{f.name}"
+        literal += ', ' + _encode_str(f.name) + ': '
+        if kind == 'list':
+            dict_items.append(f"{f.name!r}: [x.to_dict() if isinstance(x, Node) else x for x in {attr}]")
+            json_lines += [f"append({literal!r})", f"_json_list({attr}, out)"]
+        elif kind == 'str':
+            dict_items.append(f"{f.name!r}: {attr}")
+            json_lines += [f"append({literal!r})", f"append(_json_scalar({attr}))"]
+        else:
+            dict_items.append(f"{f.name!r}: _dict_field({attr})")
+            json_lines += [f"append({literal!r})", f"_json_field({attr}, out)"]
+        literal = ''
+    json_lines.append(f"append({literal + '}'!r})")
+
+    source = (
+        "def to_dict(self):\n"
+        f"    return {{{', '.join(dict_items)}}}\n"
+        "def _write_json(self, out):\n"
+        "    append = out.append\n"
+        + ''.join(f"    {line}\n" for line in json_lines)
+    )
+    namespace = {'Node': Node, '_dict_field': _dict_field, '_json_field': _json_field,
+                 '_json_list': _json_list, '_json_scalar': _json_scalar}
+    exec(source, namespace)
+    cls.to_dict = namespace['to_dict']
+    cls._write_json = namespace['_write_json']
+
+
+def _node_classes(base=Node):
+    for cls in base.__subclasses__():
+        yield cls
+        yield from _node_classes(cls)
+
+
+for _cls in list(_node_classes()):
+    if dataclasses.is_dataclass(_cls):
+        _generate_serializers(_cls)
+
+
+def iter_json(node: Node, chunk_size: int = 64 * 1024) -> Iterator[str]:
+    """
+    Codifica un nodo como JSON (el mismo texto que json.dumps(node.to_dict()))
+    sin construir el diccionario intermedio. Los hijos de un Stylesheet se
+    escriben uno a uno y el texto se entrega en trozos de ~chunk_size.
+    """
+    if not isinstance(node, Stylesheet):
+        out = []
+        node._write_json(out)
+        yield ''.join(out)
+        return
+
+    out = ['{"node_type": "Stylesheet", "children": [']
+    size = 0
+    for i, child in enumerate(node.children):
+        if i:
+            out.append(', ')
+        start = len(out)
+        child._write_json(out)
+        size += sum(len(part) for part in out[start:])
+        if size >= chunk_size:
+            yield ''.join(out)
+            out = []
+            size = 0
+    out.append('], "loc": ')
+    node.loc._write_json(out)
+    out.append('}')
+    yield ''.join(out)
@@ -2,20 +2,41 @@
 # Patrón Visitor para recorrer y transformar el AST
 
 from abc import ABC, abstractmethod
-from typing import Any, TypeVar, Generic
+from typing import Any, Callable, Dict, TypeVar, Generic
 from cssx.ast.nodes import *
 
 T = TypeVar('T')
 
 
 class ASTVisitor(ABC, Generic[T]):
-    """Clase base abstracta para implementar visitantes del AST"""
+    """
+    Clase base abstracta para implementar visitantes del AST.
+    Cada subclase tiene su propia tabla de despacho (tipo de nodo -> función
+    visit_*), que se rellena la primera vez que visita cada tipo; así no se
+    construye el nombre del método ni se hace getattr en cada nodo. Los
+    métodos se buscan en la clase: asignar visit_* a una instancia o
+    añadirlos a la clase después de usarla no cambia el despacho.
+    """
+    _dispatch: Dict[type, Callable] = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._dispatch = {}
     
     def visit(self, node: ASTNode) -> T:
         """Método principal para visitar un nodo"""
-        method_name = f'visit_{type(node).__name__}'
-        visitor = getattr(self, method_name, self.generic_visit)
-        return visitor(node)
+        try:
+            method = self._dispatch[type(node)]
+        except KeyError:
+            method = self._resolve_visit(type(node))
+        return method(self, node)
+
+    @classmethod
+    def _resolve_visit(cls, node_type: type) -> Callable:
+        """Busca visit_<Tipo> (o generic_visit) y lo guarda en la tabla de la clase"""
+        method = getattr(cls, f'visit_{node_type.__name__}', cls.generic_visit)
+        cls._dispatch[node_type] = method
+        return method
     
     def generic_visit(self, node: ASTNode) -> T:
         """Método genérico para nodos no implementados específicamente"""
@@ -26,18 +47,42 @@ class ASTVisitor(ABC, Generic[T]):
 
 
 class ASTTransformer(ASTVisitor[ASTNode]):
-    """Visitante que transforma el AST, devolviendo un nuevo AST"""
+    """
+    Visitante que transforma el AST con copia en escritura: cada visit_*
+    devuelve el mismo objeto si ninguno de sus hijos cambió y solo crea nodos
+    nuevos en el camino hasta lo modificado. Las subclases sobrescriben los
+    visit_* de lo que quieren cambiar; el coste de lo que no tocan es solo
+    el recorrido.
+    """
+    
+    def _visit_items(self, items):
+        """Visita una lista o tupla; retorna la misma si ningún elemento cambió"""
+        changed = None
+        for i, item in enumerate(items):
+            new_item = self.visit(item)
+            if changed is None:
+                if new_item is item:
+                    continue
+                changed = list(items[:i])
+            changed.append(new_item)
+        if changed is None:
+            return items
+        return changed if isinstance(items, list) else tuple(changed)
     
     def visit_Stylesheet(self, node: Stylesheet) -> Stylesheet:
         """Visita un nodo Stylesheet"""
-        new_children = [self.visit(child) for child in node.children]
+        new_children = self._visit_items(node.children)
+        if new_children is node.children:
+            return node
         return Stylesheet(children=new_children, loc=node.loc)
     
     def visit_RuleSet(self, node: RuleSet) -> RuleSet:
         """Visita un nodo RuleSet"""
-        new_selectors = [self.visit(sel) for sel in node.selectors]
-        new_declarations = [self.visit(decl) for decl in node.declarations]
-        new_children = [self.visit(child) for child in node.children]
+        new_selectors = self._visit_items(node.selectors)
+        new_declarations = self._visit_items(node.declarations)
+        new_children = self._visit_items(node.children)
+        if new_selectors is node.selectors and new_declarations is node.declarations and new_children is node.children:
+            return node
         return RuleSet(
             selectors=new_selectors,
             declarations=new_declarations, 
@@ -47,17 +92,21 @@ class ASTTransformer(ASTVisitor[ASTNode]):
     
     def visit_SimpleSelector(self, node: SimpleSelector) -> SimpleSelector:
         """Visita un nodo SimpleSelector"""
-        return SimpleSelector(kind=node.kind, value=node.value, loc=node.loc)
+        return node
     
     def visit_CompoundSelector(self, node: CompoundSelector) -> CompoundSelector:
         """Visita un nodo CompoundSelector"""
-        new_parts = tuple(self.visit(part) for part in node.parts)
+        new_parts = self._visit_items(node.parts)
+        if new_parts is node.parts:
+            return node
         return CompoundSelector(parts=new_parts, loc=node.loc)
     
     def visit_ComplexSelector(self, node: ComplexSelector) -> ComplexSelector:
         """Visita un nodo ComplexSelector"""
         new_left = self.visit(node.left)
         new_right = self.visit(node.right)
+        if new_left is node.left and new_right is node.right:
+            return node
         return ComplexSelector(
             left=new_left,
             combinator=node.combinator,
@@ -67,199 +116,221 @@ class ASTTransformer(ASTVisitor[ASTNode]):
     
     def visit_Declaration(self, node: Declaration) -> Declaration:
         """Visita un nodo Declaration"""
-        new_value = self.visit(node.value) if hasattr(node.value, '__class__') else node.value
+        new_value = self.visit(node.value)
+        if new_value is node.value:
+            return node
+        # Nodo nuevo: su huella (fp) se recalcula cuando se pida
         return Declaration(
             prop=node.prop,
             value=new_value,
             important=node.important,
-            loc=node.loc,
-            fp=node.fp
+            loc=node.loc
         )
     
     # === VALORES ===
+    # Las hojas son inmutables: se devuelven tal cual
     
     def visit_ColorLiteral(self, node: ColorLiteral) -> ColorLiteral:
         """Visita un nodo ColorLiteral"""
-        return ColorLiteral(name_or_hex=node.name_or_hex)
+        return node
     
     def visit_Number(self, node: Number) -> Number:
         """Visita un nodo Number"""
-        return Number(n=node.n)
+        return node
     
     def visit_Dimension(self, node: Dimension) -> Dimension:
         """Visita un nodo Dimension"""
-        return Dimension(n=node.n, unit=node.unit)
+        return node
     
     def visit_Percentage(self, node: Percentage) -> Percentage:
         """Visita un nodo Percentage"""
-        return Percentage(n=node.n)
+        return node
     
     def visit_Keyword(self, node: Keyword) -> Keyword:
         """Visita un nodo Keyword"""
-        return Keyword(name=node.name)
+        return node
     
     def visit_String(self, node: String) -> String:
         """Visita un nodo String"""
-        return String(text=node.text)
+        return node
     
     def visit_Url(self, node: Url) -> Url:
         """Visita un nodo Url"""
-        return Url(path=node.path)
+        return node
     
     def visit_Function(self, node: Function) -> Function:
         """Visita un nodo Function"""
-        new_args = tuple(self.visit(arg) if hasattr(arg, '__class__') else arg for arg in node.args)
+        new_args = self._visit_items(node.args)
+        if new_args is node.args:
+            return node
         return Function(name=node.name, args=new_args)
     
     def visit_SpaceList(self, node: SpaceList) -> SpaceList:
         """Visita un nodo SpaceList"""
-        new_items = tuple(self.visit(item) if hasattr(item, '__class__') else item for item in node.items)
+        new_items = self._visit_items(node.items)
+        if new_items is node.items:
+            return node
         return SpaceList(items=new_items)
     
+    def visit_CommaList(self, node: CommaList) -> CommaList:
+        """Visita un nodo CommaList"""
+        new_items = self._visit_items(node.items)
+        if new_items is node.items:
+            return node
+        return CommaList(items=new_items)
+    
     def visit_VariableRef(self, node: VariableRef) -> VariableRef:
         """Visita un nodo VariableRef"""
-        return VariableRef(name=node.name)
+        return node
     
     # === AT-RULES Y PLANTILLAS ===
     
     def visit_MediaQuery(self, node: MediaQuery) -> MediaQuery:
         """Visita un nodo MediaQuery"""
-        new_children = [self.visit(child) for child in node.children]
+        new_children = self._visit_items(node.children)
+        if new_children is node.children:
+            return node
         return MediaQuery(query=node.query, children=new_children, loc=node.loc)
     
     def visit_VariableDecl(self, node: VariableDecl) -> VariableDecl:
         """Visita un nodo VariableDecl"""
-        new_value = self.visit(node.value) if hasattr(node.value, '__class__') else node.value
+        new_value = self.visit(node.value)
+        if new_value is node.value:
+            return node
         return VariableDecl(name=node.name, value=new_value, loc=node.loc)
     
     def visit_Param(self, node: Param) -> Param:
         """Visita un nodo Param"""
-        new_default = self.visit(node.default_value) if node.default_value and hasattr(node.default_value, '__class__') else node.default_value
+        if node.default_value is None:
+            return node
+        new_default = self.visit(node.default_value)
+        if new_default is node.default_value:
+            return node
         return Param(name=node.name, default_value=new_default, loc=node.loc)
     
     def visit_TemplateDef(self, node: TemplateDef) -> TemplateDef:
         """Visita un nodo TemplateDef"""
-        new_params = tuple(self.visit(param) for param in node.params)
-        new_body = tuple(self.visit(decl) for decl in node.body)
+        new_params = self._visit_items(node.params)
+        new_body = self._visit_items(node.body)
+        if new_params is node.params and new_body is node.body:
+            return node
         return TemplateDef(name=node.name, params=new_params, body=new_body, loc=node.loc)
     
+    def visit_NamedArg(self, node: NamedArg) -> NamedArg:
+        """Visita un nodo NamedArg"""
+        new_value = self.visit(node.value)
+        if new_value is node.value:
+            return node
+        return NamedArg(name=node.name, value=new_value, loc=node.loc)
+    
     def visit_TemplateUse(self, node: TemplateUse) -> TemplateUse:
         """Visita un nodo TemplateUse"""
-        new_args = tuple(self.visit(arg) if hasattr(arg, '__class__') else arg for arg in node.args)
+        new_args = self._visit_items(node.args)
+        if new_args is node.args:
+            return node
         return TemplateUse(name=node.name, args=new_args, loc=node.loc)
 
 
+# Devuelto por enter_<Tipo>: no descender en el nodo
+SKIP = object()
+
+
+def _rule_members(node: RuleSet) -> list:
+    return [*node.selectors, *node.declarations, *node.children]
+
+
+def _template_members(node: TemplateDef) -> list:
+    return [*node.params, *node.body]
+
+
+def _param_default(node: Param) -> tuple:
+    return (node.default_value,) if node.default_value else ()
+
+
+# Hijos de cada tipo de nodo, en el orden en que se visitan; el resto son hojas
+_CHILDREN: Dict[type, Callable] = {
+    Stylesheet: lambda node: node.children,
+    RuleSet: _rule_members,
+    CompoundSelector: lambda node: node.parts,
+    ComplexSelector: lambda node: (node.left, node.right),
+    Declaration: lambda node: (node.value,),
+    Function: lambda node: node.args,
+    SpaceList: lambda node: node.items,
+    CommaList: lambda node: node.items,
+    MediaQuery: lambda node: node.children,
+    VariableDecl: lambda node: (node.value,),
+    Param: _param_default,
+    TemplateDef: _template_members,
+    NamedArg: lambda node: (node.value,),
+    TemplateUse: lambda node: node.args,
+}
+
+
 class ASTWalker(ASTVisitor[None]):
-    """Visitante que recorre el AST sin transformarlo (para análisis, depuración, etc.)"""
-    
-    def visit_Stylesheet(self, node: Stylesheet) -> None:
-        """Visita un nodo Stylesheet"""
-        for child in node.children:
-            self.visit(child)
-    
-    def visit_RuleSet(self, node: RuleSet) -> None:
-        """Visita un nodo RuleSet"""
-        for selector in node.selectors:
-            self.visit(selector)
-        for declaration in node.declarations:
-            self.visit(declaration)
-        for child in node.children:
-            self.visit(child)
-    
-    def visit_SimpleSelector(self, node: SimpleSelector) -> None:
-        """Visita un nodo SimpleSelector"""
-        pass
-    
-    def visit_CompoundSelector(self, node: CompoundSelector) -> None:
-        """Visita un nodo CompoundSelector"""
-        for part in node.parts:
-            self.visit(part)
-    
-    def visit_ComplexSelector(self, node: ComplexSelector) -> None:
-        """Visita un nodo ComplexSelector"""
-        self.visit(node.left)
-        self.visit(node.right)
-    
-    def visit_Declaration(self, node: Declaration) -> None:
-        """Visita un nodo Declaration"""
-        if hasattr(node.value, '__class__'):
-            self.visit(node.value)
-    
-    # === VALORES ===
-    
-    def visit_ColorLiteral(self, node: ColorLiteral) -> None:
-        """Visita un nodo ColorLiteral"""
-        pass
-    
-    def visit_Number(self, node: Number) -> None:
-        """Visita un nodo Number"""
-        pass
-    
-    def visit_Dimension(self, node: Dimension) -> None:
-        """Visita un nodo Dimension"""
-        pass
-    
-    def visit_Percentage(self, node: Percentage) -> None:
-        """Visita un nodo Percentage"""
-        pass
-    
-    def visit_Keyword(self, node: Keyword) -> None:
-        """Visita un nodo Keyword"""
-        pass
-    
-    def visit_String(self, node: String) -> None:
-        """Visita un nodo String"""
-        pass
-    
-    def visit_Url(self, node: Url) -> None:
-        """Visita un nodo Url"""
-        pass
-    
-    def visit_Function(self, node: Function) -> None:
-        """Visita un nodo Function"""
-        for arg in node.args:
-            if hasattr(arg, '__class__'):
-                self.visit(arg)
-    
-    def visit_SpaceList(self, node: SpaceList) -> None:
-        """Visita un nodo SpaceList"""
-        for item in node.items:
-            if hasattr(item, '__class__'):
-                self.visit(item)
-    
-    def visit_VariableRef(self, node: VariableRef) -> None:
-        """Visita un nodo VariableRef"""
-        pass
-    
-    # === AT-RULES Y PLANTILLAS ===
-    
-    def visit_MediaQuery(self, node: MediaQuery) -> None:
-        """Visita un nodo MediaQuery"""
-        for child in node.children:
-            self.visit(child)
-    
-    def visit_VariableDecl(self, node: VariableDecl) -> None:
-        """Visita un nodo VariableDecl"""
-        if hasattr(node.value, '__class__'):
-            self.visit(node.value)
-    
-    def visit_Param(self, node: Param) -> None:
-        """Visita un nodo Param"""
-        if node.default_value and hasattr(node.default_value, '__class__'):
-            self.visit(node.default_value)
-    
-    def visit_TemplateDef(self, node: TemplateDef) -> None:
-        """Visita un nodo TemplateDef"""
-        for param in node.params:
-            self.visit(param)
-        for decl in node.body:
-            self.visit(decl)
-    
-    def visit_TemplateUse(self, node: TemplateUse) -> None:
-        """Visita un nodo TemplateUse"""
-        for arg in node.args:
-            if hasattr(arg, '__class__'):
-                self.visit(arg)
+    """
+    Visitante que recorre el AST sin transformarlo (para análisis, depuración,
+    etc.). visit(node) recorre el subárbol con una pila explícita, sin
+    recursión, así que la profundidad de anidamiento no tiene límite. Para
+    cada nodo llama, si están definidos:
+    - enter_<Tipo>(node) en preorden; puede retornar SKIP para no descender,
+      o la lista de hijos a recorrer en lugar de los de siempre
+    - leave_<Tipo>(node) en postorden (salvo si se saltó el nodo)
+    Un visit_<Tipo> de la subclase se ocupa él solo de su nodo: se llama en
+    lugar de los ganchos y el recorrido no desciende en él.
+    """
+    _walk_table: Dict[type, tuple] = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._walk_table = {}
+
+    @classmethod
+    def _resolve_visit(cls, node_type: type) -> Callable:
+        """visit_<Tipo> si la subclase lo define; si no, el recorrido iterativo"""
+        method = getattr(cls, f'visit_{node_type.__name__}', None) or cls._walk
+        cls._dispatch[node_type] = method
+        return method
+
+    @classmethod
+    def _resolve_walk(cls, node_type: type) -> tuple:
+        """(visit_, enter_, leave_, hijos) de un tipo, guardado en la tabla de la clase"""
+        name = node_type.__name__
+        hooks = (
+            getattr(cls, f'visit_{name}', None),
+            getattr(cls, f'enter_{name}', None),
+            getattr(cls, f'leave_{name}', None),
+            _CHILDREN.get(node_type),
+        )
+        cls._walk_table[node_type] = hooks
+        return hooks
+
+    def _walk(self, node: ASTNode) -> None:
+        """Recorre el subárbol de node con una pila explícita"""
+        table = self._walk_table
+        # Nodos pendientes; una tupla (leave_, nodo) cierra un nodo
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            if current.__class__ is tuple:
+                current[0](self, current[1])
+                continue
+            try:
+                visit, enter, leave, children = table[current.__class__]
+            except KeyError:
+                visit, enter, leave, children = self._resolve_walk(current.__class__)
+            if visit is not None and current is not node:
+                visit(self, current)
+                continue
+            members = enter(self, current) if enter is not None else None
+            if members is SKIP:
+                continue
+            if leave is not None:
+                stack.append((leave, current))
+            if members is None:
+                if children is None:
+                    continue
+                members = children(current)
+            stack.extend(reversed(members))
 
 
 class ASTPrinter(ASTWalker):
@@ -272,51 +343,47 @@ class ASTPrinter(ASTWalker):
         """Imprime con indentación"""
         print("  " * self.indent_level + text)
     
-    def _with_indent(self, func, *args, **kwargs):
-        """Ejecuta una función con indentación incrementada"""
-        self.indent_level += 1
-        try:
-            return func(*args, **kwargs)
-        finally:
-            self.indent_level -= 1
+    def _dedent(self, node) -> None:
+        """Cierra la indentación abierta al entrar en el nodo"""
+        self.indent_level -= 1
     
-    def visit_Stylesheet(self, node: Stylesheet) -> None:
+    def enter_Stylesheet(self, node: Stylesheet) -> None:
         """Imprime un nodo Stylesheet"""
         self._print(f"Stylesheet (loc: {node.loc.line}:{node.loc.col})")
-        self._with_indent(super().visit_Stylesheet, node)
+        self.indent_level += 1
     
-    def visit_RuleSet(self, node: RuleSet) -> None:
+    def enter_RuleSet(self, node: RuleSet) -> None:
         """Imprime un nodo RuleSet"""
         self._print(f"RuleSet (loc: {node.loc.line}:{node.loc.col})")
-        self._with_indent(super().visit_RuleSet, node)
+        self.indent_level += 1
     
-    def visit_SimpleSelector(self, node: SimpleSelector) -> None:
+    def enter_SimpleSelector(self, node: SimpleSelector) -> None:
         """Imprime un nodo SimpleSelector"""
         self._print(f"SimpleSelector({node.kind}: '{node.value}')")
     
-    def visit_Declaration(self, node: Declaration) -> None:
+    def enter_Declaration(self, node: Declaration) -> None:
         """Imprime un nodo Declaration"""
         importance = " !important" if node.important else ""
         self._print(f"Declaration({node.prop}: {type(node.value).__name__}{importance})")
-        self._with_indent(super().visit_Declaration, node)
+        self.indent_level += 1
     
-    def visit_ColorLiteral(self, node: ColorLiteral) -> None:
+    def enter_ColorLiteral(self, node: ColorLiteral) -> None:
         """Imprime un nodo ColorLiteral"""
         self._print(f"ColorLiteral('{node.name_or_hex}')")
     
-    def visit_Number(self, node: Number) -> None:
+    def enter_Number(self, node: Number) -> None:
         """Imprime un nodo Number"""
         self._print(f"Number({node.n})")
     
-    def visit_Dimension(self, node: Dimension) -> None:
+    def enter_Dimension(self, node: Dimension) -> None:
         """Imprime un nodo Dimension"""
         self._print(f"Dimension({node.n}{node.unit})")
     
-    def visit_Keyword(self, node: Keyword) -> None:
+    def enter_Keyword(self, node: Keyword) -> None:
         """Imprime un nodo Keyword"""
         self._print(f"Keyword('{node.name}')")
     
-    def visit_String(self, node: String) -> None:
+    def enter_String(self, node: String) -> None:
         """Imprime un nodo String"""
         self._print(f"String('{node.text}')")
 
@@ -324,39 +391,29 @@ class ASTPrinter(ASTWalker):
         """Imprime un string simple"""
         self._print(f"str('{node}')")
 
-    def visit_VariableRef(self, node: VariableRef) -> None:
+    def enter_VariableRef(self, node: VariableRef) -> None:
         """Imprime un nodo VariableRef"""
         self._print(f"VariableRef('{node.name}')")
     
-    def visit_TemplateDef(self, node) -> None:
+    def enter_TemplateDef(self, node) -> None:
         """Imprime un nodo TemplateDef"""
         self._print(f"TemplateDef('{node.name}')")
-        self._with_indent(self._visit_template_children, node)
-    
-    def _visit_template_children(self, node):
-        """Helper para visitar hijos de template con indentación"""
-        for param in node.params:
-            self.visit(param)
-        for decl in node.body:
-            self.visit(decl)
+        self.indent_level += 1
     
-    def visit_TemplateUse(self, node) -> None:
+    def enter_TemplateUse(self, node) -> None:
         """Imprime un nodo TemplateUse"""
         self._print(f"TemplateUse('{node.name}')")
-        self._with_indent(self._visit_use_args, node)
-    
-    def _visit_use_args(self, node):
-        """Helper para visitar argumentos de template use"""
-        for arg in node.args:
-            self.visit(arg)
+        self.indent_level += 1
     
-    def visit_Param(self, node) -> None:
+    def enter_Param(self, node) -> None:
         """Imprime un nodo Param"""
         self._print(f"Param('{node.name}')")
-        if node.default_value:
-            self._with_indent(self.visit, node.default_value)
+        self.indent_level += 1
     
-    def visit_NamedArg(self, node) -> None:
+    def enter_NamedArg(self, node) -> None:
         """Imprime un nodo NamedArg"""
         self._print(f"NamedArg('{node.name}')")
-        self._with_indent(self.visit, node.value)
+        self.indent_level += 1
+    
+    leave_Stylesheet = leave_RuleSet = leave_Declaration = _dedent
+    leave_TemplateDef = leave_TemplateUse = leave_Param = leave_NamedArg = _dedent
@@ -1,8 +1,9 @@
 # cssx/codegen/ast_css_generator.py
 
 from cssx.ast.nodes import *
-from cssx.ast.visitor import ASTWalker
+from cssx.ast.visitor import ASTWalker, SKIP
 from cssx.lexer.dictionaries import DICCIONARIO_CSS
+from cssx.passes import Pass, CONTAINERS
 
 class AstCssGenerator(ASTWalker):
     """
@@ -20,27 +21,37 @@ class AstCssGenerator(ASTWalker):
     def indent(self):
         return '  ' * self.indent_level
 
-    def visit_Stylesheet(self, node: Stylesheet):
-        for child in node.children:
-            # Skip template definitions and global declarations like 'titulo_pagina'
-            if not isinstance(child, (TemplateDef, VariableDecl)) and \
-               not (isinstance(child, Declaration) and child.prop == 'titulo_pagina'):
-                self.visit(child)
+    def enter_Stylesheet(self, node: Stylesheet):
+        return [child for child in node.children if self._emits_at_top_level(child)]
 
-    def visit_RuleSet(self, node: RuleSet):
+    @staticmethod
+    def _emits_at_top_level(child) -> bool:
+        # Skip template definitions and global declarations like 'titulo_pagina'
+        return not isinstance(child, (TemplateDef, VariableDecl)) and \
+            not (isinstance(child, Declaration) and child.prop == 'titulo_pagina')
+
+    def enter_RuleSet(self, node: RuleSet):
         if not node.selectors:
-            return
+            return SKIP
+
+        # Nested rules are visited with this selector as prefix
+        self.current_path.append(self._emit_rule(node))
+        return node.children
+
+    def leave_RuleSet(self, node: RuleSet):
+        self.current_path.pop()
 
+    def _emit_rule(self, node: RuleSet) -> str:
+        """Emits the rule for the declarations of a ruleset; returns its selector"""
         selector_str = self._render_selectors(node.selectors)
         
-        # Handle nested rules
-        parent_selector = ' '.join(self.current_path)
-        full_selector = f"{parent_selector} {selector_str}".strip() if parent_selector else selector_str
-        
         # Group declarations by selector
         declarations = [decl for decl in node.declarations if isinstance(decl, Declaration)]
         
         if declarations:
+            # Handle nested rules (joined only when needed: the path grows with nesting)
+            parent_selector = ' '.join(self.current_path)
+            full_selector = f"{parent_selector} {selector_str}".strip() if parent_selector else selector_str
             self.css.append(f"{self.indent()}{full_selector} {{")
             self.indent_level += 1
             for decl in declarations:
@@ -48,13 +59,7 @@ class AstCssGenerator(ASTWalker):
             self.indent_level -= 1
             self.css.append(f"{self.indent()}}}")
             self.css.append('') # Add a blank line for readability
-
-        # Visit nested rules
-        if node.children:
-            self.current_path.append(selector_str)
-            for child in node.children:
-                self.visit(child)
-            self.current_path.pop()
+        return selector_str
 
     def visit_Declaration(self, node: Declaration):
         # Ignore special properties used for HTML generation
@@ -133,4 +138,36 @@ class AstCssGenerator(ASTWalker):
             return f'url("{value.path}")'
         elif isinstance(value, SpaceList):
             return ' '.join([self._render_value(item) for item in value.items])
+        elif isinstance(value, CommaList):
+            return ', '.join([self._render_value(item) for item in value.items])
         return ''
+
+
+class CssPass(Pass):
+    """
+    AstCssGenerator as a pass, so CSS can be produced in the same traversal
+    as other passes. The output is the same as generate(); read it from `css`.
+    """
+    name = 'css'
+    node_types = (Node,)
+
+    def __init__(self):
+        self.generator = AstCssGenerator()
+
+    @property
+    def css(self) -> str:
+        return '\n'.join(self.generator.css)
+
+    def enter(self, node, parent):
+        generator = self.generator
+        if isinstance(node, RuleSet):
+            if generator.enter_RuleSet(node) is SKIP:
+                return SKIP
+        elif isinstance(node, CONTAINERS):
+            return None
+        elif not isinstance(parent, Stylesheet) or generator._emits_at_top_level(node):
+            generator.visit(node)
+
+    def exit(self, node, parent):
+        if isinstance(node, RuleSet):
+            self.generator.leave_RuleSet(node)
@@ -1,8 +1,9 @@
 # cssx/codegen/ast_html_generator.py
 
 from cssx.ast.nodes import *
-from cssx.ast.visitor import ASTWalker
+from cssx.ast.visitor import ASTWalker, SKIP
 from cssx.lexer.dictionaries import DICCIONARIO_HTML
+from cssx.passes import Pass
 
 class AstHtmlGenerator(ASTWalker):
     """
@@ -12,6 +13,7 @@ class AstHtmlGenerator(ASTWalker):
         self.html_parts = []
         self.indent_level = 0
         self.title = "Generated Page"
+        self._tags = []
 
     def generate(self, ast: Stylesheet) -> (str, str):
         self.visit(ast)
@@ -21,23 +23,34 @@ class AstHtmlGenerator(ASTWalker):
     def indent(self):
         return '  ' * self.indent_level
 
-    def visit_Stylesheet(self, node: Stylesheet):
+    def enter_Stylesheet(self, node: Stylesheet):
         # First, find the page title from global declarations
         for child in node.children:
             if isinstance(child, Declaration) and child.prop == 'titulo_pagina':
-                if isinstance(child.value, String):
-                    self.title = child.value.text
+                self._set_title(child)
                 break
         
         # Then, build the body by visiting only the top-level RuleSet nodes
-        for child in node.children:
-            if isinstance(child, RuleSet):
-                self.visit(child)
+        return [child for child in node.children if isinstance(child, RuleSet)]
+
+    def _set_title(self, declaration: Declaration):
+        if isinstance(declaration.value, String):
+            self.title = declaration.value.text
 
-    def visit_RuleSet(self, node: RuleSet):
+    def enter_RuleSet(self, node: RuleSet):
         if not node.selectors:
-            return
+            return SKIP
+
+        self._tags.append(self._open_element(node))
+
+        # Visit only nested RuleSet children
+        return [child for child in node.children if isinstance(child, RuleSet)]
 
+    def leave_RuleSet(self, node: RuleSet):
+        self._close_element(self._tags.pop())
+
+    def _open_element(self, node: RuleSet) -> str:
+        """Emits the opening tag and text of a ruleset's element; returns the tag"""
         # --- 1. Determine Tag and Attributes ---
         selector = node.selectors[0]
         tag, attributes = self._selector_to_tag(selector)
@@ -75,12 +88,9 @@ class AstHtmlGenerator(ASTWalker):
         # Add text content if it exists
         if text_content:
             self.html_parts.append(f"{self.indent()}{text_content}")
+        return tag
 
-        # Recursively visit only nested RuleSet children
-        for child in node.children:
-            if isinstance(child, RuleSet):
-                self.visit(child)
-        
+    def _close_element(self, tag: str):
         self.indent_level -= 1
 
         # --- 5. Generate Closing Tag ---
@@ -122,4 +132,37 @@ class AstHtmlGenerator(ASTWalker):
     def visit_Declaration(self, node: Declaration):
         # This visitor only cares about RuleSets for generating HTML structure.
         # Declarations are handled inside visit_RuleSet.
-        pass
\ No newline at end of file
+        pass
+
+
+class HtmlPass(Pass):
+    """
+    AstHtmlGenerator as a pass, so HTML can be produced in the same traversal
+    as other passes. The output is the same as generate(); read it from `html`.
+    """
+    name = 'html'
+    node_types = (RuleSet, MediaQuery, Declaration)
+
+    def __init__(self):
+        self.generator = AstHtmlGenerator()
+        self._title_seen = False
+
+    @property
+    def html(self) -> (str, str):
+        return self.generator.title, '\n'.join(self.generator.html_parts)
+
+    def enter(self, node, parent):
+        if isinstance(node, Declaration):
+            # The page title comes from the first global 'titulo_pagina'
+            if isinstance(parent, Stylesheet) and node.prop == 'titulo_pagina' and not self._title_seen:
+                self._title_seen = True
+                self.generator._set_title(node)
+            return None
+        # Only rulesets nested in rulesets become elements: @media is skipped
+        if isinstance(node, MediaQuery):
+            return SKIP
+        return SKIP if self.generator.enter_RuleSet(node) is SKIP else None
+
+    def exit(self, node, parent):
+        if isinstance(node, RuleSet):
+            self.generator.leave_RuleSet(node)
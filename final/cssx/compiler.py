@@ -1,9 +1,16 @@
 # cssx/compiler.py
 
-from cssx.parser.cssx_parser import parse_to_ast, ParseError
-from cssx.semantics.analyzer import SemanticAnalyzer, VariableResolver
-from cssx.codegen.ast_css_generator import AstCssGenerator
-from cssx.codegen.ast_html_generator import AstHtmlGenerator
+import time
+from typing import IO, List
+
+from cssx.ast.index import ASTIndex
+from cssx.ast.nodes import Stylesheet
+from cssx.parser.cssx_parser import iter_parse, parse_to_ast, ParseError
+from cssx.passes import PassManager
+from cssx.semantics.analyzer import SemanticAnalyzer, VariableResolver, ResolutionPass
+from cssx.semantics.templates import TemplateTable
+from cssx.codegen.ast_css_generator import AstCssGenerator, CssPass
+from cssx.codegen.ast_html_generator import HtmlPass
 from cssx.semantics.diagnostics import Diagnostic
 
 class Compiler:
@@ -17,56 +24,101 @@ class Compiler:
     def compile(self, code: str, filename: str = "<input>"):
         """
         Compiles CSSX code to CSS and HTML.
+        The passes after parsing run under a PassManager, which fuses them
+        into three traversals (template collection; expansion and analysis;
+        resolution, CSS and HTML). Per-pass times and the template expansion
+        cache figures are in result['stats'].
+        Once analysis has run, result['index'] is an ASTIndex of the expanded
+        stylesheet, built once here for tools that query the document
+        (properties, selectors, variables) without walking it again; it is
+        None if parsing failed.
         """
         diagnostics = []
+        passes = PassManager()
         
         # 1. Parsing
+        start = time.perf_counter()
         try:
             ast = parse_to_ast(code, filename)
         except Exception as e:
             diagnostics.append(Diagnostic(
                 "ERROR", "E0001", f"Error de Parseo: {e}", filename, getattr(e, 'loc', (1,1))[0], getattr(e, 'loc', (1,1))[1]
             ))
-            return self._build_result(success=False, diagnostics=diagnostics)
+            return self._build_result(success=False, diagnostics=diagnostics, passes=passes)
+        finally:
+            passes.record('parse', time.perf_counter() - start)
 
         # 2. Semantic Analysis
         analyzer = SemanticAnalyzer(filename)
-        analysis_diagnostics, context = analyzer.analyze(ast)
+        analysis_diagnostics, context, ast = analyzer.analyze(ast, passes)
         diagnostics.extend(analysis_diagnostics)
 
+        start = time.perf_counter()
+        index = ASTIndex(ast)
+        passes.record('index', time.perf_counter() - start)
+
         has_errors = any(d.severity == 'ERROR' for d in diagnostics)
         if has_errors:
-            return self._build_result(success=False, diagnostics=diagnostics)
-
-        # 3. Variable Resolution
-        resolver = VariableResolver(context)
-        resolved_ast = resolver.resolve(ast)
+            return self._build_result(success=False, diagnostics=diagnostics, passes=passes, index=index)
 
-        # 4. Code Generation
+        # 3. Variable Resolution and Code Generation, in one traversal.
+        # Resolution is copy-on-write: `ast` itself is left unresolved.
         try:
-            css_generator = AstCssGenerator()
-            css_output = css_generator.generate(resolved_ast)
-
-            html_generator = AstHtmlGenerator()
-            title, body_html = html_generator.generate(resolved_ast)
+            css_pass, html_pass = CssPass(), HtmlPass()
+            passes.run(ast, [ResolutionPass(context), css_pass, html_pass])
+            css_output = css_pass.css
+            title, body_html = html_pass.html
             full_html = self._create_full_html(title, css_output, body_html)
 
         except Exception as e:
             diagnostics.append(Diagnostic(
                 "ERROR", "E0002", f"Error inesperado durante la generación de código: {e}", filename, 1, 1
             ))
-            return self._build_result(success=False, diagnostics=diagnostics)
+            return self._build_result(success=False, diagnostics=diagnostics, passes=passes, index=index)
+
+        return self._build_result(success=True, css=css_output, html=full_html, diagnostics=diagnostics,
+                                  passes=passes, index=index)
+
+    def compile_css_stream(self, source: IO[str], out: IO[str], filename: str = "<input>") -> List[Diagnostic]:
+        """
+        Compiles CSSX to CSS one top-level block at a time, without ever
+        holding the full AST: each block is parsed, analyzed, resolved and
+        written to `out` as soon as its closing brace is read.
+        Templates and variables must be defined before they are used.
+        CSS already written is not retracted if a later block has errors;
+        the returned diagnostics say whether the output is usable.
+        """
+        analyzer = SemanticAnalyzer(filename)
+        tpl_table = TemplateTable()
+        resolver = VariableResolver(analyzer.context)
+        first = True
+
+        for node in iter_parse(source, filename):
+            analyzer.analyze_node(node, tpl_table)
+
+            resolved = resolver.resolve(node)
+            css = AstCssGenerator().generate(Stylesheet(children=[resolved], loc=node.loc))
+            if css:
+                out.write(css if first else '\n' + css)
+                first = False
 
-        return self._build_result(success=True, css=css_output, html=full_html, diagnostics=diagnostics)
+        diagnostics, _ = analyzer.finish()
+        return diagnostics
 
-    def _build_result(self, success, css='', html='', diagnostics=[]):
+    def _build_result(self, success, css='', html='', diagnostics=[], passes=None, index=None):
         """Helper to build the final result dictionary."""
         serializable_diagnostics = [d.to_dict() for d in diagnostics]
+        stats = {'timings_ms': {}}
+        if passes is not None:
+            stats['timings_ms'] = passes.timings_ms()
+            stats.update(passes.stats)
         return {
             'success': success,
             'css': css,
             'html': html,
-            'diagnostics': serializable_diagnostics
+            'diagnostics': serializable_diagnostics,
+            'stats': stats,
+            'index': index,
         }
 
     def _create_full_html(self, title: str, css: str, body: str) -> str:
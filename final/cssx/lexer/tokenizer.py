@@ -0,0 +1,165 @@
+# tokenizer.py
+# Analizador léxico de una sola pasada para CSSX
+
+import re
+from dataclasses import dataclass
+from typing import List, Optional
+
+
+class TokenKind:
+    """Tipos de token producidos por el tokenizador"""
+    OPEN = "OPEN"        # Cabecera de bloque: '.card {', 'plantilla x(@p) {'
+    CLOSE = "CLOSE"      # Cierre de bloque: '}'
+    USE = "USE"          # Uso de plantilla: 'usar nombre(args)'
+    VAR = "VAR"          # Variable: '@nombre = valor'
+    DECL = "DECL"        # Declaración: 'propiedad: valor' o 'propiedad = valor'
+    OTHER = "OTHER"      # Cualquier otra línea no vacía
+    SLICE = "SLICE"      # Líneas sin llaves aún sin tokenizar (ver tokenize_skeleton)
+
+
+@dataclass(slots=True)
+class Token:
+    """Token de línea con su posición exacta en el código fuente"""
+    kind: str
+    offset: int              # Desplazamiento (en caracteres) del primer carácter no blanco
+    line: int                # Línea 1-based
+    col: int                 # Columna 1-based
+    text: str                # Línea sin espacios alrededor
+    name: Optional[str] = None    # Propiedad o variable (DECL/VAR)
+    value: Optional[str] = None   # Texto del valor (DECL/VAR)
+    depth: int = 0           # Balance de llaves de la línea ('{' suma, '}' resta)
+
+
+# Patrón precompilado (se aplica sobre la línea ya recortada). Una variable
+# '@nombre' solo se reconoce si la sigue '='; el resto son declaraciones.
+_DECL_RE = re.compile(r'(@[\w\u00C0-\u017F]+(?=\s*=)|[\w\u00C0-\u017F-]+)\s*[:=]\s*(.+)')
+_BRACE_RE = re.compile(r'[{}]')
+
+
+def tokenize(text: str, offset: int = 0, line: int = 1) -> List[Token]:
+    """
+    Recorre el código fuente una sola vez y produce la lista de tokens.
+    Las líneas vacías y los comentarios ('#', '//') no generan tokens,
+    por lo que sus llaves tampoco cuentan para el balance de bloques.
+    `offset` y `line` indican dónde empieza `text` dentro del documento
+    completo (para tokenizar solo un fragmento). Los offsets cuentan
+    caracteres, no bytes: son índices de `str`, los mismos que usan Loc y
+    LineIndex, así que un carácter no ASCII ocupa una sola posición.
+    """
+    tokens: List[Token] = []
+    append = tokens.append
+    match_decl = _DECL_RE.match
+    line_no = line - 1
+
+    for raw in text.split('\n'):
+        line_no += 1
+        stripped = raw.strip()
+        if not stripped or stripped[0] == '#' or stripped.startswith('//'):
+            offset += len(raw) + 1
+            continue
+
+        lead = raw.find(stripped[0])
+        opens = stripped.count('{')
+        closes = stripped.count('}')
+        name = value = None
+
+        if opens and not closes:
+            kind = TokenKind.OPEN
+        elif stripped == '}':
+            kind = TokenKind.CLOSE
+        elif stripped.startswith('usar '):
+            kind = TokenKind.USE
+        else:
+            match = match_decl(stripped)
+            if match:
+                name = match.group(1)
+                value = match.group(2).strip()
+                kind = TokenKind.VAR if name[0] == '@' else TokenKind.DECL
+            else:
+                kind = TokenKind.OTHER
+
+        append(Token(kind, offset + lead, line_no, lead + 1, stripped, name, value, opens - closes))
+        offset += len(raw) + 1
+
+    return tokens
+
+
+def tokenize_skeleton(text: str, offset: int = 0, line: int = 1) -> List[Token]:
+    """
+    Esqueleto de `text` para el modo perezoso: solo se tokenizan las líneas
+    con llaves (cabeceras y cierres de bloque). Cada tramo de líneas entre
+    ellas queda como un token SLICE con el texto crudo (`text`), su offset y
+    su primera línea, sin pasar por el patrón de declaraciones;
+    expand_slices() lo tokeniza cuando hace falta. Expandir todos los SLICE
+    da exactamente los tokens de tokenize(text, offset, line).
+    """
+    tokens: List[Token] = []
+    append = tokens.append
+    search = _BRACE_RE.search
+    gap = 0                 # Inicio del tramo pendiente (siempre al principio de una línea)
+    gap_line = line
+    counted, line_no = 0, line   # Saltos de línea contados hasta `counted`
+
+    match = search(text)
+    while match:
+        start = text.rfind('\n', 0, match.start()) + 1
+        end = text.find('\n', match.end())
+        if end == -1:
+            end = len(text)
+        line_no += text.count('\n', counted, start)
+        counted = start
+        raw = text[start:end]
+        stripped = raw.strip()
+        # Los comentarios con llaves no cuentan: se quedan en el tramo
+        if stripped[0] != '#' and not stripped.startswith('//'):
+            if gap < start and not text[gap:start].isspace():
+                append(Token(TokenKind.SLICE, offset + gap, gap_line, 1, text[gap:start]))
+            opens = stripped.count('{')
+            closes = stripped.count('}')
+            if opens and not closes or stripped == '}':
+                # Cabecera o cierre (lo habitual): sin pasar por tokenize()
+                lead = raw.find(stripped[0])
+                kind = TokenKind.OPEN if opens else TokenKind.CLOSE
+                append(Token(kind, offset + start + lead, line_no, lead + 1, stripped, None, None, opens - closes))
+            else:
+                tokens.extend(tokenize(raw, offset + start, line_no))
+            gap, gap_line = end + 1, line_no + 1
+        match = search(text, end + 1)
+
+    if gap < len(text) and not text[gap:].isspace():
+        append(Token(TokenKind.SLICE, offset + gap, gap_line, 1, text[gap:]))
+    return tokens
+
+
+def expand_slices(tokens: List[Token]) -> List[Token]:
+    """Tokens con los SLICE de tokenize_skeleton() ya tokenizados"""
+    expanded: List[Token] = []
+    for token in tokens:
+        if token.kind == TokenKind.SLICE:
+            expanded.extend(tokenize(token.text, token.offset, token.line))
+        else:
+            expanded.append(token)
+    return expanded
+
+
+def match_blocks(tokens: List[Token]) -> List[int]:
+    """
+    Calcula, en una sola pasada con una pila, el índice del token que cierra
+    cada bloque. Un bloque abierto por el token OPEN i se cierra en el primer
+    token j > i cuyo balance acumulado de llaves queda por debajo del que había
+    tras la cabecera; si nunca se cierra, el valor es len(tokens). Para los
+    tokens que no son OPEN el valor no se usa.
+    """
+    n = len(tokens)
+    closes = [n] * n
+    pending: List[tuple] = []  # (umbral, índice) con umbrales no decrecientes
+    level = 0
+
+    for i, token in enumerate(tokens):
+        level += token.depth
+        while pending and pending[-1][0] >= level:
+            closes[pending.pop()[1]] = i
+        if token.kind == TokenKind.OPEN:
+            pending.append((level - 1, i))
+
+    return closes
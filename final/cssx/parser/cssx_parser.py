@@ -1,10 +1,27 @@
 # cssx_parser.py
 # Parser que convierte código CSSX a AST
 
+import bisect
+import io
+import os
 import re
-from typing import List, Optional, Tuple, Union, Any
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import IO, Any, Iterator, List, Optional, Tuple, Union
 from cssx.ast.nodes import *
-from cssx.lexer.dictionaries import COLORES, DICCIONARIO_CSS, DICCIONARIO_HTML, SELECTORES_HTML_ESTANDAR
+from cssx.ast import binary
+from cssx.ast.columnar import ColumnarAST
+from cssx.lexer.dictionaries import COLORES, DICCIONARIO_CSS, SELECTORES_HTML_ESTANDAR
+from cssx.lexer.tokenizer import Token, TokenKind, expand_slices, match_blocks, tokenize, tokenize_skeleton
+from cssx.parser.selectors import parse_selector
+from cssx.parser.values import ValueScanner, split_top_level
+
+
+# Patrones precompilados para valores
+_HEX_RE = re.compile(r'^#[0-9a-fA-F]{3,8}$')
+# El número no es ambiguo (sin '\d*\.?\d+'), así que no hay retroceso cuadrático
+_DIM_RE = re.compile(r'^([-+]?(?:\d+(?:\.\d+)?|\.\d+))(px|em|rem|vh|vw|pt|pc|in|cm|mm|ex|ch|vmin|vmax|s|ms)$')
+_NUMERIC_START = frozenset('+-.0123456789')
 
 
 class ParseError(Exception):
@@ -14,76 +31,203 @@ class ParseError(Exception):
         self.loc = loc
 
 
+def _shift_locs(nodes: list, offset_delta: int, line_delta: int, index: LineIndex) -> None:
+    """Desplaza en el lugar todos los Loc de los subárboles dados"""
+    field_names = {}
+    seen = set()
+    stack = list(nodes)
+    while stack:
+        node = stack.pop()
+        if isinstance(node, Loc):
+            if id(node) not in seen:
+                seen.add(id(node))
+                node.offset += offset_delta
+                if isinstance(node.index, LineIndex):
+                    # La línea sale del índice (ya actualizado) del documento
+                    node.index = index
+                else:
+                    node.line += line_delta
+            continue
+        if not isinstance(node, Node):
+            continue
+        cls = type(node)
+        names = field_names.get(cls)
+        if names is None:
+            names = field_names[cls] = tuple(f.name for f in data_fields(cls))
+        for name in names:
+            value = getattr(node, name)
+            if isinstance(value, (list, tuple)):
+                stack.extend(value)
+            elif value is not None:
+                stack.append(value)
+
+
+def _strip_closing_paren(text: str) -> str:
+    """Quita el paréntesis que cierra la lista de parámetros o argumentos"""
+    text = text.strip()
+    return text[:-1] if text.endswith(')') else text
+
+
+def _iter_lines(fileobj: IO[str], chunk_size: int) -> Iterator[str]:
+    """Produce las líneas (sin el salto de línea) leyendo el archivo por bloques"""
+    rest = ''
+    while True:
+        chunk = fileobj.read(chunk_size)
+        if not chunk:
+            break
+        lines = (rest + chunk).split('\n')
+        rest = lines.pop()
+        yield from lines
+    yield rest
+
+
+def _split_top_level_blocks(text: str, parts: int) -> List[Tuple[str, int, int]]:
+    """
+    Divide el código en hasta `parts` fragmentos de tamaño parecido, cortando
+    solo entre bloques de nivel superior. Retorna (fragmento, offset, línea)
+    para cada uno. Sigue las mismas reglas que el tokenizador: las llaves
+    dentro de comentarios no cuentan.
+    """
+    step = max(len(text) // parts, 1)
+    target = step
+    chunks = []
+    start = start_line = 0
+    offset = 0
+    balance = floor = 0   # No hay bloques abiertos cuando balance == floor
+
+    for line_no, raw in enumerate(text.split('\n')):
+        offset += len(raw) + 1
+        if '{' in raw or '}' in raw:
+            line = raw.strip()
+            if not (line[0] == '#' or line.startswith('//')):
+                balance += line.count('{') - line.count('}')
+                floor = min(floor, balance)
+        if balance == floor and offset >= target and offset < len(text):
+            chunks.append((text[start:offset - 1], start, start_line + 1))
+            start, start_line = offset, line_no + 1
+            target = offset + step
+
+    chunks.append((text[start:], start, start_line + 1))
+    return chunks
+
+
+def _parse_chunk(args: Tuple[str, int, int, str]) -> bytes:
+    """
+    Parsea un fragmento de nivel superior (se ejecuta en un proceso aparte).
+    Devuelve los nodos en el formato de cssx.ast.binary, más compacto que pickle.
+    """
+    text, offset, line, filename = args
+    parser = CSSXParser(filename)
+    parser.line_index = LineIndex.from_text(text, filename, offset, line)
+    parser.tokens = tokenize(text, offset, line)
+    return binary.dump(parser._parse_children()[0])
+
+
+@dataclass(slots=True)
+class _BlockFrame:
+    """Bloque abierto en la pila del parser"""
+    header: Token
+    close: int
+    body: List[Token] = field(default_factory=list)   # Líneas propias (sin los bloques anidados)
+    children: list = field(default_factory=list)
+
+
 class CSSXParser:
     """Parser para código CSSX que genera AST"""
     
-    def __init__(self, filename: str = "<unknown>"):
+    # Máximo de valores distintos que se internan por parser (por compilación)
+    MAX_INTERNED_VALUES = 4096
+    
+    # Tamaño (en caracteres) a partir del cual parse_parallel reparte el
+    # trabajo entre procesos; por debajo el coste de arrancarlos no compensa
+    PARALLEL_THRESHOLD = 2 * 1024 * 1024
+    
+    def __init__(self, filename: str = "<unknown>", intern_limit: Optional[int] = None, lazy: bool = False):
         self.filename = filename
-        self.lines: List[str] = []
-        self.current_line = 0
-        self.current_col = 0
-        self.current_offset = 0
+        # Modo perezoso: RuleSet.declarations y TemplateDef.body se guardan
+        # como texto sin tokenizar y se parsean en su primer acceso (útil
+        # para herramientas que solo leen el esquema)
+        self.lazy = lazy
+        self.tokens: List[Token] = []
+        # Índice de líneas del documento en curso (compartido por todos los Loc)
+        self.line_index = LineIndex(filename)
+        # Tablas de internado: texto crudo -> nodo de valor inmutable compartido
+        self.intern_limit = self.MAX_INTERNED_VALUES if intern_limit is None else intern_limit
+        self._values: dict = {}
+        self._single_values: dict = {}
+        self.intern_hits = 0
+        self.intern_misses = 0
+        self._scanner = ValueScanner(lambda atom: self._parse_single_value(atom, None))
     
-    def _make_loc(self, line: Optional[int] = None, col: Optional[int] = None, offset: Optional[int] = None) -> Loc:
-        """Crea un objeto Loc con la posición actual o especificada"""
-        return Loc(
-            file=self.filename,
-            line=line if line is not None else self.current_line + 1,
-            col=col if col is not None else self.current_col + 1,
-            offset=offset if offset is not None else self.current_offset
-        )
+    def intern_stats(self) -> dict:
+        """Estadísticas del internado de valores de este parser"""
+        lookups = self.intern_hits + self.intern_misses
+        return {
+            'hits': self.intern_hits,
+            'misses': self.intern_misses,
+            'entries': len(self._values) + len(self._single_values),
+            'hit_rate': self.intern_hits / lookups if lookups else 0.0,
+        }
     
     def _parse_value(self, value_str: str, variables: dict) -> Union[Value, str]:
-        """Parsea un valor CSS desde una cadena"""
+        """Parsea un valor CSS, reutilizando el nodo si el mismo texto ya se parseó"""
         value_str = value_str.strip()
-        
-        # Remover comillas
+        value = self._values.get(value_str)
+        if value is not None:
+            self.intern_hits += 1
+            return value
+        
+        self.intern_misses += 1
+        value = self._classify_value(value_str, variables)
+        if len(self._values) < self.intern_limit:
+            self._values[value_str] = value
+        return value
+    
+    def _classify_value(self, value_str: str, variables: dict) -> Union[Value, str]:
+        """Parsea un valor CSS desde una cadena"""
+        # Valor completo entre comillas (puede contener otras comillas)
         if (value_str.startswith('"') and value_str.endswith('"')) or \
            (value_str.startswith("'") and value_str.endswith("'")):
             return String(text=value_str[1:-1])
         
-        # Referencia a variable
-        if value_str.startswith("@"):
-            return VariableRef(name=value_str)
-        
-        # Funciones CSS (rgba, calc, etc.)
-        func_match = re.match(r'^(\w+)\s*\(([^)]+)\)$', value_str)
-        if func_match:
-            func_name = func_match.group(1)
-            args_str = func_match.group(2)
-            # Parsear argumentos básicamente
-            args = tuple(arg.strip() for arg in args_str.split(','))
-            return Function(name=func_name, args=args)
-        
-        # URL
-        if value_str.startswith('url(') and value_str.endswith(')'):
-            url_content = value_str[4:-1].strip()
-            if url_content.startswith('"') and url_content.endswith('"'):
-                url_content = url_content[1:-1]
-            return Url(path=url_content)
-        
-        # Lista de valores separados por espacios
-        tokens = value_str.split()
-        if len(tokens) > 1:
-            parsed_tokens = []
-            for token in tokens:
-                parsed_tokens.append(self._parse_single_value(token, variables))
-            return SpaceList(items=tuple(parsed_tokens))
-        
-        # Valor único
-        return self._parse_single_value(value_str, variables)
+        # Listas, funciones anidadas, url(...) y átomos en una sola pasada
+        return self._scanner.parse(value_str)
     
     def _parse_single_value(self, token: str, variables: dict) -> Union[Value, str]:
-        """Parsea un valor individual"""
+        """Parsea un valor individual, reutilizando el nodo si ya se parseó"""
         token = token.strip()
+        value = self._single_values.get(token)
+        if value is not None:
+            self.intern_hits += 1
+            return value
+        
+        self.intern_misses += 1
+        value = self._classify_single_value(token)
+        if len(self._single_values) < self.intern_limit:
+            self._single_values[token] = value
+        return value
+    
+    def _classify_single_value(self, token: str) -> Union[Value, str]:
+        """Parsea un valor individual"""
+        # Referencia a variable
+        if token.startswith('@'):
+            return VariableRef(name=token)
         
         # Color por nombre
-        if token.lower() in COLORES:
-            return ColorLiteral(name_or_hex=COLORES[token.lower()])
+        color = COLORES.get(token.lower())
+        if color is not None:
+            return ColorLiteral(name_or_hex=color)
         
         # Color hexadecimal
-        if re.match(r'^#[0-9a-fA-F]{3,8}$', token):
-            return ColorLiteral(name_or_hex=token)
+        first = token[:1]
+        if first == '#':
+            if _HEX_RE.match(token):
+                return ColorLiteral(name_or_hex=token)
+            return Keyword(name=token)
+        
+        # Lo que no empieza como un número es una palabra clave
+        if first not in _NUMERIC_START:
+            return Keyword(name=token)
         
         # Porcentaje
         if token.endswith('%'):
@@ -94,7 +238,7 @@ class CSSXParser:
                 pass
         
         # Dimensión (número + unidad)
-        dim_match = re.match(r'^([-+]?\d*\.?\d+)(px|em|rem|vh|vw|pt|pc|in|cm|mm|ex|ch|vmin|vmax|s|ms)$', token)
+        dim_match = _DIM_RE.match(token)
         if dim_match:
             n = float(dim_match.group(1))
             unit = dim_match.group(2)
@@ -110,220 +254,147 @@ class CSSXParser:
         # Palabra clave
         return Keyword(name=token)
     
-    def _parse_selector(self, selector_str: str) -> Selector:
-        """Parsea un selector"""
-        selector_str = selector_str.strip()
-        
-        # Selectors complejos con combinadores
-        for combinator in [' ', '>', '+', '~']:
-            if combinator in selector_str:
-                parts = selector_str.split(combinator, 1)
-                if len(parts) == 2:
-                    left = self._parse_selector(parts[0].strip())
-                    right = self._parse_selector(parts[1].strip())
-                    return ComplexSelector(
-                        left=left,
-                        combinator=combinator,
-                        right=right,
-                        loc=self._make_loc()
-                    )
-        
-        # Selector compuesto (múltiples selectores simples juntos)
-        simple_parts = []
-        current = selector_str
-        
-        while current:
-            if current.startswith('.'):
-                # Clase
-                match = re.match(r'^\.([a-zA-Z_-][a-zA-Z0-9_-]*)', current)
-                if match:
-                    class_name = match.group(1)
-                    simple_parts.append(SimpleSelector(kind='class', value=class_name, loc=self._make_loc()))
-                    current = current[match.end():]
-                else:
-                    break
-            elif current.startswith('#'):
-                # ID
-                match = re.match(r'^#([a-zA-Z_-][a-zA-Z0-9_-]*)', current)
-                if match:
-                    id_name = match.group(1)
-                    simple_parts.append(SimpleSelector(kind='id', value=id_name, loc=self._make_loc()))
-                    current = current[match.end():]
-                else:
-                    break
-            elif current.startswith(':'):
-                # Pseudo-elemento o pseudo-clase
-                if current.startswith('::'):
-                    match = re.match(r'^::([a-zA-Z_-]+)', current)
-                    if match:
-                        pseudo_name = match.group(1)
-                        simple_parts.append(SimpleSelector(kind='pseudo_elem', value=pseudo_name, loc=self._make_loc()))
-                        current = current[match.end():]
-                    else:
-                        break
-                else:
-                    match = re.match(r'^:([a-zA-Z_-]+)', current)
-                    if match:
-                        pseudo_name = match.group(1)
-                        simple_parts.append(SimpleSelector(kind='pseudo', value=pseudo_name, loc=self._make_loc()))
-                        current = current[match.end():]
-                    else:
-                        break
-            else:
-                # Tipo/elemento
-                match = re.match(r'^([a-zA-Z_-][a-zA-Z0-9_-]*)', current)
-                if match:
-                    element_name = match.group(1)
-                    # Traducir nombres de elementos si es necesario
-                    if element_name in DICCIONARIO_HTML:
-                        element_name = DICCIONARIO_HTML[element_name]
-                    simple_parts.append(SimpleSelector(kind='type', value=element_name, loc=self._make_loc()))
-                    current = current[match.end():]
-                else:
-                    break
-        
-        if len(simple_parts) == 1:
-            return simple_parts[0]
-        elif len(simple_parts) > 1:
-            return CompoundSelector(parts=tuple(simple_parts), loc=self._make_loc())
-        else:
-            # Fallback para casos edge
-            return SimpleSelector(kind='type', value=selector_str, loc=self._make_loc())
-    
-    def _parse_declaration(self, line: str, variables: dict) -> Union[Declaration, VariableDecl, None]:
-        """Parsea una declaración o variable"""
-        line = line.strip()
-        
-        if not line or line.startswith('#') or line.startswith('//'):
-            return None
-        
-        # Patrón para variables: @nombre = valor
-        var_match = re.match(r'^\s*(@[\w\u00C0-\u017F]+)\s*=\s*(.+)$', line)
-        if var_match:
-            key = var_match.group(1).strip()
-            value_str = var_match.group(2).strip()
-            value = self._parse_value(value_str, variables)
-            return VariableDecl(name=key, value=value, loc=self._make_loc())
-        
-        # Patrón para declaraciones CSS: propiedad: valor
-        css_match = re.match(r'^\s*([\w\u00C0-\u017F-]+)\s*:\s*(.+)$', line)
-        if css_match:
-            key = css_match.group(1).strip()
-            value_str = css_match.group(2).strip()
-            value = self._parse_value(value_str, variables)
-            return Declaration(prop=key, value=value, important=False, loc=self._make_loc())
-        
-        # Patrón para declaraciones especiales y CSS con =: propiedad = valor
-        special_match = re.match(r'^\s*([\w\u00C0-\u017F-]+)\s*=\s*(.+)$', line)
-        if special_match:
-            key = special_match.group(1).strip()
-            value_str = special_match.group(2).strip()
-            
-            # Todas las declaraciones con = se tratan como declaraciones CSS/especiales
-            value = self._parse_value(value_str, variables)
-            return Declaration(prop=key, value=value, important=False, loc=self._make_loc())
-        
-        return None
+    def _parse_selector(self, selector_str: str, token: Token) -> Selector:
+        """Parsea un selector (el análisis del texto se memoiza entre usos)"""
+        return parse_selector(selector_str, self._loc_of(token))
     
-    def _parse_block(self, lines: List[str], start_idx: int) -> Tuple[List[str], int]:
-        """Extrae un bloque de código delimitado por llaves"""
-        block_lines = []
-        brace_count = 1
-        i = start_idx
-        
-        while i < len(lines) and brace_count > 0:
-            line = lines[i]
-            brace_count += line.count('{') - line.count('}')
-            if brace_count > 0:
-                block_lines.append(line)
-            i += 1
-        
-        return block_lines, i
+    def _loc_of(self, token: Token) -> Loc:
+        """Crea un objeto Loc con la posición de un token"""
+        return Loc.at(self.line_index, token.offset)
     
-    def _parse_ruleset(self, selector_line: str, block_lines: List[str], variables: dict) -> RuleSet:
-        """Parsea un ruleset (selector + declaraciones + reglas anidadas)"""
-        # Extraer selector de la línea
-        selector_str = selector_line.split('{')[0].strip()
-        selector = self._parse_selector(selector_str)
+    def _parse_declaration(self, token: Token, variables: dict) -> Union[Declaration, VariableDecl, None]:
+        """Parsea una declaración o variable a partir de su token"""
+        if token.kind == TokenKind.VAR:
+            value = self._parse_value(token.value, variables)
+            return VariableDecl(name=token.name, value=value, loc=self._loc_of(token))
         
-        declarations = []
-        children = []
+        if token.kind == TokenKind.DECL:
+            value = self._parse_value(token.value, variables)
+            return Declaration(prop=token.name, value=value, important=False, loc=self._loc_of(token))
         
-        i = 0
-        while i < len(block_lines):
-            line = block_lines[i].strip()
+        return None
+    
+    def _parse_ruleset(self, start: int, closes: List[int], variables: dict) -> Tuple[RuleSet, int]:
+        """
+        Parsea un ruleset y todos sus rulesets anidados en una sola pasada,
+        usando una pila explícita en lugar de recursión: cada token se visita
+        una única vez sin importar la profundidad de anidamiento.
+        Retorna (ruleset, índice tras el token de cierre).
+        """
+        tokens = self.tokens
+        stack = [_BlockFrame(tokens[start], closes[start])]
+        root = None
+        i = start + 1
+        
+        while stack:
+            frame = stack[-1]
             
-            if not line or line.startswith('#') or line.startswith('//'):
-                i += 1
+            # Fin del bloque: construir el RuleSet y saltar el token de cierre
+            if i >= frame.close:
+                stack.pop()
+                ruleset = self._build_ruleset(frame, variables)
+                if stack:
+                    stack[-1].children.append(ruleset)
+                else:
+                    root = ruleset
+                i = frame.close + 1
                 continue
             
-            # Detectar ruleset anidado
-            if '{' in line and '}' not in line:
-                nested_block, end_idx = self._parse_block(block_lines, i + 1)
-                nested_ruleset = self._parse_ruleset(line, nested_block, variables)
-                children.append(nested_ruleset)
-                i = end_idx
+            token = tokens[i]
+            i += 1
+            
+            # Detectar ruleset anidado (nunca termina después que su padre)
+            if token.kind == TokenKind.OPEN:
+                stack.append(_BlockFrame(token, min(closes[i - 1], frame.close)))
                 continue
             
+            # Las líneas del cuerpo se parsean al construir el RuleSet
+            frame.body.append(token)
+        
+        return root, min(i, len(tokens))
+    
+    def _build_ruleset(self, frame: '_BlockFrame', variables: dict) -> RuleSet:
+        """Construye el RuleSet de un bloque ya recorrido"""
+        # Extraer selector de la línea
+        selector_str = frame.header.text.split('{')[0].strip()
+        selector = self._parse_selector(selector_str, frame.header)
+        return RuleSet(
+            selectors=[selector],
+            declarations=self._body(self._parse_ruleset_body, frame.body, variables),
+            children=frame.children,
+            loc=self._loc_of(frame.header)
+        )
+    
+    def _tokenize(self, text: str, offset: int = 0, line: int = 1) -> List[Token]:
+        """Tokens del documento; en modo perezoso, solo su esqueleto"""
+        if self.lazy:
+            return tokenize_skeleton(text, offset, line)
+        return tokenize(text, offset, line)
+    
+    def _body(self, parse_body, tokens: List[Token], variables: dict) -> Union[list, LazyBody]:
+        """
+        Parsea un cuerpo de bloque ahora o, en modo perezoso, en su primer
+        acceso: solo entonces se tokenizan sus tramos de texto (SLICE).
+        """
+        if self.lazy:
+            return LazyBody(lambda: parse_body(expand_slices(tokens), variables))
+        return parse_body(tokens, variables)
+    
+    def _parse_ruleset_body(self, tokens: List[Token], variables: dict) -> list:
+        """Declaraciones y usos de plantilla de un ruleset, en orden"""
+        declarations = []
+        for token in tokens:
             # Detectar uso de plantilla
-            if line.startswith('usar '):
-                template_use = self._parse_template_use(line, variables)
+            if token.kind == TokenKind.USE:
+                template_use = self._parse_template_use(token, variables)
                 declarations.append(template_use)  # TemplateUse se añade a declarations
-                i += 1
                 continue
             
             # Parsear declaración
-            decl = self._parse_declaration(line, variables)
+            decl = self._parse_declaration(token, variables)
             if decl:
                 if isinstance(decl, VariableDecl):
                     variables[decl.name] = decl.value
                 elif isinstance(decl, Declaration):
                     declarations.append(decl)
-            
-            i += 1
-        
-        return RuleSet(
-            selectors=[selector],
-            declarations=declarations,
-            children=children,
-            loc=self._make_loc()
-        )
+        return declarations
     
-    def _parse_template_def(self, header_line: str, body_lines: List[str], variables: dict) -> TemplateDef:
+    def _parse_template_def(self, header: Token, start: int, stop: int, variables: dict) -> TemplateDef:
         """Parsea definición de plantilla: plantilla NOMBRE(@params) { ... }"""
         # Extraer nombre y parámetros del header
         # Formato: "plantilla NOMBRE(@p1=default1, @p2, @p3=default3) {"
-        header = header_line.replace('{', '').strip()
-        parts = header.split('(', 1)
+        header_text = header.text.replace('{', '').strip()
+        parts = header_text.split('(', 1)
         
         if len(parts) < 2:
             # Sin parámetros: "plantilla NOMBRE {"
-            name = header.replace('plantilla ', '').strip()
+            name = header_text.replace('plantilla ', '').strip()
             params = []
         else:
             # Con parámetros: "plantilla NOMBRE(@p1, @p2=val) {"
             name = parts[0].replace('plantilla ', '').strip()
-            params_str = parts[1].rstrip(')')
-            params = self._parse_template_params(params_str, variables)
+            params_str = _strip_closing_paren(parts[1])
+            params = self._parse_template_params(params_str, variables, header)
         
-        # Parsear cuerpo (declaraciones)
+        body = self._body(self._parse_template_body, self.tokens[start:stop], variables)
+        return TemplateDef(name=name, params=params, body=body, loc=self._loc_of(header))
+    
+    def _parse_template_body(self, tokens: List[Token], variables: dict) -> List[Declaration]:
+        """Parsea el cuerpo (declaraciones) de una plantilla"""
         body = []
-        for line in body_lines:
-            line = line.strip()
-            if line and not line.startswith('#') and not line.startswith('//'):
-                decl = self._parse_declaration(line, variables)
-                if decl and isinstance(decl, Declaration):
-                    body.append(decl)
-        
-        return TemplateDef(name=name, params=params, body=body, loc=self._make_loc())
+        for token in tokens:
+            decl = self._parse_declaration(token, variables)
+            if decl and isinstance(decl, Declaration):
+                body.append(decl)
+        return body
     
-    def _parse_template_params(self, params_str: str, variables: dict) -> List[Param]:
+    def _parse_template_params(self, params_str: str, variables: dict, token: Token) -> List[Param]:
         """Parsea lista de parámetros de plantilla: @p1=default, @p2, @p3=val"""
         if not params_str.strip():
             return []
         
         params = []
-        for param in params_str.split(','):
+        for param in split_top_level(params_str):
             param = param.strip()
             if not param:
                 continue
@@ -333,19 +404,19 @@ class CSSXParser:
                 name, default_str = param.split('=', 1)
                 name = name.strip()
                 default_value = self._parse_value(default_str.strip(), variables)
-                params.append(Param(name=name, default_value=default_value, loc=self._make_loc()))
+                params.append(Param(name=name, default_value=default_value, loc=self._loc_of(token)))
             else:
                 # Parámetro sin valor por defecto: @p
                 name = param.strip()
-                params.append(Param(name=name, default_value=None, loc=self._make_loc()))
+                params.append(Param(name=name, default_value=None, loc=self._loc_of(token)))
         
         return params
     
-    def _parse_template_use(self, line: str, variables: dict) -> TemplateUse:
+    def _parse_template_use(self, token: Token, variables: dict) -> TemplateUse:
         """Parsea uso de plantilla: usar NOMBRE(args)"""
         # Extraer nombre y argumentos
         # Formato: "usar NOMBRE(arg1, arg2, @p=val)"
-        line = line.replace('usar ', '').strip()
+        line = token.text.replace('usar ', '').strip()
         
         if '(' not in line:
             # Sin argumentos: "usar NOMBRE"
@@ -354,18 +425,18 @@ class CSSXParser:
         else:
             # Con argumentos: "usar NOMBRE(arg1, @p=val)"
             name = line.split('(')[0].strip()
-            args_str = line.split('(', 1)[1].rstrip(')')
-            args = self._parse_template_args(args_str, variables)
+            args_str = _strip_closing_paren(line.split('(', 1)[1])
+            args = self._parse_template_args(args_str, variables, token)
         
-        return TemplateUse(name=name, args=args, loc=self._make_loc())
+        return TemplateUse(name=name, args=args, loc=self._loc_of(token))
     
-    def _parse_template_args(self, args_str: str, variables: dict) -> List[Union[Value, NamedArg]]:
+    def _parse_template_args(self, args_str: str, variables: dict, token: Token) -> List[Union[Value, NamedArg]]:
         """Parsea argumentos de uso de plantilla: arg1, arg2, @p=val"""
         if not args_str.strip():
             return []
         
         args = []
-        for arg in args_str.split(','):
+        for arg in split_top_level(args_str):
             arg = arg.strip()
             if not arg:
                 continue
@@ -375,7 +446,7 @@ class CSSXParser:
                 name, value_str = arg.split('=', 1)
                 name = name.strip()
                 value = self._parse_value(value_str.strip(), variables)
-                args.append(NamedArg(name=name, value=value, loc=self._make_loc()))
+                args.append(NamedArg(name=name, value=value, loc=self._loc_of(token)))
             else:
                 # Argumento posicional: valor
                 value = self._parse_value(arg, variables)
@@ -383,56 +454,228 @@ class CSSXParser:
         
         return args
     
-    def parse_to_ast(self, text: str) -> Stylesheet:
-        """Parsea código CSSX a AST"""
-        self.lines = text.strip().split('\n')
-        self.current_line = 0
-        self.current_offset = 0
+    def _parse_children(self) -> Tuple[list, bool]:
+        """
+        Parsea los nodos de nivel superior de self.tokens.
+        Retorna (nodos, cerrado); cerrado es False si algún bloque de nivel
+        superior llega sin cerrar hasta el final de los tokens.
+        """
+        tokens = self.tokens
+        closes = match_blocks(tokens)
         
         variables = {}
         children = []
+        closed = True
         
         i = 0
-        while i < len(self.lines):
-            line = self.lines[i].strip()
-            self.current_line = i
+        n = len(tokens)
+        while i < n:
+            token = tokens[i]
             
-            if not line or line.startswith('#') or line.startswith('//'):
+            if token.kind == TokenKind.SLICE:
+                # Líneas de nivel superior en modo perezoso: se parsean ya
+                children.extend(self._parse_top_level(expand_slices([token]), variables))
                 i += 1
                 continue
             
-            # Detectar definición de plantilla
-            if line.startswith('plantilla ') and '{' in line:
-                block_lines, end_idx = self._parse_block(self.lines, i + 1)
-                template_def = self._parse_template_def(line, block_lines, variables)
-                children.append(template_def)
-                i = end_idx
-                continue
-            
-            # Detectar ruleset
-            if '{' in line and '}' not in line:
-                block_lines, end_idx = self._parse_block(self.lines, i + 1)
-                ruleset = self._parse_ruleset(line, block_lines, variables)
-                children.append(ruleset)
-                i = end_idx
+            if token.kind == TokenKind.OPEN:
+                closed = closes[i] < n
+                if token.text.startswith('plantilla '):
+                    # Definición de plantilla
+                    close = closes[i]
+                    children.append(self._parse_template_def(token, i + 1, close, variables))
+                    i = close + 1
+                else:
+                    # Ruleset
+                    ruleset, i = self._parse_ruleset(i, closes, variables)
+                    children.append(ruleset)
                 continue
             
+            children.extend(self._parse_top_level((token,), variables))
+            i += 1
+        
+        return children, closed
+    
+    def _parse_top_level(self, tokens, variables: dict) -> list:
+        """Variables globales y declaraciones de nivel superior de unos tokens"""
+        nodes = []
+        for token in tokens:
             # Parsear declaración o variable global
-            decl = self._parse_declaration(line, variables)
+            decl = self._parse_declaration(token, variables)
             if decl:
                 if isinstance(decl, VariableDecl):
                     variables[decl.name] = decl.value
-                    children.append(decl)
+                    nodes.append(decl)
                 elif isinstance(decl, Declaration):
                     # Declaraciones globales como titulo_pagina
-                    children.append(decl)
-            
-            i += 1
+                    nodes.append(decl)
+        return nodes
+    
+    def parse_to_ast(self, text: str) -> Stylesheet:
+        """Parsea código CSSX a AST"""
+        self.line_index = LineIndex.from_text(text, self.filename)
+        self.tokens = self._tokenize(text)
+        children, _ = self._parse_children()
+        return Stylesheet(children=children, loc=Loc.at(self.line_index, 0))
+    
+    def parse_parallel(self, text: str, workers: Optional[int] = None,
+                       threshold: Optional[int] = None) -> Stylesheet:
+        """
+        Parsea código CSSX grande repartiendo los bloques de nivel superior
+        entre `workers` procesos (por defecto, uno por CPU). Los bloques no
+        dependen entre sí al parsear, así que cada fragmento se parsea por
+        separado con su offset y línea reales y los hijos se unen en orden.
+        Por debajo de `threshold` caracteres, o con un solo proceso, se
+        parsea en serie. Los valores solo se internan dentro de cada fragmento.
+        """
+        workers = workers or os.cpu_count() or 1
+        threshold = self.PARALLEL_THRESHOLD if threshold is None else threshold
+        if workers < 2 or len(text) < threshold:
+            return self.parse_to_ast(text)
+        
+        chunks = _split_top_level_blocks(text, workers)
+        if len(chunks) < 2:
+            return self.parse_to_ast(text)
         
-        return Stylesheet(children=children, loc=self._make_loc(1, 1, 0))
-
+        children = []
+        with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as pool:
+            jobs = [(chunk, offset, line, self.filename) for chunk, offset, line in chunks]
+            for part in pool.map(_parse_chunk, jobs):
+                children.extend(binary.load(part))
+        self.line_index = LineIndex.from_text(text, self.filename)
+        return Stylesheet(children=children, loc=Loc.at(self.line_index, 0))
+    
+    def iter_parse(self, fileobj: IO[str], chunk_size: int = 64 * 1024) -> Iterator[Node]:
+        """
+        Parsea un archivo en streaming: lee la entrada por bloques de
+        `chunk_size` caracteres y produce cada nodo de nivel superior en cuanto
+        llega la llave que lo cierra. Solo se mantienen en memoria los tokens
+        del bloque en curso.
+        """
+        pending: List[Token] = []   # Tokens del bloque de nivel superior en curso
+        balance = 0
+        offset = 0
+        line_no = 1
+        self.line_index = index = LineIndex(self.filename)
+        
+        for raw in _iter_lines(fileobj, chunk_size):
+            tokens = tokenize(raw, offset, line_no)
+            offset += len(raw) + 1
+            line_no += 1
+            index.add_line(offset)
+            if not tokens:
+                continue
+            token = tokens[0]
+            
+            if pending:
+                pending.append(token)
+                balance += token.depth
+                if balance > 0:
+                    continue
+            elif token.kind == TokenKind.OPEN:
+                # Cabecera: el bloque empieza con balance 1
+                pending.append(token)
+                balance = 1
+                continue
+            else:
+                pending.append(token)
+            
+            self.tokens = pending
+            yield from self._parse_children()[0]
+            pending = []
+        
+        # Bloque sin cerrar al final de la entrada
+        if pending:
+            self.tokens = pending
+            yield from self._parse_children()[0]
+    
+    def reparse(self, previous_ast: Stylesheet, old_text: str, edit_range: Tuple[int, int], new_text: str) -> Stylesheet:
+        """
+        Reparsea un documento editado reutilizando los nodos de nivel superior
+        (RuleSet, TemplateDef, VariableDecl, ...) que quedan fuera de la edición.
+        
+        - previous_ast: resultado de parse_to_ast(old_text), sin pasar por el
+          análisis semántico (la expansión de plantillas modifica el AST).
+          Sus nodos se reutilizan y se actualizan en el lugar.
+        - edit_range: (inicio, fin) en old_text del texto reemplazado.
+        - new_text: documento completo tras la edición.
+        
+        Solo se vuelven a parsear las líneas de los nodos que tocan la edición;
+        si un bloque queda sin cerrar, la región se amplía hasta resincronizar.
+        A los nodos posteriores solo se les desplazan offset y línea.
+        """
+        old_children = previous_ast.children
+        if not old_children:
+            return self.parse_to_ast(new_text)
+        
+        # Cada nodo ocupa desde el inicio de su línea hasta el inicio del siguiente
+        starts = [old_text.rfind('\n', 0, child.loc.offset) + 1 for child in old_children]
+        starts[0] = 0
+        bounds = starts + [len(old_text)]
+        
+        edit_start, edit_end = edit_range
+        delta = len(new_text) - len(old_text)
+        # Nodos afectados: [first, last). Los límites cuentan en ambos lados
+        first = max(bisect.bisect_left(starts, edit_start) - 1, 0)
+        last = max(bisect.bisect_right(starts, edit_end), first + 1)
+        
+        region_start = bounds[first]
+        start_line = old_text.count('\n', 0, region_start) + 1
+        
+        # El índice de líneas se actualiza en el lugar: los nodos reutilizados
+        # que lo comparten ven las líneas nuevas sin tener que recorrerlos
+        index = previous_ast.loc.index
+        if isinstance(index, LineIndex) and index.first_line == 1 and index.starts[0] == 0:
+            index.edit(edit_start, edit_end, new_text[edit_start:edit_end + delta])
+        else:
+            index = LineIndex.from_text(new_text, self.filename)
+        self.line_index = index
+        
+        extra = 1
+        while True:
+            last = min(last, len(old_children))
+            region_end = bounds[last]
+            fragment = new_text[region_start:region_end + delta]
+            self.tokens = self._tokenize(fragment, region_start, start_line)
+            children, closed = self._parse_children()
+            if closed or last == len(old_children):
+                break
+            # Un bloque sin cerrar absorbe nodos siguientes: ampliar la región
+            last += extra
+            extra *= 2
+        
+        line_delta = fragment.count('\n') - old_text.count('\n', region_start, region_end)
+        tail = old_children[last:]
+        if delta or line_delta:
+            _shift_locs(tail, delta, line_delta, index)
+        
+        return Stylesheet(
+            children=old_children[:first] + children + tail,
+            loc=Loc.at(index, 0)
+        )
 
-def parse_to_ast(text: str, filename: str = "<unknown>") -> Stylesheet:
+def parse_to_ast(text: str, filename: str = "<unknown>", lazy: bool = False) -> Stylesheet:
     """Función de conveniencia para parsear código CSSX a AST"""
-    parser = CSSXParser(filename)
+    parser = CSSXParser(filename, lazy=lazy)
     return parser.parse_to_ast(text)
+
+
+def parse_parallel(text: str, filename: str = "<unknown>", workers: Optional[int] = None,
+                   threshold: Optional[int] = None) -> Stylesheet:
+    """Función de conveniencia para parsear código CSSX grande en varios procesos"""
+    parser = CSSXParser(filename)
+    return parser.parse_parallel(text, workers, threshold)
+
+
+def parse_to_columnar(text: str, filename: str = "<unknown>") -> ColumnarAST:
+    """
+    Parsea código CSSX a un AST columnar. Los bloques se parsean uno a uno y
+    se copian a las columnas, así que nunca existe el árbol completo.
+    """
+    return ColumnarAST.from_nodes(iter_parse(io.StringIO(text), filename), filename)
+
+
+def iter_parse(fileobj: IO[str], filename: str = "<unknown>", chunk_size: int = 64 * 1024) -> Iterator[Node]:
+    """Función de conveniencia para parsear un archivo nodo a nodo"""
+    parser = CSSXParser(filename)
+    return parser.iter_parse(fileobj, chunk_size)
@@ -0,0 +1,113 @@
+# selectors.py
+# Compilador de selectores con caché: cada texto de selector se analiza una
+# sola vez y se guarda como un plan que se instancia en cada uso
+
+import re
+from functools import lru_cache
+from cssx.ast.nodes import Loc, Selector, SimpleSelector, CompoundSelector, ComplexSelector
+from cssx.lexer.dictionaries import DICCIONARIO_HTML
+
+
+# Un selector simple por alternativa; el grupo que coincide indica el tipo
+_PART_RE = re.compile(
+    r'\.([a-zA-Z_-][a-zA-Z0-9_-]*)'      # 1: clase
+    r'|#([a-zA-Z_-][a-zA-Z0-9_-]*)'      # 2: id
+    r'|::([a-zA-Z_-]+)'                  # 3: pseudo-elemento
+    r'|:([a-zA-Z_-]+)'                   # 4: pseudo-clase
+    r'|([a-zA-Z_-][a-zA-Z0-9_-]*)'       # 5: tipo/elemento
+)
+_PART_KINDS = (None, 'class', 'id', 'pseudo_elem', 'pseudo', 'type')
+_COMBINATORS = (' ', '>', '+', '~')
+
+# Planes: ('simple', kind, value) | ('compound', (planes simples...)) |
+#         ('complex', plan_izq, combinador, plan_der)
+SelectorPlan = tuple
+
+# Textos de selector distintos que se recuerdan
+SELECTOR_CACHE_SIZE = 4096
+
+
+@lru_cache(maxsize=SELECTOR_CACHE_SIZE)
+def compile_selector(selector_str: str) -> SelectorPlan:
+    """Analiza un selector y retorna su plan (memoizado por texto)"""
+    selector_str = selector_str.strip()
+    length = len(selector_str)
+
+    # Selectors complejos con combinadores: se corta en el primer combinador
+    # (por orden de prioridad) y se sigue con el resto. Se recorre la cadena
+    # derecha con un bucle y por índices, sin recursión ni copias del resto,
+    # para que el coste sea lineal en la longitud del selector.
+    lefts = []
+    pos = 0
+    absent = 0   # Los combinadores _COMBINATORS[:absent] ya no aparecen en el resto
+    while absent < len(_COMBINATORS):
+        combinator = _COMBINATORS[absent]
+        cut = selector_str.find(combinator, pos)
+        if cut == -1:
+            absent += 1
+            continue
+        lefts.append((compile_selector(selector_str[pos:cut].strip()), combinator))
+        pos = cut + len(combinator)
+        while pos < length and selector_str[pos].isspace():
+            pos += 1
+
+    plan = _compile_compound(selector_str[pos:])
+    for left, combinator in reversed(lefts):
+        plan = ('complex', left, combinator, plan)
+    return plan
+
+
+def _compile_compound(selector_str: str) -> SelectorPlan:
+    """Selector compuesto (múltiples selectores simples juntos)"""
+    simple_parts = []
+    pos = 0
+    while pos < len(selector_str):
+        match = _PART_RE.match(selector_str, pos)
+        if not match:
+            break
+        kind = _PART_KINDS[match.lastindex]
+        value = match.group(match.lastindex)
+        if kind == 'type':
+            # Traducir nombres de elementos si es necesario
+            value = DICCIONARIO_HTML.get(value, value)
+        simple_parts.append(('simple', kind, value))
+        pos = match.end()
+
+    if len(simple_parts) == 1:
+        return simple_parts[0]
+    elif len(simple_parts) > 1:
+        return ('compound', tuple(simple_parts))
+    else:
+        # Fallback para casos edge
+        return ('simple', 'type', selector_str)
+
+
+def build_selector(plan: SelectorPlan, loc: Loc) -> Selector:
+    """Instancia un plan de selector con la ubicación del sitio de uso"""
+    # La cadena derecha de combinadores se recorre con un bucle (puede ser larga)
+    spine = []
+    while plan[0] == 'complex':
+        spine.append(plan)
+        plan = plan[3]
+    selector = _build_compound(plan, loc)
+    for _, left, combinator, _ in reversed(spine):
+        selector = ComplexSelector(
+            left=build_selector(left, loc),
+            combinator=combinator,
+            right=selector,
+            loc=loc
+        )
+    return selector
+
+
+def _build_compound(plan: SelectorPlan, loc: Loc) -> Selector:
+    """Instancia un plan simple o compuesto"""
+    if plan[0] == 'simple':
+        return SimpleSelector(kind=plan[1], value=plan[2], loc=loc)
+    parts = tuple(SimpleSelector(kind=kind, value=value, loc=loc) for _, kind, value in plan[1])
+    return CompoundSelector(parts=parts, loc=loc)
+
+
+def parse_selector(selector_str: str, loc: Loc) -> Selector:
+    """Parsea un selector usando la caché de planes"""
+    return build_selector(compile_selector(selector_str), loc)
@@ -4,6 +4,21 @@
 import re
 from cssx.lexer.dictionaries import COLORES, DICCIONARIO_CSS, DICCIONARIO_HTML, SELECTORES_HTML_ESTANDAR
 
+_FUNCION_RE = re.compile(r'\w\s*\(')
+
+
+def _contiene_funcion(valor):
+    r"""
+    Equivale a re.search(r'\w\s*\([^)]+\)', valor) pero en tiempo lineal
+    (el patrón vuelve a recorrer el resto desde cada '(' si no hay ')'):
+    basta el primer 'nombre(' que no vaya seguido de ')' y un ')' posterior.
+    """
+    for match in _FUNCION_RE.finditer(valor):
+        inicio = match.end()
+        if inicio < len(valor) and valor[inicio] != ')':
+            return valor.find(')', inicio + 1) != -1
+    return False
+
 
 def normalizar_valor(valor, variables):
     """
@@ -20,7 +35,7 @@ def normalizar_valor(valor, variables):
             raise ValueError(f"Variable no definida: {valor}")
 
     # Si contiene funciones CSS (como rgba, rgb, etc.), devolverlo tal como está
-    if re.search(r'\w+\s*\([^)]+\)', valor):
+    if _contiene_funcion(valor):
         return valor
 
     # Convertir colores individuales
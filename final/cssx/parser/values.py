@@ -0,0 +1,157 @@
+# values.py
+# Analizador descendente recursivo de valores CSS: una pasada por valor,
+# sin expresiones regulares, con funciones anidadas y listas por comas
+
+from typing import Callable, List, Tuple
+from cssx.ast.nodes import Value, String, Url, Function, SpaceList, CommaList
+
+
+_WHITESPACE = frozenset(' \t\r\n\f\v')
+_ATOM_STOP = frozenset(' \t\r\n\f\v,(')
+_NESTED_ATOM_STOP = _ATOM_STOP | {')'}
+
+
+class ValueScanner:
+    """
+    Convierte el texto de un valor en nodos:
+    - 'a b'            -> SpaceList
+    - 'a, b'           -> CommaList (de SpaceList o valores simples)
+    - 'f(x, y z)'      -> Function con un argumento por cada elemento separado por comas
+    - 'url(...)'       -> Url con el contenido literal
+    - '"texto"'        -> String
+    Los átomos restantes (números, dimensiones, colores, palabras clave,
+    variables) se delegan en `atom`.
+    """
+
+    def __init__(self, atom: Callable[[str], Value]):
+        self._atom = atom
+        self.text = ''
+        self.pos = 0
+
+    def parse(self, text: str) -> Value:
+        """Parsea un valor completo"""
+        if '(' not in text and ',' not in text and '"' not in text and "'" not in text:
+            # Camino rápido: sin funciones, comas ni cadenas basta con separar
+            # por espacios (el caso más común)
+            atoms = text.split()
+            if len(atoms) == 1:
+                return self._atom(atoms[0])
+            if atoms:
+                return SpaceList(items=tuple(self._atom(a) for a in atoms))
+            return self._atom('')
+        self.text = text
+        self.pos = 0
+        groups = [self._group_value(g) for g in self._parse_groups() if g]
+        if not groups:
+            return self._atom('')
+        if len(groups) == 1:
+            return groups[0]
+        return CommaList(items=tuple(groups))
+
+    def _group_value(self, items: List[Value]) -> Value:
+        """Un grupo entre comas: un valor o una lista separada por espacios"""
+        if len(items) == 1:
+            return items[0]
+        return SpaceList(items=tuple(items))
+
+    def _close_function(self, name: str, groups: List[List[Value]]) -> Function:
+        """Construye la llamada con un argumento por cada grupo no vacío"""
+        return Function(name=name, args=tuple(self._group_value(g) for g in groups if g))
+
+    def _parse_groups(self) -> List[List[Value]]:
+        """
+        Lee términos hasta el final del texto y los agrupa por comas. Las
+        funciones abiertas se guardan en una pila explícita (no hay
+        recursión), así que el anidamiento no está limitado.
+        """
+        text = self.text
+        length = len(text)
+        groups: List[List[Value]] = [[]]
+        stack: List[Tuple[str, List[List[Value]]]] = []   # (nombre, grupos del nivel exterior)
+
+        while self.pos < length:
+            char = text[self.pos]
+            if char in _WHITESPACE:
+                self.pos += 1
+            elif char == ',':
+                groups.append([])
+                self.pos += 1
+            elif char == ')' and stack:
+                self.pos += 1
+                name, outer = stack.pop()
+                outer[-1].append(self._close_function(name, groups))
+                groups = outer
+            elif char == '"' or char == "'":
+                groups[-1].append(self._parse_string(char))
+            else:
+                name = self._read_atom(_NESTED_ATOM_STOP if stack else _ATOM_STOP)
+                if self.pos < length and text[self.pos] == '(':
+                    self.pos += 1
+                    if name.lower() == 'url':
+                        groups[-1].append(self._parse_url())
+                    else:
+                        stack.append((name, groups))
+                        groups = [[]]
+                else:
+                    groups[-1].append(self._atom(name))
+
+        # Fin del texto: los paréntesis sin cerrar se cierran implícitamente
+        while stack:
+            name, outer = stack.pop()
+            outer[-1].append(self._close_function(name, groups))
+            groups = outer
+        return groups
+
+    def _parse_string(self, quote: str) -> String:
+        """Cadena entre comillas simples o dobles"""
+        start = self.pos + 1
+        end = self.text.find(quote, start)
+        if end == -1:
+            end = len(self.text)
+        self.pos = end + 1
+        return String(text=self.text[start:end])
+
+    def _read_atom(self, stop: frozenset) -> str:
+        """Texto del átomo que empieza en la posición actual"""
+        text = self.text
+        length = len(text)
+        start = pos = self.pos
+        while pos < length and text[pos] not in stop:
+            pos += 1
+        self.pos = pos
+        return text[start:pos]
+
+    def _parse_url(self) -> Url:
+        """Contenido literal de url(...) hasta el paréntesis de cierre"""
+        start = self.pos
+        end = self.text.find(')', start)
+        if end == -1:
+            end = len(self.text)
+        self.pos = end + 1
+        path = self.text[start:end].strip()
+        if len(path) >= 2 and path[0] == path[-1] and path[0] in '"\'':
+            path = path[1:-1]
+        return Url(path=path)
+
+
+def split_top_level(text: str, separator: str = ',') -> List[str]:
+    """Divide por `separator` ignorando los que están dentro de paréntesis o comillas"""
+    parts = []
+    depth = 0
+    quote = None
+    start = 0
+    for pos, char in enumerate(text):
+        if quote:
+            if char == quote:
+                quote = None
+        elif char == '"' or char == "'":
+            quote = char
+        elif char == '(':
+            depth += 1
+        elif char == ')':
+            depth = max(depth - 1, 0)
+        elif char == separator and depth == 0:
+            parts.append(text[start:pos])
+            start = pos + 1
+    parts.append(text[start:])
+    return parts
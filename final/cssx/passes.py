@@ -0,0 +1,195 @@
+# cssx/passes.py
+# Pass manager for the compile pipeline.
+#
+# A pass declares the node types it handles and whether it only reads the
+# tree or also writes it. Consecutive passes are fused into one traversal
+# unless a pass is a barrier (it needs every earlier pass finished over the
+# whole tree, e.g. template expansion needs all templates collected). In a
+# fused traversal each node goes through the passes in the order they were
+# given, so every pass sees the nodes produced by the writers before it,
+# just as if the passes had run one after another.
+
+import dataclasses
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from cssx.ast.nodes import Node, Stylesheet, RuleSet, MediaQuery
+from cssx.ast.visitor import SKIP
+
+READ = 'read'
+WRITE = 'write'
+
+# Nodes whose `children` the manager walks. Everything else (declarations,
+# variables, templates, values) is a leaf for the manager: passes look
+# inside it from their hooks.
+CONTAINERS = (Stylesheet, RuleSet, MediaQuery)
+
+
+class Pass:
+    """
+    Base class for compile passes. Subclasses set `name`, `node_types` and
+    `mode`, and override the hooks they need:
+    - begin(root) / finish(root): once per run, before and after the walk.
+    - enter(node, parent): preorder, only for instances of `node_types`. A
+      WRITE pass may return a replacement node (the input tree is never
+      modified by the manager; ancestors are rebuilt copy-on-write). Any
+      pass may return SKIP (the same as ASTWalker's) to ignore the node's
+      subtree.
+    - exit(node, parent): postorder, for nodes entered and not skipped.
+    - stats(): figures to report after the run (e.g. cache hit ratios),
+      gathered by the manager into `PassManager.stats`.
+    Passes that do not handle a node type still see its descendants.
+    """
+    name = 'pass'
+    node_types: Tuple[type, ...] = ()
+    mode = READ
+    # Needs all the previous passes finished before it sees any node
+    barrier = False
+    # Only handles the root's direct children: the walk does not go deeper for it
+    top_level = False
+
+    def begin(self, root: Node) -> None:
+        pass
+
+    def enter(self, node: Node, parent: Optional[Node]):
+        return None
+
+    def exit(self, node: Node, parent: Optional[Node]) -> None:
+        pass
+
+    def finish(self, root: Node) -> None:
+        pass
+
+    def stats(self) -> Dict[str, object]:
+        return {}
+
+
+class PassManager:
+    """
+    Runs passes over a tree, fusing compatible ones into a single iterative
+    traversal, and accumulates the time spent in each pass's hooks in
+    `timings` (seconds by pass name). The walking itself is recorded as
+    'traversal'. What the passes report from stats() ends up in `stats`.
+    """
+
+    def __init__(self):
+        self.timings: Dict[str, float] = {}
+        self.stats: Dict[str, object] = {}
+
+    def schedule(self, passes: Sequence[Pass]) -> List[List[Pass]]:
+        """Groups the passes into traversals: a barrier starts a new one"""
+        groups: List[List[Pass]] = []
+        for p in passes:
+            if not groups or p.barrier:
+                groups.append([])
+            groups[-1].append(p)
+        return groups
+
+    def run(self, root: Node, passes: Sequence[Pass]) -> Node:
+        """Runs the passes in order and returns the (possibly rewritten) root"""
+        for group in self.schedule(passes):
+            root = self._run_group(root, group)
+        return root
+
+    def record(self, name: str, seconds: float) -> None:
+        """Adds time spent outside the manager (e.g. parsing) to the report"""
+        self.timings[name] = self.timings.get(name, 0.0) + seconds
+
+    def timings_ms(self) -> Dict[str, float]:
+        return {name: round(seconds * 1000, 3) for name, seconds in self.timings.items()}
+
+    def _run_group(self, root: Node, group: List[Pass]) -> Node:
+        clock = time.perf_counter
+        spent = {id(p): 0.0 for p in group}
+        started = clock()
+
+        for p in group:
+            t = clock()
+            p.begin(root)
+            spent[id(p)] += clock() - t
+
+        def enter(node, parent, active):
+            """Runs the enter hooks; returns (node, passes to exit, passes for the children)"""
+            entered = []
+            inner = []
+            for p in active:
+                if isinstance(node, p.node_types):
+                    t = clock()
+                    result = p.enter(node, parent)
+                    spent[id(p)] += clock() - t
+                    if result is SKIP:
+                        continue
+                    if result is not None:
+                        node = result
+                    entered.append(p)
+                if not (p.top_level and parent is not None):
+                    inner.append(p)
+            return node, entered, inner
+
+        def leave(node, parent, entered):
+            for p in reversed(entered):
+                t = clock()
+                p.exit(node, parent)
+                spent[id(p)] += clock() - t
+
+        original = root
+        root, entered, inner = enter(root, None, group)
+        if inner and isinstance(root, CONTAINERS):
+            # Frame: [node, parent, entered, inner, children, next index,
+            #         rebuilt children (None while unchanged), original node]
+            stack = [[root, None, entered, inner, root.children, 0, None, original]]
+            while stack:
+                frame = stack[-1]
+                node, _, _, inner, children, index, results, _ = frame
+                descended = False
+                while index < len(children):
+                    child = children[index]
+                    index += 1
+                    new_child, child_entered, child_inner = enter(child, node, inner)
+                    if child_inner and isinstance(new_child, CONTAINERS):
+                        frame[5] = index
+                        stack.append([new_child, node, child_entered, child_inner,
+                                      new_child.children, 0, None, child])
+                        descended = True
+                        break
+                    leave(new_child, node, child_entered)
+                    if results is None and new_child is not child:
+                        results = frame[6] = children[:index - 1]
+                    if results is not None:
+                        results.append(new_child)
+                if descended:
+                    continue
+
+                stack.pop()
+                node, parent, entered, _, _, _, results, original = frame
+                if results is not None:
+                    node = _with_children(node, results)
+                leave(node, parent, entered)
+                if not stack:
+                    root = node
+                    break
+                outer = stack[-1]
+                if outer[6] is None and node is not original:
+                    outer[6] = outer[4][:outer[5] - 1]
+                if outer[6] is not None:
+                    outer[6].append(node)
+        else:
+            leave(root, None, entered)
+
+        for p in group:
+            t = clock()
+            p.finish(root)
+            spent[id(p)] += clock() - t
+
+        hooks = 0.0
+        for p in group:
+            self.record(p.name, spent[id(p)])
+            hooks += spent[id(p)]
+            self.stats.update(p.stats())
+        self.record('traversal', clock() - started - hooks)
+        return root
+
+
+def _with_children(node: Node, children: list) -> Node:
+    """Copy of a container with other children (the fingerprint is recomputed on demand)"""
+    return dataclasses.replace(node, children=children, fp=None)
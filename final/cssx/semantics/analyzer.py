@@ -1,16 +1,18 @@
 # analyzer.py
 # Analizador semántico principal que genera diagnósticos
 
-from typing import List, Tuple
-import copy
+from typing import List, Optional, Tuple
 from cssx.ast.nodes import *
-from cssx.ast.visitor import ASTWalker
+from cssx.ast.visitor import ASTWalker, SKIP
+from cssx.passes import Pass, PassManager, CONTAINERS, WRITE
 from cssx.semantics.diagnostics import DiagnosticCollector, ErrorCodes, WarningCodes
 from cssx.semantics.types import SemanticContext, is_valid_css_identifier
 from cssx.semantics.properties import VALID_STANDARD_CSS_PROPERTIES
 from cssx.semantics.symbols import ScopeAnalyzer
 from cssx.lexer.dictionaries import DICCIONARIO_CSS
-from cssx.semantics.templates import collect_templates, expand_templates
+from cssx.semantics.templates import (
+    TemplateTable, TemplateCollectPass, TemplateExpandPass, collect_templates, expand_templates,
+)
 
 class VariableResolver(ASTWalker):
     """
@@ -19,27 +21,76 @@ class VariableResolver(ASTWalker):
     """
     def __init__(self, context: SemanticContext):
         self.context = context
+        self._resolving = set()
 
     def resolve(self, node: ASTNode) -> ASTNode:
         """
         Starts the resolution process from the given node.
-        We deepcopy the node to avoid modifying the original AST, which might be cached.
+        The node is not modified, since the original AST might be cached:
+        resolution is copy-on-write, so only the nodes whose values resolve
+        to something else (and their ancestors) are rebuilt, and every other
+        subtree is shared with the input.
         """
-        node_copy = copy.deepcopy(node)
-        self.visit(node_copy)
-        return node_copy
+        return PassManager().run(node, [ResolutionPass(self.context, self)])
 
-    def visit_Declaration(self, node: Declaration):
-        if isinstance(node.value, VariableRef):
-            resolved_value = self.context.get_variable(node.value.name)
-            if resolved_value:
-                # Recursively resolve if the variable holds another variable
-                if isinstance(resolved_value, VariableRef):
-                    node.value = self.visit(resolved_value)
-                else:
-                    node.value = resolved_value
-        elif hasattr(node.value, 'visit'):
-            self.visit(node.value)
+    def resolve_node(self, node: ASTNode) -> Optional[ASTNode]:
+        """
+        Copy-on-write resolution of a single node, without descending into
+        nested rules: the declarations of a RuleSet, a Declaration or the
+        body of a TemplateDef. Returns the resolved copy, or None if nothing
+        changes.
+        """
+        if isinstance(node, RuleSet):
+            declarations = self._resolve_declarations(node.declarations, self._resolve_value)
+            if declarations is node.declarations:
+                return None
+            return RuleSet(selectors=node.selectors, declarations=declarations,
+                           children=node.children, loc=node.loc)
+        if isinstance(node, Declaration):
+            return self._with_value(node, self._resolve_direct(node.value))
+        if isinstance(node, TemplateDef):
+            body = self._resolve_declarations(node.body, self._resolve_direct)
+            if body is node.body:
+                return None
+            return TemplateDef(name=node.name, params=node.params, body=body, loc=node.loc)
+        return None
+
+    def _resolve_direct(self, value: Value) -> Value:
+        # Outside rulesets only a direct reference is resolved
+        if isinstance(value, VariableRef):
+            return self._resolve_reference(value)
+        return value
+
+    def _resolve_declarations(self, items: list, resolve) -> list:
+        """Resolves the declarations of a list; the same list if none changed"""
+        changed = None
+        for i, item in enumerate(items):
+            if isinstance(item, Declaration):
+                new_item = self._with_value(item, resolve(item.value))
+                if new_item is not None:
+                    if changed is None:
+                        changed = items[:i]
+                    changed.append(new_item)
+                    continue
+            if changed is not None:
+                changed.append(item)
+        return items if changed is None else changed
+
+    @staticmethod
+    def _with_value(node: Declaration, value: Value) -> Optional[Declaration]:
+        if value is node.value:
+            return None
+        return Declaration(prop=node.prop, value=value, important=node.important, loc=node.loc)
+
+    def _resolve_reference(self, value: VariableRef) -> Value:
+        """Value a declaration holding a direct reference resolves to"""
+        resolved_value = self.context.get_variable(value.name)
+        if resolved_value:
+            # Recursively resolve if the variable holds another variable
+            if isinstance(resolved_value, VariableRef):
+                return self.visit(resolved_value)
+            return resolved_value
+        return value
     
     def visit_VariableRef(self, node: VariableRef):
         # This method is key. It replaces the node itself.
@@ -52,19 +103,52 @@ class VariableResolver(ASTWalker):
             return resolved_value
         return node # Return the node itself if not found (error already reported)
 
-    def visit_RuleSet(self, node: RuleSet):
-        # We need to manually iterate and replace to handle node replacement
-        new_declarations = []
-        for decl in node.declarations:
-            if isinstance(decl, Declaration) and isinstance(decl.value, VariableRef):
-                resolved = self.visit(decl.value)
-                if resolved:
-                    decl.value = resolved
-            new_declarations.append(decl)
-        node.declarations = new_declarations
+    def _resolve_value(self, value: Value) -> Value:
+        """
+        Resolves references nested in lists and function arguments.
+        Values are immutable, so containers are rebuilt only when an item changes.
+        """
+        if isinstance(value, VariableRef):
+            if value.name in self._resolving:
+                return value  # Circular definition, leave the reference as is
+            resolved = self.visit(value)
+            if resolved is value:
+                return value
+            self._resolving.add(value.name)
+            try:
+                return self._resolve_value(resolved)
+            finally:
+                self._resolving.discard(value.name)
+        if isinstance(value, (SpaceList, CommaList)):
+            items = tuple(self._resolve_value(item) for item in value.items)
+            if all(new is old for new, old in zip(items, value.items)):
+                return value
+            return type(value)(items=items)
+        if isinstance(value, Function):
+            args = tuple(self._resolve_value(arg) if isinstance(arg, Node) else arg for arg in value.args)
+            if all(new is old for new, old in zip(args, value.args)):
+                return value
+            return Function(name=value.name, args=args)
+        return value
+
+
+class ResolutionPass(Pass):
+    """
+    VariableResolver as a copy-on-write pass (see VariableResolver.resolve):
+    the passes after it in the same traversal see the resolved nodes, and
+    the input tree is left as it was. It is a barrier: the variable context
+    must be complete.
+    """
+    name = 'resolve'
+    node_types = (RuleSet, Declaration, TemplateDef)
+    mode = WRITE
+    barrier = True
 
-        for child in node.children:
-            self.visit(child)
+    def __init__(self, context: SemanticContext, resolver: Optional[VariableResolver] = None):
+        self.resolver = resolver if resolver is not None else VariableResolver(context)
+
+    def enter(self, node: ASTNode, parent: ASTNode):
+        return self.resolver.resolve_node(node)
 
 
 class SemanticAnalyzer(ASTWalker):
@@ -78,33 +162,59 @@ class SemanticAnalyzer(ASTWalker):
         self.scope_analyzer = ScopeAnalyzer()
         self.context.current_file = filename
     
-    def analyze(self, ast: Stylesheet) -> Tuple[List, SemanticContext]:
-        """Punto de entrada principal para el análisis"""
-        tpl_table, tpl_diagnostics = collect_templates(ast)
-        self.diagnostics.diagnostics.extend(tpl_diagnostics)
+    def analyze(self, ast: Stylesheet, passes: Optional[PassManager] = None) -> Tuple[List, SemanticContext, Stylesheet]:
+        """
+        Punto de entrada principal para el análisis. Registro de plantillas,
+        expansión y análisis corren como pases: los dos últimos en un solo
+        recorrido. Con `passes` se usa ese PassManager (y sus tiempos).
+        La expansión es en copia: `ast` no cambia y se retorna, junto a los
+        diagnósticos y el contexto, el árbol con las plantillas expandidas.
+        """
+        manager = passes if passes is not None else PassManager()
+        collect = TemplateCollectPass()
+        expand = TemplateExpandPass(collect.template_table)
+        
+        start = len(self.diagnostics.diagnostics)
+        ast = manager.run(ast, [collect, expand, AnalysisPass(self)])
+        # Mismo orden que en pases separados: plantillas, expansión y análisis
+        self.diagnostics.diagnostics[start:start] = collect.diagnostics + expand.diagnostics
+        
+        self._analyze_unused_variables()
+        self._analyze_undefined_references()
         
-        expansion_diagnostics = expand_templates(ast, tpl_table)
-        self.diagnostics.diagnostics.extend(expansion_diagnostics)
+        return self.diagnostics.get_diagnostics(), self.context, ast
+    
+    def analyze_node(self, node: ASTNode, tpl_table: TemplateTable) -> None:
+        """
+        Analiza un único nodo de nivel superior (modo streaming).
+        Las plantillas se registran en tpl_table y los RuleSet se expanden con
+        las plantillas ya vistas, por lo que deben definirse antes de usarse.
+        Al terminar la entrada hay que llamar a finish().
+        """
+        fragment = Stylesheet(children=[node], loc=node.loc)
+        if isinstance(node, TemplateDef):
+            _, tpl_diagnostics = collect_templates(fragment, tpl_table)
+            self.diagnostics.diagnostics.extend(tpl_diagnostics)
+            return
         
-        self.visit(ast)
+        if isinstance(node, RuleSet):
+            expansion_diagnostics = expand_templates(fragment, tpl_table)
+            self.diagnostics.diagnostics.extend(expansion_diagnostics)
         
+        self.visit(node)
+    
+    def finish(self) -> Tuple[List, SemanticContext]:
+        """Cierra el análisis en modo streaming (variables sin usar, etc.)"""
         self._analyze_unused_variables()
         self._analyze_undefined_references()
         
         return self.diagnostics.get_diagnostics(), self.context
     
-    def visit_Stylesheet(self, node: Stylesheet) -> None:
-        for child in node.children:
-            if not isinstance(child, TemplateDef):
-                self.visit(child)
-    
-    def visit_TemplateDef(self, node: TemplateDef) -> None:
-        pass
+    def enter_TemplateDef(self, node: TemplateDef):
+        # Las plantillas se analizan al expandirse
+        return SKIP
     
-    def visit_VariableDecl(self, node: VariableDecl) -> None:
-        if hasattr(node.value, '__class__'):
-            self.visit(node.value)
-        
+    def leave_VariableDecl(self, node: VariableDecl) -> None:
         # After visiting, the value might be resolved.
         resolved_value = node.value
         if isinstance(node.value, VariableRef):
@@ -115,7 +225,8 @@ class SemanticAnalyzer(ASTWalker):
         self.scope_analyzer.analyze_variable_declaration(node)
         self.context.set_variable(node.name, resolved_value, node.loc)
     
-    def visit_RuleSet(self, node: RuleSet) -> None:
+    def enter_RuleSet(self, node: RuleSet) -> list:
+        """Abre el ámbito del ruleset y analiza sus selectores y declaraciones"""
         self.scope_analyzer.enter_new_scope()
         for selector in node.selectors:
             self._analyze_selector(selector)
@@ -124,17 +235,12 @@ class SemanticAnalyzer(ASTWalker):
         for declaration in node.declarations:
             if isinstance(declaration, Declaration):
                 self._analyze_declaration(declaration, declared_properties)
-        
-        for child in node.children:
-            self.visit(child)
-        
-        self.scope_analyzer.exit_current_scope()
+        return node.children
     
-    def visit_Declaration(self, node: Declaration) -> None:
-        if hasattr(node.value, '__class__'):
-            self.visit(node.value)
+    def leave_RuleSet(self, node: RuleSet) -> None:
+        self.scope_analyzer.exit_current_scope()
     
-    def visit_VariableRef(self, node: VariableRef) -> None:
+    def enter_VariableRef(self, node: VariableRef) -> None:
         loc = node.loc if hasattr(node, 'loc') and node.loc else Loc(self.filename, 1, 1, 0)
         self.context.use_variable(node.name, loc)
         self.scope_analyzer.analyze_variable_reference(node, loc)
@@ -199,4 +305,26 @@ class SemanticAnalyzer(ASTWalker):
     
     def _analyze_undefined_references(self) -> None:
         # This is now partially handled in visit_VariableRef, but this catches more cases.
-        pass
\ No newline at end of file
+        pass
+
+
+class AnalysisPass(Pass):
+    """
+    SemanticAnalyzer como pase: los RuleSet abren y cierran su ámbito al
+    entrar y salir, y el resto de nodos se analizan con el visitante.
+    """
+    name = 'analyze'
+    node_types = (Node,)
+    
+    def __init__(self, analyzer: SemanticAnalyzer):
+        self.analyzer = analyzer
+    
+    def enter(self, node: ASTNode, parent: ASTNode):
+        if isinstance(node, RuleSet):
+            self.analyzer.enter_RuleSet(node)
+        elif not isinstance(node, CONTAINERS):
+            self.analyzer.visit(node)
+    
+    def exit(self, node: ASTNode, parent: ASTNode) -> None:
+        if isinstance(node, RuleSet):
+            self.analyzer.leave_RuleSet(node)
@@ -1,46 +1,147 @@
 # templates.py
 # Sistema de plantillas CSSX con validación y expansión
 
-import copy
+import dataclasses
+from dataclasses import dataclass
 from typing import Dict, List, Set, Union, Optional, Tuple
 from cssx.ast.nodes import *
+from cssx.ast.hashing import fingerprint
 from cssx.ast.visitor import ASTWalker
+from cssx.passes import Pass, SKIP, WRITE
 from cssx.semantics.diagnostics import Diagnostic, ErrorCodes, WarningCodes
 
 
+@dataclass(frozen=True, slots=True)
+class ValueSlot:
+    """
+    Hueco de un valor del cuerpo de una plantilla: el parámetro `param`, o un
+    valor compuesto (`kind`: SpaceList, CommaList o Function) cuyas partes
+    son valores constantes o más huecos.
+    """
+    param: Optional[str] = None
+    kind: Optional[type] = None
+    name: str = ''
+    parts: tuple = ()
+    
+    def fill(self, param_values: Dict[str, Value]) -> Value:
+        """Valor con los parámetros sustituidos (inmutables: se comparten)"""
+        if self.param is not None:
+            return param_values[self.param]
+        parts = tuple(part.fill(param_values) if part.__class__ is ValueSlot else part for part in self.parts)
+        if self.kind is Function:
+            return Function(name=self.name, args=parts)
+        return self.kind(items=parts)
+
+
+class TemplatePlan:
+    """
+    Plan de instanciación de una plantilla, compilado una vez al registrarla.
+    Los valores del cuerpo que no mencionan parámetros son constantes y se
+    comparten tal cual; los demás son ValueSlot, y `slots` guarda sus
+    posiciones. Los valores por defecto se comprueban aquí (qué parámetros
+    son obligatorios), así que instanciar es solo rellenar los huecos.
+    """
+    
+    def __init__(self, template: TemplateDef):
+        self.name = template.name
+        self.params: Tuple[str, ...] = tuple(param.name for param in template.params)
+        # Valor por defecto de cada parámetro, None si es obligatorio
+        self.defaults: Tuple[Optional[Value], ...] = tuple(param.default_value for param in template.params)
+        self.required: Tuple[str, ...] = tuple(
+            name for name, default in zip(self.params, self.defaults) if default is None
+        )
+        # Desde esta posición todos los parámetros tienen valor por defecto
+        self.optional_from = max((i + 1 for i, default in enumerate(self.defaults) if default is None), default=0)
+        names = set(self.params)
+        # (propiedad, important, loc) de cada declaración del cuerpo
+        self.declarations: Tuple[tuple, ...] = tuple((decl.prop, decl.important, decl.loc) for decl in template.body)
+        self.values: Tuple[Union[Value, ValueSlot], ...] = tuple(_compile_value(decl.value, names) for decl in template.body)
+        self.slots: Tuple[int, ...] = tuple(i for i, value in enumerate(self.values) if value.__class__ is ValueSlot)
+    
+    def instantiate(self, param_values: Dict[str, Value]) -> Tuple[Value, ...]:
+        """Valores del cuerpo para unos argumentos ya asociados"""
+        if not self.slots:
+            return self.values
+        values = list(self.values)
+        for i in self.slots:
+            values[i] = values[i].fill(param_values)
+        return tuple(values)
+
+
+def _compile_value(value: Value, params: Set[str]) -> Union[Value, ValueSlot]:
+    """El valor tal cual si no menciona parámetros; si los menciona, su hueco"""
+    if isinstance(value, VariableRef):
+        # Las demás referencias son variables globales (se resuelven después)
+        return ValueSlot(param=value.name) if value.name in params else value
+    if isinstance(value, (SpaceList, CommaList)):
+        kind, name, parts = type(value), '', value.items
+    elif isinstance(value, Function):
+        kind, name, parts = Function, value.name, value.args
+    else:
+        return value
+    parts = tuple(_compile_value(part, params) for part in parts)
+    if not any(part.__class__ is ValueSlot for part in parts):
+        return value
+    return ValueSlot(kind=kind, name=name, parts=parts)
+
+
 class TemplateTable:
-    """Tabla de plantillas registradas"""
+    """Tabla de plantillas registradas, con su plan de instanciación"""
     
     def __init__(self):
         self.templates: Dict[str, TemplateDef] = {}
+        self.plans: Dict[str, TemplatePlan] = {}
     
     def register(self, template: TemplateDef) -> Optional[str]:
         """
-        Registra una plantilla. Retorna error si ya existe.
+        Registra una plantilla y compila su plan. Retorna error si ya existe.
         """
         if template.name in self.templates:
             return f"Plantilla '{template.name}' ya está definida"
         
         self.templates[template.name] = template
+        self.plans[template.name] = TemplatePlan(template)
         return None
     
     def get(self, name: str) -> Optional[TemplateDef]:
         """Obtiene una plantilla por nombre"""
         return self.templates.get(name)
     
+    def plan(self, name: str) -> Optional[TemplatePlan]:
+        """Plan de instanciación de una plantilla"""
+        return self.plans.get(name)
+    
     def exists(self, name: str) -> bool:
         """Verifica si existe una plantilla"""
         return name in self.templates
 
 
 class TemplateExpander:
-    """Expandidor de plantillas con detección de recursión"""
+    """
+    Expandidor de plantillas con detección de recursión. Instancia el plan
+    de cada plantilla y memoriza los valores por (plantilla, argumentos
+    asociados): los valores son inmutables, así que cada uso con los mismos
+    argumentos los comparte y solo recibe declaraciones nuevas con su Loc.
+    """
     
     def __init__(self, template_table: TemplateTable):
         self.template_table = template_table
         self.expansion_stack: List[str] = []  # Stack para detectar recursión
         self.max_depth = 50  # Límite de profundidad para evitar recursión infinita
         self.diagnostics: List[Diagnostic] = []
+        # (nombre, huellas de los argumentos) -> valores del cuerpo instanciado
+        self._expansions: Dict[tuple, Tuple[Value, ...]] = {}
+        self.cache_hits = 0
+        self.cache_misses = 0
+    
+    def cache_stats(self) -> Dict[str, float]:
+        """Aciertos, fallos y tasa de acierto de la caché de expansiones"""
+        lookups = self.cache_hits + self.cache_misses
+        return {
+            'hits': self.cache_hits,
+            'misses': self.cache_misses,
+            'hit_ratio': round(self.cache_hits / lookups, 4) if lookups else 0.0,
+        }
     
     def expand_template_use(self, template_use: TemplateUse, context_loc: Loc) -> List[Declaration]:
         """
@@ -89,20 +190,28 @@ class TemplateExpander:
             return []
         
         # Validar y asociar argumentos con parámetros
-        param_values = self._bind_arguments(template, template_use, context_loc)
+        plan = self.template_table.plan(template_use.name)
+        param_values = self._bind_arguments(plan, template_use, context_loc)
         if param_values is None:
             return []  # Error en binding, ya reportado
         
-        # Expandir con stack de recursión
-        self.expansion_stack.append(template_use.name)
-        try:
-            expanded_declarations = self._expand_template_body(template.body, param_values, context_loc)
-        finally:
-            self.expansion_stack.pop()
+        # Los argumentos se normalizan por su huella (contenido, sin ubicación)
+        key = (plan.name, tuple(sorted((name, _value_key(value)) for name, value in param_values.items())))
+        values = self._expansions.get(key)
+        if values is not None:
+            self.cache_hits += 1
+        else:
+            self.cache_misses += 1
+            # Expandir con stack de recursión
+            self.expansion_stack.append(template_use.name)
+            try:
+                values = self._expansions[key] = self._instantiate(plan, param_values)
+            finally:
+                self.expansion_stack.pop()
         
-        return expanded_declarations
+        return self._at_site(plan, values, context_loc)
     
-    def _bind_arguments(self, template: TemplateDef, template_use: TemplateUse, context_loc: Loc) -> Optional[Dict[str, Value]]:
+    def _bind_arguments(self, plan: TemplatePlan, template_use: TemplateUse, context_loc: Loc) -> Optional[Dict[str, Value]]:
         """
         Asocia argumentos del uso con parámetros de la plantilla.
         Retorna dict {param_name: value} o None si hay error.
@@ -127,21 +236,36 @@ class TemplateExpander:
         
         if has_named:
             # Argumentos nombrados
-            return self._bind_named_arguments(template, template_use, context_loc)
+            return self._bind_named_arguments(plan, template_use, context_loc)
         else:
             # Argumentos posicionales
-            return self._bind_positional_arguments(template, template_use, context_loc)
+            return self._bind_positional_arguments(plan, template_use, context_loc)
     
-    def _bind_positional_arguments(self, template: TemplateDef, template_use: TemplateUse, context_loc: Loc) -> Optional[Dict[str, Value]]:
+    def _bind_positional_arguments(self, plan: TemplatePlan, template_use: TemplateUse, context_loc: Loc) -> Optional[Dict[str, Value]]:
         """Asocia argumentos posicionales"""
         param_values = {}
         
         # Verificar que no hay demasiados argumentos
-        if len(template_use.args) > len(template.params):
+        if len(template_use.args) > len(plan.params):
+            self.diagnostics.append(Diagnostic(
+                code=ErrorCodes.TEMPLATE_INVOCATION_ERROR,
+                severity="ERROR",
+                message=f"Demasiados argumentos para plantilla '{plan.name}'. Esperados: {len(plan.params)}, recibidos: {len(template_use.args)}",
+                file=context_loc.file,
+                line=context_loc.line,
+                col=context_loc.col,
+                doc_url="internal://plantillas"
+            ))
+            return None
+        
+        # Los parámetros sin argumento necesitan valor por defecto
+        count = len(template_use.args)
+        if count < plan.optional_from:
+            name = next(plan.params[i] for i in range(count, plan.optional_from) if plan.defaults[i] is None)
             self.diagnostics.append(Diagnostic(
                 code=ErrorCodes.TEMPLATE_INVOCATION_ERROR,
                 severity="ERROR",
-                message=f"Demasiados argumentos para plantilla '{template.name}'. Esperados: {len(template.params)}, recibidos: {len(template_use.args)}",
+                message=f"Parámetro '{name}' no tiene valor por defecto y no se proporcionó argumento",
                 file=context_loc.file,
                 line=context_loc.line,
                 col=context_loc.col,
@@ -150,32 +274,19 @@ class TemplateExpander:
             return None
         
         # Asignar argumentos posicionales
-        for i, arg in enumerate(template_use.args):
-            param = template.params[i]
-            param_values[param.name] = arg
+        for name, arg in zip(plan.params, template_use.args):
+            param_values[name] = arg
         
         # Asignar valores por defecto para parámetros restantes
-        for i in range(len(template_use.args), len(template.params)):
-            param = template.params[i]
-            if param.default_value is None:
-                self.diagnostics.append(Diagnostic(
-                    code=ErrorCodes.TEMPLATE_INVOCATION_ERROR,
-                    severity="ERROR",
-                    message=f"Parámetro '{param.name}' no tiene valor por defecto y no se proporcionó argumento",
-                    file=context_loc.file,
-                    line=context_loc.line,
-                    col=context_loc.col,
-                    doc_url="internal://plantillas"
-                ))
-                return None
-            param_values[param.name] = param.default_value
+        for i in range(count, len(plan.params)):
+            param_values[plan.params[i]] = plan.defaults[i]
         
         return param_values
     
-    def _bind_named_arguments(self, template: TemplateDef, template_use: TemplateUse, context_loc: Loc) -> Optional[Dict[str, Value]]:
+    def _bind_named_arguments(self, plan: TemplatePlan, template_use: TemplateUse, context_loc: Loc) -> Optional[Dict[str, Value]]:
         """Asocia argumentos nombrados"""
         param_values = {}
-        param_names = {p.name for p in template.params}
+        param_names = set(plan.params)
         provided_names = set()
         
         # Procesar argumentos nombrados
@@ -185,7 +296,7 @@ class TemplateExpander:
                     self.diagnostics.append(Diagnostic(
                         code=ErrorCodes.TEMPLATE_INVOCATION_ERROR,
                         severity="ERROR",
-                        message=f"Parámetro '{arg.name}' no existe en plantilla '{template.name}'",
+                        message=f"Parámetro '{arg.name}' no existe en plantilla '{plan.name}'",
                         file=context_loc.file,
                         line=context_loc.line,
                         col=context_loc.col,
@@ -208,99 +319,86 @@ class TemplateExpander:
                 param_values[arg.name] = arg.value
                 provided_names.add(arg.name)
         
+        # Verificar los parámetros obligatorios
+        for name in plan.required:
+            if name not in provided_names:
+                self.diagnostics.append(Diagnostic(
+                    code=ErrorCodes.TEMPLATE_INVOCATION_ERROR,
+                    severity="ERROR",
+                    message=f"Parámetro requerido '{name}' no proporcionado",
+                    file=context_loc.file,
+                    line=context_loc.line,
+                    col=context_loc.col,
+                    doc_url="internal://plantillas"
+                ))
+                return None
+        
         # Asignar valores por defecto para parámetros no proporcionados
-        for param in template.params:
-            if param.name not in provided_names:
-                if param.default_value is None:
-                    self.diagnostics.append(Diagnostic(
-                        code=ErrorCodes.TEMPLATE_INVOCATION_ERROR,
-                        severity="ERROR",
-                        message=f"Parámetro requerido '{param.name}' no proporcionado",
-                        file=context_loc.file,
-                        line=context_loc.line,
-                        col=context_loc.col,
-                        doc_url="internal://plantillas"
-                    ))
-                    return None
-                param_values[param.name] = param.default_value
+        for name, default in zip(plan.params, plan.defaults):
+            if name not in provided_names:
+                param_values[name] = default
         
         return param_values
     
-    def _expand_template_body(self, body: List[Declaration], param_values: Dict[str, Value], context_loc: Loc) -> List[Declaration]:
+    def _instantiate(self, plan: TemplatePlan, param_values: Dict[str, Value]) -> Tuple[Value, ...]:
         """
-        Expande el cuerpo de una plantilla sustituyendo parámetros por valores.
+        Valores del cuerpo con los parámetros sustituidos: solo se rellenan
+        los huecos del plan. El resultado se comparte entre usos.
         """
-        expanded_declarations = []
-        
-        for decl in body:
-            # Clonar la declaración para no modificar el original
-            new_decl = copy.deepcopy(decl)
-            
-            # Sustituir referencias a parámetros en el valor
-            new_decl.value = self._substitute_parameters(new_decl.value, param_values)
-            
-            # Mantener ubicación original pero añadir contexto del uso
-            if new_decl.loc:
-                new_decl.loc.file = context_loc.file
-            
-            expanded_declarations.append(new_decl)
-        
-        return expanded_declarations
+        return plan.instantiate(param_values)
     
-    def _substitute_parameters(self, value: Value, param_values: Dict[str, Value]) -> Value:
-        """
-        Sustituye referencias a parámetros (@param) en un valor por los valores correspondientes.
-        """
-        if isinstance(value, VariableRef):
-            if value.name in param_values:
-                # Sustituir parámetro por su valor
-                return copy.deepcopy(param_values[value.name])
-            else:
-                # Mantener referencia a variable global
-                return value
-        elif isinstance(value, SpaceList):
-            # Sustituir en listas de valores
-            new_items = []
-            for item in value.items:
-                new_items.append(self._substitute_parameters(item, param_values))
-            return SpaceList(items=tuple(new_items))
-        elif isinstance(value, Function):
-            # Sustituir en argumentos de funciones
-            new_args = []
-            for arg in value.args:
-                new_args.append(self._substitute_parameters(arg, param_values))
-            return Function(name=value.name, args=new_args, loc=value.loc)
-        else:
-            # Valores literales no necesitan sustitución
-            return value
+    @staticmethod
+    def _at_site(plan: TemplatePlan, values: Tuple[Value, ...], context_loc: Loc) -> List[Declaration]:
+        """Declaraciones de una expansión para un uso: comparten valores, no nodos"""
+        declarations = []
+        file = context_loc.file
+        for (prop, important, loc), value in zip(plan.declarations, values):
+            if loc:
+                # Mantener ubicación original pero añadir contexto del uso
+                loc = Loc.at(loc.index, loc.offset)
+                loc.file = file
+            declarations.append(Declaration(prop=prop, value=value, important=important, loc=loc))
+        return declarations
+
+
+def _value_key(value):
+    """Clave de un argumento: su huella si es un nodo"""
+    return fingerprint(value) if isinstance(value, Node) else value
 
 
-def collect_templates(ast: Stylesheet) -> Tuple[TemplateTable, List[Diagnostic]]:
+def collect_templates(ast: Stylesheet, template_table: Optional[TemplateTable] = None) -> Tuple[TemplateTable, List[Diagnostic]]:
     """
     Recorre Stylesheet.children, registra TemplateDef por nombre.
     Si nombre duplicado → E040 con loc del duplicado.
+    Si se pasa template_table, registra sobre ella (útil en modo streaming).
     Retorna (tabla_plantillas, diagnostics).
     """
-    template_table = TemplateTable()
+    if template_table is None:
+        template_table = TemplateTable()
     diagnostics = []
     
     for child in ast.children:
         if isinstance(child, TemplateDef):
-            error = template_table.register(child)
-            if error:
-                diagnostics.append(Diagnostic(
-                    code=ErrorCodes.TEMPLATE_DUPLICATE,
-                    severity="ERROR",
-                    message=error,
-                    file=child.loc.file,
-                    line=child.loc.line,
-                    col=child.loc.col,
-                    doc_url="internal://plantillas"
-                ))
+            _register_template(template_table, child, diagnostics)
     
     return template_table, diagnostics
 
 
+def _register_template(template_table: TemplateTable, template: TemplateDef, diagnostics: List[Diagnostic]) -> None:
+    """Registra una plantilla; si el nombre está repetido → E040 con loc del duplicado"""
+    error = template_table.register(template)
+    if error:
+        diagnostics.append(Diagnostic(
+            code=ErrorCodes.TEMPLATE_DUPLICATE,
+            severity="ERROR",
+            message=error,
+            file=template.loc.file,
+            line=template.loc.line,
+            col=template.loc.col,
+            doc_url="internal://plantillas"
+        ))
+
+
 def expand_templates(ast: Stylesheet, template_table: TemplateTable) -> List[Diagnostic]:
     """
     Recorre todos los RuleSet y, dentro de declarations, reemplaza cada TemplateUse
@@ -314,30 +412,101 @@ def expand_templates(ast: Stylesheet, template_table: TemplateTable) -> List[Dia
     """
     expander = TemplateExpander(template_table)
     
-    def expand_in_ruleset(ruleset: RuleSet):
-        """Expande plantillas en un ruleset recursivamente"""
-        new_declarations = []
-        
-        for item in ruleset.declarations:
-            if isinstance(item, TemplateUse):
-                # Expandir uso de plantilla
-                expanded_decls = expander.expand_template_use(item, item.loc)
-                new_declarations.extend(expanded_decls)
-            else:
-                # Mantener declaración normal
-                new_declarations.append(item)
-        
-        # Reemplazar declaraciones con versión expandida
-        ruleset.declarations = new_declarations
-        
-        # Expandir recursivamente en rulesets anidados
-        for child in ruleset.children:
+    # Expandir en todos los rulesets del stylesheet y en los anidados, en
+    # preorden y con una pila explícita (sin límite de anidamiento)
+    parents = {}
+    pending = [child for child in reversed(ast.children) if isinstance(child, RuleSet)]
+    while pending:
+        ruleset = pending.pop()
+        if _expand_declarations(ruleset, expander):
+            # Huellas desactualizadas: la del ruleset y las de sus ancestros
+            node = ruleset
+            while node is not None and node.fp is not None:
+                node.fp = None
+                node = parents.get(id(node), ast)
+        for child in reversed(ruleset.children):
             if isinstance(child, RuleSet):
-                expand_in_ruleset(child)
-    
-    # Expandir en todos los rulesets del stylesheet
-    for child in ast.children:
-        if isinstance(child, RuleSet):
-            expand_in_ruleset(child)
+                parents[id(child)] = ruleset
+                pending.append(child)
     
     return expander.diagnostics
+
+
+def _expanded_declarations(ruleset: RuleSet, expander: TemplateExpander) -> Optional[List[Declaration]]:
+    """
+    Declaraciones de ruleset con cada TemplateUse reemplazado por su
+    expansión, o None si no usa plantillas.
+    """
+    if not any(isinstance(item, TemplateUse) for item in ruleset.declarations):
+        return None
+    new_declarations = []
+    
+    for item in ruleset.declarations:
+        if isinstance(item, TemplateUse):
+            # Expandir uso de plantilla
+            expanded_decls = expander.expand_template_use(item, item.loc)
+            new_declarations.extend(expanded_decls)
+        else:
+            # Mantener declaración normal
+            new_declarations.append(item)
+    
+    return new_declarations
+
+
+def _expand_declarations(ruleset: RuleSet, expander: TemplateExpander) -> bool:
+    """
+    Reemplaza (in-place) cada TemplateUse de ruleset.declarations por su
+    expansión. Retorna True si el ruleset cambió (quien llama debe
+    invalidar las huellas).
+    """
+    new_declarations = _expanded_declarations(ruleset, expander)
+    if new_declarations is None:
+        return False
+    ruleset.declarations = new_declarations
+    return True
+
+
+class TemplateCollectPass(Pass):
+    """collect_templates como pase: registra los TemplateDef de nivel superior"""
+    name = 'templates'
+    node_types = (TemplateDef,)
+    top_level = True
+    
+    def __init__(self, template_table: Optional[TemplateTable] = None):
+        self.template_table = template_table if template_table is not None else TemplateTable()
+        self.diagnostics: List[Diagnostic] = []
+    
+    def enter(self, node: TemplateDef, parent: Node):
+        _register_template(self.template_table, node, self.diagnostics)
+
+
+class TemplateExpandPass(Pass):
+    """
+    expand_templates como pase, en copia: al entrar en un RuleSet con usos
+    de plantilla lo reemplaza por una copia con las declaraciones
+    expandidas, así que los pases que vienen detrás en el mismo recorrido
+    ya la ven y el árbol de entrada no cambia. Como expand_templates, no
+    entra en las reglas @media. Es una barrera: necesita todas las
+    plantillas registradas.
+    """
+    name = 'expand'
+    node_types = (RuleSet, MediaQuery)
+    mode = WRITE
+    barrier = True
+    
+    def __init__(self, template_table: TemplateTable):
+        self.expander = TemplateExpander(template_table)
+    
+    @property
+    def diagnostics(self) -> List[Diagnostic]:
+        return self.expander.diagnostics
+    
+    def stats(self) -> Dict[str, dict]:
+        return {'template_cache': self.expander.cache_stats()}
+    
+    def enter(self, node: Node, parent: Node):
+        if isinstance(node, MediaQuery):
+            return SKIP
+        new_declarations = _expanded_declarations(node, self.expander)
+        if new_declarations is not None:
+            return dataclasses.replace(node, declarations=new_declarations, fp=None)
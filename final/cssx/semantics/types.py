@@ -66,6 +66,8 @@ def get_value_type(value: Any) -> CSSValueType:
         return CSSValueType.VARIABLE
     elif isinstance(value, SpaceList):
         return CSSValueType.SPACE_LIST
+    elif isinstance(value, CommaList):
+        return CSSValueType.COMMA_LIST
     else:
         return CSSValueType.UNKNOWN
 
@@ -1,6 +1,6 @@
 # cssx/server/editor.py
 
-from flask import Flask, send_from_directory, request, jsonify
+from flask import Flask, Response, send_from_directory, request, jsonify
 from flask_socketio import SocketIO, emit
 import os
 import time
@@ -11,6 +11,7 @@ import json
 # Adjust the path to import from the root 'cssx' package
 from cssx.compiler import Compiler
 from cssx.parser.cssx_parser import parse_to_ast
+from cssx.ast.nodes import iter_json
 from cssx.lexer.dictionaries import DICCIONARIO_CSS
 
 # Configure logging
@@ -20,6 +21,8 @@ logger = logging.getLogger('cssx-editor-server')
 # --- Configuration ---
 # The server is in cssx/server, so we go up two levels to get to the project root.
 PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+# Nodes shown in the AST text view; larger trees get a truncated preview
+AST_PREVIEW_MAX_NODES = 5000
 
 app = Flask(__name__, static_folder=PROJECT_ROOT)
 app.config['SECRET_KEY'] = 'cssx_secret_key_2024'
@@ -62,6 +65,24 @@ class EditorCompiler:
             'warnings': warnings,
         }
 
+    def query_declarations(self, code: str, prop: str, under: str = None):
+        """
+        Declarations of `prop` (optionally inside the rules of a simple
+        selector such as '.card'), answered from the compile's ASTIndex
+        without walking the tree again.
+        """
+        index = self.compiler.compile(code)['index']
+        if index is None:
+            return None
+        return [
+            {
+                'prop': decl.prop,
+                'line': decl.loc.line,
+                'col': decl.loc.col,
+            }
+            for decl in index.declarations(prop, under=under or None)
+        ]
+
 # Global compiler instance
 editor_compiler = EditorCompiler()
 
@@ -148,16 +169,42 @@ def get_ast():
             return jsonify({'success': False, 'error': 'No code provided.'})
         
         ast = parse_to_ast(code)
+        ast_string = ast.to_pretty_string(max_nodes=AST_PREVIEW_MAX_NODES)
         
-        ast_dict = ast.to_dict()
-        ast_string = ast.to_pretty_string()
+        # Encode the AST JSON node by node instead of building the whole dict.
+        # The chunks are produced here, inside the try, so an encoding error
+        # still reaches the client as a valid error object rather than a
+        # 200 response cut off halfway through the tree.
+        chunks = list(iter_json(ast))
+
+        def generate():
+            yield '{"success": true, "ast_string": ' + json.dumps(ast_string) + ', "ast": '
+            yield from chunks
+            yield '}'
         
-        return jsonify({'success': True, 'ast': ast_dict, 'ast_string': ast_string})
+        return Response(generate(), mimetype='application/json')
     except Exception as e:
         logger.error(f"Error generating AST: {e}")
         logger.error(traceback.format_exc())
         return jsonify({'success': False, 'error': str(e)})
 
+@app.route('/query_declarations', methods=['POST'])
+def query_declarations():
+    """Finds the declarations of a property, optionally under a selector."""
+    try:
+        data = request.get_json()
+        prop = data.get('prop', '')
+        if not prop:
+            return jsonify({'success': False, 'error': 'No property provided.'})
+
+        found = editor_compiler.query_declarations(data.get('code', ''), prop, data.get('under'))
+        if found is None:
+            return jsonify({'success': False, 'error': 'The code could not be parsed.'})
+        return jsonify({'success': True, 'declarations': found})
+    except Exception as e:
+        logger.error(f"Error querying declarations: {e}")
+        return jsonify({'success': False, 'error': str(e)})
+
 @app.route('/get_cssx_properties')
 def get_cssx_properties():
     """Returns the list of custom CSSX properties."""
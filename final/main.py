@@ -1,8 +1,20 @@
 # main.py
 import sys
-from cssx.server.editor import run_server
 
 if __name__ == '__main__':
+    if len(sys.argv) > 2 and sys.argv[1] == '--css':
+        # Compile a file to CSS on stdout, block by block: python main.py --css archivo.cssx
+        from cssx.compiler import Compiler
+        from cssx.semantics.diagnostics import format_diagnostic
+
+        with open(sys.argv[2], 'r', encoding='utf-8') as source:
+            diagnostics = Compiler().compile_css_stream(source, sys.stdout, sys.argv[2])
+        for d in diagnostics:
+            print(format_diagnostic(d), file=sys.stderr)
+        sys.exit(1 if any(d.severity == 'ERROR' for d in diagnostics) else 0)
+
+    from cssx.server.editor import run_server
+
     # You can customize the port from the command line, e.g., python main.py 8080
     port = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
-    run_server(port=port)
\ No newline at end of file
+    run_server(port=port)
@@ -0,0 +1,132 @@
+import gc
+import random
+import sys
+import time
+
+from cssx.ast.visitor import ASTWalker
+from cssx.codegen.ast_css_generator import AstCssGenerator
+from cssx.codegen.ast_html_generator import AstHtmlGenerator
+from cssx.parser.cssx_parser import parse_to_ast
+from cssx.parser.syntactic import normalizar_valor
+from cssx.semantics.analyzer import SemanticAnalyzer
+
+# Presupuesto fijo: ninguna entrada puede tardar más que esto por KiB.
+# Las hojas normales rondan 0.3 ms/KiB; el margen absorbe máquinas lentas.
+BUDGET_MS_PER_KB = 10.0
+SIZE = 48 * 1024
+
+# Entradas construidas para provocar retroceso en los patrones o recursión
+# profunda en el parser; cada una ocupa unos SIZE caracteres.
+ADVERSARIAL_INPUTS = {
+    'dimension sin unidad válida': "a {\n  ancho = " + "1" * SIZE + "x\n}",
+    'número con puntos': "a {\n  ancho = " + "1." * (SIZE // 2) + "px\n}",
+    'nombre sin separador': "a {\n  " + "a" * SIZE + "\n}",
+    'variable sin igual': "@" + "a" * SIZE,
+    'espacios sin separador': "a {\n  a" + " " * SIZE + "b\n}",
+    'guiones': "a {\n  " + "a-" * (SIZE // 2) + "\n}",
+    'funciones anidadas': "a {\n  x = " + "f(" * (SIZE // 2) + "\n}",
+    'funciones sin cerrar': "a {\n  x = " + "a(" * (SIZE // 2) + "\n}",
+    'comas': "a {\n  x = " + "," * SIZE + "\n}",
+    'comillas sin cerrar': "a {\n  x = " + "'a" * (SIZE // 2) + "\n}",
+    'url sin cerrar': "a {\n  x = " + "url(" * (SIZE // 4) + "\n}",
+    'combinadores': "a > " * (SIZE // 4) + "b {\n}",
+    'descendientes': "a " * (SIZE // 2) + "{\n}",
+    'selector compuesto': ".a" * (SIZE // 2) + " {\n}",
+    'anidamiento profundo': "a {\n" * (SIZE // 4) + "}\n" * (SIZE // 4),
+    'bloques sin cerrar': "a {\n" * (SIZE // 4),
+    'cierres sobrantes': "}\n" * (SIZE // 2),
+    'argumentos de plantilla': "a {\n  usar t(" + "1," * (SIZE // 2) + ")\n}",
+    'parámetros de plantilla': "plantilla t(" + "@p=1," * (SIZE // 5) + ") {\n}",
+}
+
+_FRAGMENTS = [
+    '.a {', 'b > c {', '}', '  color = rojo', '  ancho: 10px', '@v = 3', 'usar t(1, @p=2)',
+    'plantilla t(@p=1) {', '', '# {', '  x = rgba(0, 0, 0, 0.1)', '  x = calc(100% - var(--x))',
+    '  fuente = "Roboto", sans-serif', '  fondo = url("a.png")', '  margen = 0 auto', '(((', '"',
+]
+
+
+def random_document(rng: random.Random, lines: int) -> str:
+    """Documento aleatorio con fragmentos válidos e inválidos de la gramática"""
+    return '\n'.join(rng.choice(_FRAGMENTS) for _ in range(lines))
+
+
+def ms_per_kb(source: str, rounds: int = 3) -> float:
+    """Mejor tiempo de parse_to_ast en milisegundos por KiB"""
+    best = float('inf')
+    gc.disable()
+    try:
+        for _ in range(rounds):
+            start = time.perf_counter()
+            parse_to_ast(source)
+            best = min(best, time.perf_counter() - start)
+    finally:
+        gc.enable()
+    return best * 1000 / (max(len(source), 1) / 1024)
+
+
+def test_adversarial_inputs_stay_within_budget():
+    slow = {}
+    for name, source in ADVERSARIAL_INPUTS.items():
+        cost = ms_per_kb(source)
+        if cost > BUDGET_MS_PER_KB:
+            slow[name] = round(cost, 2)
+    assert not slow
+
+
+def test_legacy_value_normalizer_stays_within_budget():
+    # El generador de CSS antiguo normaliza los valores con syntactic.py
+    for value in ("a(" * (SIZE // 2), "f(" * (SIZE // 2) + ")", "a (" * (SIZE // 3)):
+        start = time.perf_counter()
+        normalizar_valor(value, {})
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        assert elapsed_ms <= BUDGET_MS_PER_KB * len(value) / 1024
+
+
+def test_random_documents_stay_within_budget():
+    rng = random.Random(0)
+    worst = max(ms_per_kb(random_document(rng, 2000), rounds=1) for _ in range(20))
+    assert worst <= BUDGET_MS_PER_KB
+
+
+def nested_source(depth: int) -> str:
+    return ('plantilla caja(@p=1) {\n  relleno = @p\n}\n' + '.a {\n' * depth
+            + '  color = rojo\n  usar caja(2)\n' + '}\n' * depth)
+
+
+class RuleCounter(ASTWalker):
+    def __init__(self):
+        self.rules = 0
+        self.open = 0
+
+    def enter_RuleSet(self, node):
+        self.rules += 1
+        self.open += 1
+
+    def leave_RuleSet(self, node):
+        self.open -= 1
+
+
+def test_builtin_passes_handle_10k_deep_nesting():
+    depth = 10_000
+    ast = parse_to_ast(nested_source(depth))
+
+    counter = RuleCounter()
+    counter.visit(ast)
+    assert (counter.rules, counter.open) == (depth, 0)
+
+    diagnostics, _, expanded = SemanticAnalyzer().analyze(ast)
+    assert diagnostics == []
+    innermost = expanded.children[-1]
+    while innermost.children:
+        innermost = innermost.children[0]
+    assert [d.prop for d in innermost.declarations] == ['color', 'relleno']
+
+    css = AstCssGenerator().generate(ast)
+    assert css.startswith('.a ' * (depth - 1) + '.a {')
+
+    # El HTML se indenta según la profundidad (crece con su cuadrado): basta
+    # con superar el límite de recursión
+    shallow = sys.getrecursionlimit() * 2
+    _, body = AstHtmlGenerator().generate(parse_to_ast(nested_source(shallow)))
+    assert body.count('<div class="a">') == shallow
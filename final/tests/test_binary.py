@@ -0,0 +1,64 @@
+import glob
+import os
+import pickle
+import time
+
+import pytest
+
+from cssx.ast import binary
+from cssx.codegen.ast_css_generator import AstCssGenerator
+from cssx.parser.cssx_parser import parse_to_ast
+from cssx.semantics.analyzer import SemanticAnalyzer, VariableResolver
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+CORPUS = sorted(glob.glob(os.path.join(ROOT, 'examples', '*.cssx'))) + [os.path.join(ROOT, 'mi_estilo.cssx')]
+
+
+def read(path: str) -> str:
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def best_time(func, rounds: int = 3) -> float:
+    best = float('inf')
+    for _ in range(rounds):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+@pytest.mark.parametrize('path', CORPUS, ids=os.path.basename)
+def test_binary_round_trip_on_corpus(path):
+    ast = parse_to_ast(read(path), path)
+    data = binary.dump(ast)
+    loaded = binary.load(data)
+    assert loaded == ast
+    assert [child.loc.line for child in loaded.children] == [child.loc.line for child in ast.children]
+    assert binary.dump(loaded) == data
+
+    # AST ya analizado y con las variables resueltas
+    _, context, expanded = SemanticAnalyzer(path).analyze(ast)
+    resolved = VariableResolver(context).resolve(expanded)
+    loaded = binary.load(binary.dump(resolved))
+    assert loaded == resolved
+    assert AstCssGenerator().generate(loaded) == AstCssGenerator().generate(resolved)
+
+
+def test_binary_format_is_versioned():
+    data = bytearray(binary.dump(parse_to_ast(read(CORPUS[0]))))
+    data[len(binary.MAGIC)] = binary.FORMAT_VERSION + 1
+    with pytest.raises(ValueError):
+        binary.load(bytes(data))
+    with pytest.raises(ValueError):
+        binary.load(b'no es un AST')
+
+
+def test_binary_is_smaller_and_not_slower_than_pickle():
+    ast = parse_to_ast('\n'.join([read(CORPUS[0])] * 100))
+    data = binary.dump(ast)
+    pickled = pickle.dumps(ast, pickle.HIGHEST_PROTOCOL)
+    assert len(data) * 2 < len(pickled)
+    # Margen amplio: con documentos grandes ambos son más rápidos que pickle
+    assert best_time(lambda: binary.dump(ast)) < 2 * best_time(lambda: pickle.dumps(ast, pickle.HIGHEST_PROTOCOL))
+    assert best_time(lambda: binary.load(data)) < 2 * best_time(lambda: pickle.loads(pickled))
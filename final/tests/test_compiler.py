@@ -0,0 +1,184 @@
+import io
+import os
+
+from cssx.compiler import Compiler
+
+EXAMPLE = os.path.join(os.path.dirname(__file__), '..', 'examples', 'main_example.cssx')
+
+
+def read_example() -> str:
+    with open(EXAMPLE, 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def test_stream_css_matches_batch_compile():
+    source = read_example()
+    out = io.StringIO()
+    diagnostics = Compiler().compile_css_stream(io.StringIO(source), out)
+    assert not [d for d in diagnostics if d.severity == 'ERROR']
+    assert out.getvalue() == Compiler().compile(source)['css']
+
+
+def test_fused_passes_match_separate_pipeline_and_report_timings():
+    from cssx.ast.nodes import Stylesheet, RuleSet, VariableRef
+    from cssx.codegen.ast_css_generator import AstCssGenerator
+    from cssx.codegen.ast_html_generator import AstHtmlGenerator
+    from cssx.parser.cssx_parser import parse_to_ast
+    from cssx.passes import Pass, PassManager
+    from cssx.semantics.analyzer import SemanticAnalyzer, VariableResolver, ResolutionPass
+
+    source = read_example()
+    result = Compiler().compile(source)
+    timings = result['stats']['timings_ms']
+    assert {'parse', 'templates', 'expand', 'analyze', 'resolve', 'css', 'html'} <= set(timings)
+
+    # Compatible passes share a traversal; barriers start a new one
+    analyzer = SemanticAnalyzer()
+    ast = parse_to_ast(source)
+    manager = PassManager()
+    _, context, ast = analyzer.analyze(ast, manager)
+    class CountRules(Pass):
+        node_types = (RuleSet,)
+
+        def __init__(self):
+            self.seen = 0
+
+        def enter(self, node, parent):
+            self.seen += 1
+
+    first, second = CountRules(), CountRules()
+    assert [len(g) for g in manager.schedule([ResolutionPass(context), first, second])] == [3]
+    assert [len(g) for g in manager.schedule([first, ResolutionPass(context), second])] == [1, 2]
+    manager.run(ast, [first, second])
+    assert first.seen == second.seen > 0
+
+    resolved = VariableResolver(context).resolve(ast)
+    title, body = AstHtmlGenerator().generate(resolved)
+    assert result['css'] == AstCssGenerator().generate(resolved)
+    assert f'<title>{title}</title>' in result['html'] and body in result['html']
+
+    # Resolution is copy-on-write: the analyzed tree keeps its references
+    refs = [d for child in ast.children if isinstance(child, RuleSet)
+            for d in child.declarations if isinstance(d.value, VariableRef)]
+    assert refs
+    new_root = manager.run(ast, [ResolutionPass(context)])
+    assert new_root is not ast and isinstance(new_root, Stylesheet)
+    assert all(isinstance(d.value, VariableRef) for d in refs)
+    untouched = [a for a, b in zip(ast.children, new_root.children) if a is b]
+    assert untouched and len(untouched) < len(ast.children)
+
+
+def test_analyze_expands_templates_without_touching_the_parsed_tree():
+    from cssx.ast.hashing import fingerprint
+    from cssx.ast.nodes import TemplateUse
+    from cssx.parser.cssx_parser import parse_to_ast
+    from cssx.semantics.analyzer import SemanticAnalyzer
+    from cssx.semantics.templates import collect_templates, expand_templates
+
+    source = "plantilla caja(@p=1px) {\n  relleno = @p\n}\n.a {\n  usar caja\n  .b {\n    usar caja(2px)\n  }\n}\n.c {\n  alto = 1px\n}\n"
+    ast = parse_to_ast(source)
+    before, fp = ast.to_dict(), fingerprint(ast)
+    _, _, expanded = SemanticAnalyzer().analyze(ast)
+    assert ast.to_dict() == before and isinstance(ast.children[1].declarations[0], TemplateUse)
+    assert expanded is not ast
+    assert [d.prop for d in expanded.children[1].children[0].declarations] == ['relleno']
+    assert expanded.children[2] is ast.children[2]
+    assert fingerprint(expanded) != fp
+
+    # expand_templates sigue siendo en sitio, pero invalida las huellas
+    table, _ = collect_templates(ast)
+    expand_templates(ast, table)
+    assert fingerprint(ast) == fingerprint(expanded)
+
+
+def test_compile_returns_an_index_of_the_expanded_stylesheet():
+    from cssx.ast.index import ASTIndex
+
+    source = "plantilla caja(@p=1px) {\n  relleno = @p\n}\n.a {\n  usar caja\n  .b {\n    usar caja(2px)\n  }\n}\n.c {\n  alto = 1px\n}\n"
+    result = Compiler().compile(source)
+    index = result['index']
+    assert isinstance(index, ASTIndex)
+    assert 'index' in result['stats']['timings_ms']
+    # Template bodies are already expanded into the rules that use them
+    assert len(index.declarations('relleno', under='.a')) == 2
+    assert index.declarations('alto', under='.a') == []
+    assert [d.prop for d in index.declarations('alto', under='.c')] == ['alto']
+
+
+def test_resolve_leaves_input_untouched_and_shares_unchanged_subtrees():
+    from cssx.ast.nodes import VariableRef
+    from cssx.parser.cssx_parser import parse_to_ast
+    from cssx.semantics.analyzer import SemanticAnalyzer, VariableResolver
+
+    source = "@c = rojo\n.a {\n  color = @c\n  .b {\n    ancho = 10px\n  }\n}\n.d {\n  alto = 1px\n}\n"
+    ast = parse_to_ast(source)
+    _, context, ast = SemanticAnalyzer().analyze(ast)
+    before = ast.to_dict()
+
+    resolved = VariableResolver(context).resolve(ast)
+    assert ast.to_dict() == before
+    # Ningún camino del resolvedor escribe en su entrada
+    VariableResolver(context).visit(ast)
+    assert ast.to_dict() == before
+    assert isinstance(ast.children[1].declarations[0].value, VariableRef)
+    assert not isinstance(resolved.children[1].declarations[0].value, VariableRef)
+    # Solo se copia el camino hasta lo resuelto
+    assert resolved.children[1] is not ast.children[1]
+    assert resolved.children[1].children[0] is ast.children[1].children[0]
+    assert resolved.children[2] is ast.children[2]
+
+    # Sin deepcopy (recursivo) la resolución no depende de la profundidad
+    depth = 10_000
+    out = io.StringIO()
+    deep = '@c = rojo\n' + '.a {\n' * depth + '  color = @c\n' + '}\n' * depth
+    assert Compiler().compile_css_stream(io.StringIO(deep), out) == []
+    assert out.getvalue().rstrip().endswith('.a .a {\n  color: red;\n}')
+
+
+def test_template_expansions_are_memoized_per_bound_arguments():
+    from cssx.parser.cssx_parser import parse_to_ast
+    from cssx.semantics.templates import collect_templates, expand_templates
+
+    source = ("plantilla caja(@p=1px, @m=0) {\n  relleno = @p\n  margen = @m auto\n}\n"
+              ".a {\n  usar caja\n}\n.b {\n  usar caja(1px)\n}\n.c {\n  usar caja(@m=0, @p=1px)\n}\n"
+              ".d {\n  usar caja(2px)\n}\n")
+    result = Compiler().compile(source)
+    assert result['success']
+    assert result['stats']['template_cache'] == {'hits': 2, 'misses': 2, 'hit_ratio': 0.5}
+
+    ast = parse_to_ast(source, 'hoja.cssx')
+    table, _ = collect_templates(ast)
+    assert expand_templates(ast, table) == []
+    a, b, c, d = (rule.declarations for rule in ast.children[1:])
+    # Los usos equivalentes comparten los valores sustituidos, no los nodos
+    assert all(x.value is y.value is z.value for x, y, z in zip(a, b, c))
+    assert all(x is not y and x.loc is not y.loc for x, y in zip(a, b))
+    assert d[0].value is not a[0].value and d[1].value == a[1].value
+    assert a[0].loc.file == 'hoja.cssx' and a[0].loc.line == 2
+    assert '.d {\n  padding: 2px;\n  margin: 0 auto;\n}' in result['css']
+
+
+def test_template_plan_shares_constants_and_fills_only_parameter_slots():
+    from cssx.parser.cssx_parser import parse_to_ast
+    from cssx.semantics.templates import ValueSlot, collect_templates, expand_templates
+
+    source = ("plantilla caja(@p, @m=0, @c=rojo) {\n  relleno = @p\n  margen = 1px 2px\n"
+              "  color = @c\n  borde = 1px solid rgba(0, 0, @m, 1)\n}\n"
+              ".a {\n  usar caja(1px)\n}\n.b {\n  usar caja(2px, 3)\n}\n.c {\n  usar caja\n}\n")
+    ast = parse_to_ast(source)
+    table, _ = collect_templates(ast)
+    plan = table.plan('caja')
+    assert plan.slots == (0, 2, 3)
+    assert plan.values[1] is ast.children[0].body[1].value
+    assert plan.required == ('@p',) and plan.optional_from == 1
+
+    diagnostics = expand_templates(ast, table)
+    a, b = (rule.declarations for rule in ast.children[1:3])
+    assert a[1].value is b[1].value is plan.values[1]
+    assert a[2].value is b[2].value
+    assert isinstance(plan.values[3], ValueSlot) and a[3].value != b[3].value
+    assert [d.message for d in diagnostics] == [
+        "Parámetro '@p' no tiene valor por defecto y no se proporcionó argumento"]
+
+    result = Compiler().compile(source.replace('.c {\n  usar caja\n}\n', ''))
+    assert '.b {\n  padding: 2px;\n  margin: 1px 2px;\n  color: red;\n  border: 1px solid rgba(0, 0, 3, 1);\n}' in result['css']
@@ -0,0 +1,389 @@
+import copy
+import gc
+import io
+import json
+import time
+
+from cssx.ast.diff import diff
+from cssx.ast.index import ASTIndex
+from cssx.ast.visitor import ASTTransformer, ASTVisitor
+from cssx.ast.hashing import SubtreeTable, fingerprint, same_structure, share_subtrees
+from cssx.ast.nodes import CommaList, Declaration, Function, Keyword, Number, RuleSet, SpaceList, String, is_loaded, iter_json, write_pretty
+from cssx.lexer.tokenizer import TokenKind, match_blocks, tokenize
+from cssx.parser.cssx_parser import CSSXParser, iter_parse, parse_parallel, parse_to_ast, parse_to_columnar
+from cssx.parser.selectors import compile_selector
+
+
+def nested_source(depth: int) -> str:
+    """Genera `depth` rulesets anidados, cada uno con dos declaraciones"""
+    lines = []
+    for level in range(depth):
+        lines.append(f".n{level} {{")
+        lines.append("  color = rojo")
+        lines.append("  margen = 0 auto")
+    lines.extend("}" for _ in range(depth))
+    return '\n'.join(lines)
+
+
+def best_parse_time(source: str, rounds: int = 5) -> float:
+    best = float('inf')
+    gc.disable()
+    try:
+        for _ in range(rounds):
+            start = time.perf_counter()
+            parse_to_ast(source)
+            best = min(best, time.perf_counter() - start)
+    finally:
+        gc.enable()
+    return best
+
+
+def test_nested_structure():
+    ast = parse_to_ast(nested_source(3))
+    outer = ast.children[0]
+    assert isinstance(outer, RuleSet)
+    assert [d.prop for d in outer.declarations] == ['color', 'margen']
+    middle = outer.children[0]
+    inner = middle.children[0]
+    assert inner.selectors[0].value == 'n2'
+    assert inner.children == []
+    assert all(isinstance(d, Declaration) for d in inner.declarations)
+
+
+def test_unclosed_block_extends_to_end_of_input():
+    ast = parse_to_ast("a {\n  b {\n    color = rojo\n}\nc {\n  ancho = 1\n}")
+    [a] = ast.children
+    b, c = a.children
+    assert b.declarations[0].prop == 'color'
+    assert c.declarations[0].prop == 'ancho'
+
+
+def test_tokenizer_reports_kinds_positions_and_depth():
+    source = ("@fondo = azul\n\n# comentario {\n.card {\n  color: rojo\n"
+              "  usar caja(1px)\n    márgen = 0 auto\n  } a { b\n}\n")
+    tokens = tokenize(source)
+    assert [t.kind for t in tokens] == [
+        TokenKind.VAR, TokenKind.OPEN, TokenKind.DECL, TokenKind.USE,
+        TokenKind.DECL, TokenKind.OTHER, TokenKind.CLOSE,
+    ]
+    assert [(t.line, t.col) for t in tokens] == [(1, 1), (4, 1), (5, 3), (6, 3), (7, 5), (8, 3), (9, 1)]
+    assert all(source[t.offset:].startswith(t.text) for t in tokens)
+    # Los comentarios no cuentan para el balance de llaves
+    assert [t.depth for t in tokens] == [0, 1, 0, 0, 0, 0, -1]
+    assert (tokens[0].name, tokens[0].value) == ('@fondo', 'azul')
+    assert (tokens[4].name, tokens[4].value) == ('márgen', '0 auto')
+    assert match_blocks(tokens)[1] == 6
+
+    # Fragmento: offset y línea de partida; offsets en caracteres, no bytes
+    start = source.index('  color')
+    fragment = tokenize(source[start:], start, 5)
+    assert [(t.offset, t.line, t.col) for t in fragment] == [(t.offset, t.line, t.col) for t in tokens[2:]]
+    assert tokens[5].offset == source.index('} a {')
+
+
+def test_parse_time_grows_linearly_with_depth():
+    small = best_parse_time(nested_source(2000))
+    large = best_parse_time(nested_source(4000))
+    # Lineal ~2x, cuadrático ~4x
+    assert large / small < 3.0
+
+
+REPARSE_SOURCE = """@color = rojo
+
+.a {
+  color = @color
+  ancho = 10px
+}
+
+plantilla caja(@p=1) {
+  relleno = @p
+}
+
+.b {
+  margen = 0 auto
+}
+"""
+
+
+def reparse_after(old: str, start: int, end: int, replacement: str):
+    new = old[:start] + replacement + old[end:]
+    previous = parse_to_ast(old)
+    children = list(previous.children)
+    result = CSSXParser().reparse(previous, old, (start, end), new)
+    return children, result, parse_to_ast(new)
+
+
+def test_reparse_reuses_nodes_outside_edit():
+    start = REPARSE_SOURCE.index('10px')
+    before, result, expected = reparse_after(REPARSE_SOURCE, start, start + 4, '12px\n  alto = 3')
+    assert result.to_dict() == expected.to_dict()
+    assert result.children[0] is before[0]
+    assert result.children[1] is not before[1]
+    assert result.children[2] is before[2]
+    # Nodos posteriores desplazados
+    assert result.children[3].loc.line == expected.children[3].loc.line == 13
+
+
+def test_locations_share_line_index():
+    ast = parse_to_ast(REPARSE_SOURCE)
+    decl = ast.children[1].declarations[1]
+    assert (decl.loc.line, decl.loc.col, decl.loc.offset) == (5, 3, REPARSE_SOURCE.index('ancho'))
+    assert decl.loc.index is ast.loc.index
+    assert copy.deepcopy(decl).loc.index is ast.loc.index
+
+
+def test_reparse_resyncs_after_unclosed_block():
+    start = REPARSE_SOURCE.index('}')
+    _, result, expected = reparse_after(REPARSE_SOURCE, start, start + 1, '')
+    assert result.to_dict() == expected.to_dict()
+
+
+def test_iter_parse_matches_full_parse_for_any_chunk_size():
+    expected = [node.to_dict() for node in parse_to_ast(REPARSE_SOURCE).children]
+    for chunk_size in (1, 7, 4096):
+        nodes = iter_parse(io.StringIO(REPARSE_SOURCE), chunk_size=chunk_size)
+        assert [node.to_dict() for node in nodes] == expected
+
+
+def test_parse_parallel_matches_serial_parse():
+    source = '\n\n'.join([REPARSE_SOURCE] * 4)
+    expected = parse_to_ast(source).to_dict()
+    assert parse_parallel(source, workers=3, threshold=0).to_dict() == expected
+    # Por debajo del umbral no se arranca ningún proceso
+    assert parse_parallel(source, workers=3).to_dict() == expected
+
+
+def test_lazy_parse_defers_block_bodies():
+    parser = CSSXParser(lazy=True)
+    ast = parser.parse_to_ast(REPARSE_SOURCE)
+    rulesets = [node for node in ast.children if isinstance(node, RuleSet)]
+    assert [r.selectors[0].value for r in rulesets] == ['a', 'b']
+    assert not any(is_loaded(r, 'declarations') for r in rulesets)
+
+    misses = parser.intern_misses
+    assert ast.to_dict() == parse_to_ast(REPARSE_SOURCE).to_dict()
+    assert all(is_loaded(r, 'declarations') for r in rulesets)
+    assert parser.intern_misses > misses
+
+
+def test_lazy_parse_does_not_tokenize_unaccessed_bodies(monkeypatch):
+    from cssx.lexer import tokenizer
+
+    matched = []
+    pattern = tokenizer._DECL_RE
+
+    class CountingPattern:
+        def match(self, text):
+            matched.append(text)
+            return pattern.match(text)
+
+    monkeypatch.setattr(tokenizer, '_DECL_RE', CountingPattern())
+    ast = parse_to_ast(REPARSE_SOURCE, lazy=True)
+    # Solo las líneas de nivel superior pasan por el patrón de declaraciones
+    assert matched == ['@color = rojo']
+
+    _, a, template, b = ast.children
+    assert [d.loc.line for d in a.declarations] == [4, 5]
+    assert matched == ['@color = rojo', 'color = @color', 'ancho = 10px']
+    assert not is_loaded(b, 'declarations') and not is_loaded(template, 'body')
+
+
+def test_columnar_ast_matches_tree():
+    columnar = parse_to_columnar(REPARSE_SOURCE)
+    assert columnar.to_stylesheet().to_dict() == parse_to_ast(REPARSE_SOURCE).to_dict()
+
+    ruleset = [child for child in columnar.root.children if hasattr(child, 'selectors')][0]
+    decl = ruleset.declarations[1]
+    assert (ruleset.selectors[0].value, decl.prop, decl.loc.line) == ('a', 'ancho', 5)
+    assert decl.parent == ruleset
+
+
+def test_iter_json_matches_to_dict():
+    ast = parse_to_ast(REPARSE_SOURCE + '.c {\n  x = "ñ", calc(1px + 2%)\n}')
+    assert ''.join(iter_json(ast, chunk_size=16)) == json.dumps(ast.to_dict())
+
+
+def test_pretty_printer_limits():
+    ast = parse_to_ast(nested_source(50))
+    out = io.StringIO()
+    assert write_pretty(ast, out) == len(ast.to_pretty_string().split('\n'))
+    assert out.getvalue() == ast.to_pretty_string()
+
+    preview = ast.to_pretty_string(max_nodes=10).split('\n')
+    assert len(preview) == 11 and preview[-1].startswith('...')
+    shallow = ast.to_pretty_string(max_depth=1).split('\n')
+    assert shallow == ['StyleSheet(loc: 1:1)', '  RuleSet(loc: 1:1)', '    ...']
+
+
+def test_repeated_values_are_interned():
+    parser = CSSXParser()
+    ast = parser.parse_to_ast("a {\n  margen = 0 auto\n  relleno = 0 auto\n  ancho = 0\n}")
+    first, second, third = ast.children[0].declarations
+    assert first.value is second.value
+    assert third.value is first.value.items[0]
+    assert parser.intern_stats()['hits'] == 2
+
+
+def test_values_nest_functions_and_comma_lists():
+    parser = CSSXParser()
+    calc = parser._parse_value("calc(100% - var(--x))", None)
+    assert isinstance(calc, Function) and isinstance(calc.args[0], SpaceList)
+    assert calc.args[0].items[2] == Function(name='var', args=(parser._parse_value('--x', None),))
+
+    shadow = parser._parse_value("0 2px rgba(0,0,0,0.1)", None)
+    assert isinstance(shadow, SpaceList) and len(shadow.items[2].args) == 4
+
+    fonts = parser._parse_value('"Roboto", sans-serif', None)
+    assert isinstance(fonts, CommaList) and fonts.items[0] == String(text='Roboto')
+
+
+def test_intern_limit_zero_disables_sharing():
+    parser = CSSXParser(intern_limit=0)
+    ast = parser.parse_to_ast("a {\n  margen = 0 auto\n  relleno = 0 auto\n}")
+    first, second = ast.children[0].declarations
+    assert first.value == second.value
+    assert first.value is not second.value
+
+
+def test_selector_cache_keeps_use_site_locations():
+    compile_selector.cache_clear()
+    ast = parse_to_ast(".card titulo2 {\n  color = rojo\n}\n\n.card titulo2 {\n  color = azul\n}")
+    first, second = (ruleset.selectors[0] for ruleset in ast.children)
+    assert first.right.value == second.right.value == 'h2'
+    assert (first.loc.line, first.left.loc.line) == (1, 1)
+    assert (second.loc.line, second.right.loc.line) == (5, 5)
+    assert compile_selector.cache_info().hits >= 1
+
+
+def test_fingerprint_ignores_locations_and_tracks_content():
+    source = ".card {\n  color = rojo\n  margen = 0 auto\n}"
+    ast = parse_to_ast(source + "\n\n" + source + "\n\n" + source.replace('rojo', 'azul'))
+    first, second, third = ast.children
+    assert first.loc.line != second.loc.line
+    assert same_structure(first, second) and not same_structure(first, third)
+    assert first.fp == fingerprint(first) and first.declarations[0].fp is not None
+    # La huella es estable entre análisis y no entra en la serialización
+    assert fingerprint(parse_to_ast(source).children[0]) == first.fp
+    assert 'fp' not in first.to_dict()
+    # Con 20k niveles de anidamiento no hay recursión
+    assert fingerprint(parse_to_ast(nested_source(20000))) > 0
+
+
+def test_share_subtrees_reuses_values_across_compilations():
+    table = SubtreeTable()
+    first = parse_to_ast("a {\n  margen = 0 auto\n}")
+    second = parse_to_ast("b {\n  margen = 0 auto\n}")
+    share_subtrees(first, table)
+    share_subtrees(second, table)
+    assert first.children[0].declarations[0].value is second.children[0].declarations[0].value
+    assert table.hits >= 1
+
+
+def rules_source(count: int, changed: int = -1) -> str:
+    """`count` rulesets distintos; el número `changed` con otro color"""
+    return '\n'.join(f".r{i} {{\n  color = {'azul' if i == changed else 'rojo'}\n  margen = {i}px\n}}"
+                     for i in range(count))
+
+
+def test_diff_reports_minimal_edit_script():
+    old = parse_to_ast(REPARSE_SOURCE)
+    assert diff(old, parse_to_ast("\n\n" + REPARSE_SOURCE)) == []
+
+    new = parse_to_ast(REPARSE_SOURCE.replace("ancho = 10px", "ancho = 12px") + "\n\n.nueva {\n  color = rojo\n}")
+    edits = [(edit.op, type(edit.node).__name__) for edit in diff(old, new)]
+    assert edits == [('change', 'RuleSet'), ('change', 'Declaration'), ('insert', 'RuleSet')]
+
+    old, new = parse_to_ast(rules_source(3)), parse_to_ast(rules_source(3))
+    new.children.insert(0, new.children.pop())
+    old.children.pop(1)
+    edits = [(edit.op, edit.node.selectors[0].value) for edit in diff(old, new)]
+    assert edits == [('move', 'r2'), ('insert', 'r1')]
+
+
+def test_diff_time_grows_linearly_with_rules():
+    def best_diff_time(count: int) -> float:
+        best = float('inf')
+        for _ in range(3):
+            old, new = parse_to_ast(rules_source(count)), parse_to_ast(rules_source(count, count // 2))
+            start = time.perf_counter()
+            edits = diff(old, new)
+            best = min(best, time.perf_counter() - start)
+        assert [edit.op for edit in edits] == ['change', 'change']
+        return best
+
+    small = best_diff_time(1000)
+    large = best_diff_time(2000)
+    # Lineal ~2x, cuadrático ~4x
+    assert large / small < 3.0
+
+
+def test_index_answers_scoped_queries_with_parent_links():
+    ast = parse_to_ast(
+        ".card {\n  color = rojo\n  titulo2 {\n    color = azul\n  }\n}\n\n"
+        ".otra .card {\n  color = verde\n}\n\n"
+        "#menu {\n  color = negro\n  margen = 0\n}"
+    )
+    index = ASTIndex(ast)
+    card, nested = index.rulesets('.card')[0], index.rulesets('titulo2')[0]
+    assert index.rulesets('h2') == [nested]
+    assert len(index.rulesets('.card')) == 2
+
+    colors = index.declarations('color', under='.card')
+    assert [d.loc.line for d in colors] == [2, 4, 9]
+    assert index.declarations('color', under=nested) == [nested.declarations[0]]
+    assert [d.loc.line for d in index.declarations('color')] == [2, 4, 9, 13]
+    assert index.declarations('margen', under='.card') == []
+    assert index.declarations('color', under=('class', 'card')) == colors
+    # Una tupla de nodos no es una clave de selector
+    other = index.rulesets('.otra')[0]
+    assert index.declarations('color', under=(nested, other)) == [nested.declarations[0], other.declarations[0]]
+
+    assert index.parent(nested) is card and index.parent(card) is ast
+    assert list(index.ancestors(colors[1])) == [nested, card, ast]
+    assert index.contains(card, colors[1]) and not index.contains(nested, colors[0])
+
+
+def test_visitor_dispatch_table_is_per_subclass():
+    class Base(ASTVisitor):
+        def visit_Keyword(self, node):
+            return 'base'
+
+        def generic_visit(self, node):
+            return 'generic'
+
+    class Override(Base):
+        def visit_Keyword(self, node):
+            return 'override'
+
+    class Inherit(Base):
+        pass
+
+    keyword, number = Keyword('auto'), Number(1.0)
+    # La tabla del padre se llena primero y no afecta a las subclases
+    assert Base().visit(keyword) == 'base'
+    assert Override().visit(keyword) == 'override'
+    assert Inherit().visit(keyword) == 'base'
+    assert Base._dispatch is not Override._dispatch is not ASTVisitor._dispatch
+    assert Override._dispatch[Keyword] is Override.visit_Keyword
+    assert Base._dispatch[Keyword] is Base.visit_Keyword
+    # Sin visit_<Tipo> se usa generic_visit
+    assert [cls().visit(number) for cls in (Base, Override, Inherit)] == ['generic'] * 3
+    assert Number not in ASTVisitor._dispatch
+
+
+def test_transformer_copies_only_modified_paths():
+    ast = parse_to_ast(REPARSE_SOURCE + "\n.c {\n  borde = solid 1px\n}")
+    assert ASTTransformer().visit(ast) is ast
+
+    class Rename(ASTTransformer):
+        def visit_Keyword(self, node):
+            return Keyword(name='dashed') if node.name == 'solid' else node
+
+    result = Rename().visit(ast)
+    assert result is not ast
+    *same, changed = result.children
+    assert all(new is old for new, old in zip(same, ast.children))
+    assert changed is not ast.children[-1]
+    assert changed.selectors is ast.children[-1].selectors
+    assert changed.declarations[0].value.items[0] == Keyword(name='dashed')
+    assert ast.children[-1].declarations[0].value.items[0] == Keyword(name='solid')